@@ -0,0 +1,213 @@
+# Ferramentas de linha de comando do Sistema RAS (sem Streamlit)
+# Uso: python ras_cli.py [--db caminho.db] <comando>
+import argparse
+import csv
+import os
+import sys
+
+import ras_core
+import ras_db
+import ras_perfil
+
+
+def cmd_migrar(args, pool):
+    with pool.conexao() as conn:
+        antes = ras_db.versao_schema(conn)
+        aplicadas = ras_db.migrar(conn)
+    if aplicadas:
+        print(f"Schema atualizado de v{antes} para v{aplicadas[-1]} (migrações {aplicadas}).")
+    else:
+        print(f"Schema já está na versão atual (v{antes}).")
+
+
+def cmd_bootstrap(args, pool):
+    ras_core.inicializar_banco(pool, forcar=True)
+    with pool.conexao() as conn:
+        print(f"Banco pronto em {pool.caminho} (schema v{ras_db.versao_schema(conn)}).")
+
+
+def cmd_verificar_indices(args, pool):
+    with pool.conexao() as conn:
+        problemas = ras_db.verificar_indices(conn)
+    for nome, (sql, indice) in ras_db.CONSULTAS_QUENTES.items():
+        print(f"[{'FALHA' if nome in problemas else 'ok'}] {nome} -> {indice}")
+        if nome in problemas:
+            for passo in problemas[nome]:
+                print(f"        {passo}")
+    return 1 if problemas else 0
+
+
+def cmd_verificar_ocupacao(args, pool):
+    with pool.transacao(imediata=True) as conn:
+        divergentes = ras_db.recontar_ocupacao(conn, corrigir=args.corrigir)
+    for id_vaga, ativos, espera, ativos_real, espera_real in divergentes:
+        print(f"Vaga {id_vaga}: gravado {ativos} ativos/{espera} espera, real {ativos_real}/{espera_real}")
+    if not divergentes:
+        print("Contadores de ocupação consistentes.")
+        return 0
+    if args.corrigir:
+        print(f"{len(divergentes)} vaga(s) corrigida(s).")
+        return 0
+    print(f"{len(divergentes)} vaga(s) divergente(s). Rode novamente com --corrigir para reconstruir.")
+    return 1
+
+
+def cmd_verificar_resumos(args, pool):
+    # Os resumos incluem as escalas arquivadas: o recálculo precisa do arquivo anexado
+    if os.path.exists(ras_db.caminho_arquivo(pool.caminho)):
+        with pool.conexao() as conn:
+            ras_db.anexar_arquivo(conn)
+    with pool.transacao(imediata=True) as conn:
+        divergencias = ras_db.recalcular_resumos(conn, corrigir=args.corrigir)
+    for tabela, n in divergencias.items():
+        print(f"{tabela}: {n} linha(s) divergente(s) do recálculo completo")
+    if not divergencias:
+        print("Resumos gerenciais consistentes com inscricoes.")
+        return 0
+    if args.corrigir:
+        print("Resumos reconstruídos.")
+        return 0
+    print("Rode novamente com --corrigir para reconstruir.")
+    return 1
+
+
+def cmd_importar_agentes(args, pool):
+    def progresso(n):
+        print(f"\r{n} linha(s) processada(s)...", end='', file=sys.stderr, flush=True)
+
+    with open(args.arquivo, newline='', encoding='utf-8-sig') as f:
+        resultado = ras_core.importar_agentes(pool, ras_core.ler_csv_agentes(f),
+                                              tamanho_lote=args.lote, progresso=progresso)
+    print(file=sys.stderr)
+
+    for linha, matricula, motivo in resultado['problemas']:
+        print(f"Linha {linha} ({matricula or '-'}): {motivo}")
+    print(f"{resultado['inseridos']} agente(s) importado(s), {len(resultado['problemas'])} linha(s) com problema.")
+
+    if resultado['senhas']:
+        with open(args.senhas, 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(['matricula', 'senha_temporaria'])
+            escritor.writerows(resultado['senhas'])
+        print(f"Senhas temporárias gravadas em {args.senhas} (troca obrigatória no primeiro acesso).")
+    return 1 if resultado['problemas'] else 0
+
+
+def cmd_sortear(args, pool):
+    resultado = ras_core.sortear_vagas(pool, ids_vagas=args.vaga or None, semente=args.semente)
+    for id_vaga, ativos, espera in resultado:
+        print(f"Vaga {id_vaga}: {ativos} confirmado(s), {espera} na lista de espera")
+    if not resultado:
+        print("Nenhum sorteio pendente.")
+
+
+def cmd_exportar(args, pool):
+    # Grava direto no arquivo (ou stdout com --saida -), sem montar a exportação em memória
+    saida = args.saida or f"ras_{args.tipo}.{args.formato}"
+    filtros = dict(id_vaga=args.vaga, mes=args.mes, desde=args.desde, ate=args.ate, historico=args.historico)
+    try:
+        if saida == '-':
+            n = ras_core.exportar(pool, args.tipo, args.formato, sys.stdout.buffer, **filtros)
+        else:
+            with open(saida, 'wb') as f:
+                n = ras_core.exportar(pool, args.tipo, args.formato, f, **filtros)
+    except ValueError as e:
+        if saida != '-':
+            os.remove(saida)
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{n} linha(s) exportada(s){'' if saida == '-' else ' em ' + saida}.", file=sys.stderr)
+
+
+def cmd_arquivar(args, pool):
+    try:
+        n_vagas, n_inscricoes, corte = ras_core.arquivar_escalas(pool, dias=args.dias)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{n_vagas} escala(s) anteriores a {corte} e {n_inscricoes} inscrição(ões) movidas para "
+          f"{ras_db.caminho_arquivo(pool.caminho)}.")
+    if args.compactar and n_vagas:
+        # Devolve ao sistema as páginas liberadas (bloqueia escritas enquanto roda)
+        with pool.conexao() as conn:
+            conn.execute("VACUUM")
+        print("Banco principal compactado.")
+
+
+def cmd_perfil(args, pool):
+    # Análise offline do log gerado com RAS_PERFIL_LOG (não abre o banco)
+    consultas, execucoes = ras_perfil.ler_log(args.log)
+    print(f"{len(consultas)} consulta(s), {len(execucoes)} execução(ões) em {args.log}.")
+    if execucoes:
+        print("\nExecuções por tela (ms médio / máx, consultas por rerun médio / máx):")
+        for g in ras_perfil.resumir_execucoes(execucoes)[:args.top]:
+            print(f"  {g['tela']} [{g['origem']}]: {g['reruns']} rerun(s), {g['ms_medio']:.1f} / {g['ms_max']:.1f} ms, "
+                  f"{g['consultas_por_rerun']:.1f} / {g['consultas_max']} consultas")
+    if consultas:
+        print("\nConsultas com maior tempo total (chamadas, total, médio, máx em ms):")
+        for g in ras_perfil.agrupar_consultas(consultas)[:args.top]:
+            print(f"  {g['chamadas']:>6} {g['ms_total']:>10.1f} {g['ms_medio']:>8.2f} {g['ms_max']:>8.1f}  "
+                  f"{g['sql'][:args.largura]}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Ferramentas do Sistema RAS")
+    p.add_argument('--db', default=ras_db.DB_PATH, help="arquivo do banco (padrão: RAS_DB_PATH ou ras_database_v6.db)")
+    sub = p.add_subparsers(dest='comando', required=True)
+
+    sub.add_parser('bootstrap', help="migrações + cargos padrão + admin padrão (antes de subir o servidor)"
+                   ).set_defaults(func=cmd_bootstrap)
+    sub.add_parser('migrar', help="aplica as migrações pendentes do schema").set_defaults(func=cmd_migrar)
+    sub.add_parser('verificar-indices', help="confere (EXPLAIN QUERY PLAN) se as consultas quentes usam índice"
+                   ).set_defaults(func=cmd_verificar_indices)
+    sp = sub.add_parser('verificar-ocupacao', help="confere os contadores inscritos_ativos/em_espera das vagas")
+    sp.add_argument('--corrigir', action='store_true', help="reconstrói os contadores a partir de inscricoes")
+    sp.set_defaults(func=cmd_verificar_ocupacao)
+    sp = sub.add_parser('verificar-resumos', help="confere os resumos gerenciais contra um recálculo completo")
+    sp.add_argument('--corrigir', action='store_true', help="reconstrói os resumos a partir de inscricoes")
+    sp.set_defaults(func=cmd_verificar_resumos)
+    sp = sub.add_parser('importar-agentes', help="importa agentes de um CSV (matricula, nome, graduacao, lotacao)")
+    sp.add_argument('arquivo')
+    sp.add_argument('--senhas', default='senhas_temporarias.csv', help="CSV de saída com as senhas temporárias")
+    sp.add_argument('--lote', type=int, default=ras_core.TAMANHO_LOTE_IMPORTACAO, help="linhas por executemany")
+    sp.set_defaults(func=cmd_importar_agentes)
+
+    sp = sub.add_parser('sortear', help="executa os sorteios de vagas com a janela de interesse encerrada (cron)")
+    sp.add_argument('--vaga', type=int, action='append', help="sorteia esta escala agora, mesmo antes do prazo")
+    sp.add_argument('--semente', type=int, help="semente do sorteio (padrão: aleatória, gravada na vaga)")
+    sp.set_defaults(func=cmd_sortear)
+
+    sp = sub.add_parser('exportar', help="exporta lista da escala, extrato de pagamento ou auditoria (CSV/XLSX)")
+    sp.add_argument('tipo', choices=list(ras_core.EXPORTACOES))
+    sp.add_argument('--formato', choices=list(ras_core.FORMATOS_EXPORTACAO), default='csv')
+    sp.add_argument('--saida', help="arquivo de saída ('-' = stdout; padrão: ras_<tipo>.<formato>)")
+    sp.add_argument('--vaga', type=int, help="escala exportada (tipo escala)")
+    sp.add_argument('--mes', help="mês AAAA-MM (pagamento/auditoria)")
+    sp.add_argument('--desde', help="data inicial AAAA-MM-DD (pagamento/auditoria)")
+    sp.add_argument('--ate', help="data final AAAA-MM-DD (pagamento/auditoria)")
+    sp.add_argument('--historico', action='store_true', help="inclui as escalas do arquivo frio")
+    sp.set_defaults(func=cmd_exportar)
+
+    sp = sub.add_parser('arquivar', help="move escalas antigas e suas inscrições para o arquivo frio (cron)")
+    sp.add_argument('--dias', type=int, help="arquiva escalas com mais de N dias (padrão: parâmetro do sistema ou 365)")
+    sp.add_argument('--compactar', action='store_true', help="roda VACUUM no banco principal depois de arquivar")
+    sp.set_defaults(func=cmd_arquivar)
+
+    sp = sub.add_parser('perfil', help="resume um log de perfil (RAS_PERFIL_LOG): consultas e execuções mais lentas")
+    sp.add_argument('log')
+    sp.add_argument('--top', type=int, default=20)
+    sp.add_argument('--largura', type=int, default=120, help="caracteres do SQL mostrados")
+    sp.set_defaults(func=cmd_perfil, sem_banco=True)
+
+    args = p.parse_args(argv)
+    if getattr(args, 'sem_banco', False):
+        return args.func(args, None) or 0
+    pool = ras_db.PoolConexoes(args.db, tamanho=1)
+    try:
+        return args.func(args, pool) or 0
+    finally:
+        pool.fechar()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1184 @@
+import csv
+import datetime
+import io
+import random
+import re
+import secrets
+import sqlite3
+import string
+import unicodedata
+
+from ras_db import (DB_PATH, SQL_BUSCA_AGENTES, SQL_LOTACOES, SQL_MINHAS_ESCALAS, STATUS_AGENDA, STATUS_CONFIRMADO,
+                    TAMANHO_POOL, VERSAO_SCHEMA, VISOES_HISTORICO, PoolConexoes, arquivar_vagas, conexao_historico,
+                    migrar, versao_schema)
+from ras_senha import CUSTO_PROVISORIO_LOG2, gerar_hash_no_pool, gerar_hashes_no_pool, verificar_senha
+
+# --- REGRAS DE NEGÓCIO (sem Streamlit) ---
+# Funções recebem o PoolConexoes (ras_db) para poderem ser usadas pelo app,
+# por scripts de carga, benchmarks e ferramentas de linha de comando:
+#   pool = ras_core.abrir('ras.db'); ras_core.inscrever_ras(pool, id_agente, id_vaga)
+
+TAMANHO_PAGINA = 20
+TAMANHO_PAGINA_LISTA = 50
+
+CARGOS_PADRAO = ["Guarda Municipal", "Subinspetor", "Inspetor", "Soldado", "Cabo", "Sargento", "Subtenente", "Tenente", "Capitão", "Major"]
+
+
+def _dicts(cur):
+    colunas = [d[0] for d in cur.description]
+    return [dict(zip(colunas, linha)) for linha in cur.fetchall()]
+
+
+# --- FUNÇÕES DE SEGURANÇA (HASH) ---
+# KDF com sal (scrypt), calculado no pool de ras_senha; hashes sha256 antigos são
+# regravados no primeiro login certo (_conferir_login)
+def make_hashes(password):
+    return gerar_hash_no_pool(password)
+
+
+def _conferir_login(pool, tabela, chave, user_id, senha, armazenado):
+    # ValueError (de verificar_senha) se a conta está bloqueada ou o servidor ocupado
+    ok, regravar = verificar_senha(chave, senha, armazenado)
+    if ok and regravar:
+        novo = make_hashes(senha)
+        # WHERE senha = antigo: não sobrescreve uma troca de senha feita nesse meio-tempo
+        pool.escrever(lambda conn: conn.execute(f"UPDATE {tabela} SET senha = ? WHERE id = ? AND senha = ?",
+                                                (novo, user_id, armazenado)))
+    return ok
+
+
+# --- INICIALIZAÇÃO DO BANCO ---
+def inicializar_banco(pool, forcar=False):
+    # Caminho rápido: schema na versão atual e banco já semeado => só leituras, nenhuma escrita.
+    # forcar=True (comando bootstrap da CLI) reaplica os dados iniciais mesmo assim.
+    with pool.conexao() as conn:
+        if not forcar and versao_schema(conn) >= VERSAO_SCHEMA and \
+                conn.execute("SELECT EXISTS (SELECT 1 FROM administradores)").fetchone()[0]:
+            return False
+        migrar(conn)
+
+    hash_admin = make_hashes('admin123')
+    with pool.transacao(imediata=True) as conn:
+        # Popula cargos padrão se a tabela estiver vazia
+        if conn.execute("SELECT count(*) FROM cargos").fetchone()[0] == 0:
+            conn.executemany("INSERT OR IGNORE INTO cargos (nome) VALUES (?)", [(c,) for c in CARGOS_PADRAO])
+
+        # Cria Admin Padrão (admin / admin123)
+        conn.execute("INSERT OR IGNORE INTO administradores (usuario, senha, primeiro_acesso) VALUES (?, ?, ?)",
+                     ('admin', hash_admin, 1))
+    return True
+
+
+def abrir(caminho=DB_PATH, tamanho=TAMANHO_POOL, fila_escrita=False):
+    # Pool pronto para uso a partir do caminho do banco (migrações e dados iniciais aplicados)
+    pool = PoolConexoes(caminho, tamanho=tamanho, fila_escrita=fila_escrita)
+    inicializar_banco(pool)
+    return pool
+
+
+# --- CONTAS, CADASTRO E CARGOS ---
+def autenticar_admin(pool, usuario, senha):
+    # (sucesso, id, primeiro_acesso); ValueError se a tentativa foi barrada pelo limite de tentativas
+    with pool.conexao() as conn:
+        user = conn.execute("SELECT id, senha, primeiro_acesso FROM administradores WHERE usuario = ?", (usuario,)).fetchone()
+    if _conferir_login(pool, 'administradores', f"admin:{usuario}", user and user[0], senha, user and user[1]):
+        return True, user[0], user[2]
+    return False, None, None
+
+
+def autenticar_agente(pool, matricula, senha):
+    # (sucesso, id, nome, primeiro_acesso); ValueError se a tentativa foi barrada pelo limite de tentativas
+    with pool.conexao() as conn:
+        user = conn.execute("SELECT id, nome, senha, primeiro_acesso FROM agentes WHERE matricula = ? AND ativo = 1",
+                            (matricula,)).fetchone()
+    if _conferir_login(pool, 'agentes', f"agente:{matricula}", user and user[0], senha, user and user[2]):
+        return True, user[0], user[1], user[3]
+    return False, None, None, None
+
+
+def cadastrar_agente(pool, matricula, nome, graduacao, lotacao, senha):
+    # False se a matrícula já existe. O hash sai antes: o KDF não roda com a escrita aberta
+    hash_senha = make_hashes(senha)
+    try:
+        pool.escrever(lambda conn: conn.execute(
+            "INSERT INTO agentes (matricula, nome, graduacao, lotacao, senha, primeiro_acesso) VALUES (?, ?, ?, ?, ?, 0)",
+            (matricula, nome, graduacao, lotacao, hash_senha)))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def alterar_senha(pool, tipo_usuario, id_usuario, nova_senha):
+    tabela = "administradores" if tipo_usuario == 'admin' else "agentes"
+    hash_senha = make_hashes(nova_senha)
+    pool.escrever(lambda conn: conn.execute(f"UPDATE {tabela} SET senha = ?, primeiro_acesso = 0 WHERE id = ?",
+                                            (hash_senha, id_usuario)))
+
+
+def atualizar_agente(pool, id_agente, nome, graduacao, lotacao):
+    pool.escrever(lambda conn: conn.execute("UPDATE agentes SET nome = ?, graduacao = ?, lotacao = ? WHERE id = ?",
+                                            (nome, graduacao, lotacao, id_agente)))
+
+
+def resetar_senha_agente(pool, id_agente, senha='1234'):
+    # Senha provisória: troca obrigatória no próximo acesso
+    hash_senha = make_hashes(senha)
+    pool.escrever(lambda conn: conn.execute("UPDATE agentes SET senha = ?, primeiro_acesso = 1 WHERE id = ?",
+                                            (hash_senha, id_agente)))
+
+
+def excluir_agente(pool, id_agente):
+    # Apaga também o histórico do agente; as vagas futuras que ele ocupava são repassadas
+    # à lista de espera. Para quem saiu do efetivo, prefira desativar_agentes
+    def gravar(conn):
+        _liberar_inscricoes_futuras(conn, [id_agente], _agora())
+        conn.execute("DELETE FROM inscricoes WHERE id_agente = ?", (id_agente,))
+        conn.execute("DELETE FROM agentes WHERE id = ?", (id_agente,))
+    pool.escrever(gravar)
+
+
+# --- DESATIVAÇÃO DE AGENTES ---
+TAMANHO_LOTE_DESATIVACAO = 500
+
+
+def _agora(agora=None):
+    return (agora or datetime.datetime.now()).isoformat(' ', 'seconds')
+
+
+def _ids_para_desativar(conn, ids_agentes, lotacao):
+    ids = set(ids_agentes)
+    if lotacao:
+        ids.update(i for (i,) in conn.execute("SELECT id FROM agentes WHERE lotacao = ? AND ativo = 1", (lotacao,)))
+    return sorted(ids)
+
+
+def _liberar_inscricoes_futuras(conn, ids_agentes, agora):
+    # Tira os agentes de toda escala que ainda não começou (vaga ocupada, pedido de saída,
+    # lista de espera, interesse em sorteio), em lotes de agentes pelo ix_inscricoes_agente_inicio.
+    # Só depois de todos os lotes cada escala que perdeu ocupante é completada pela fila
+    # (FIFO, _promover_fila): ninguém do próprio grupo é promovido. Chamar dentro da transação.
+    # Retorna (inscrições liberadas, promovidos).
+    liberadas, vagas_afetadas = 0, set()
+    for inicio in range(0, len(ids_agentes), TAMANHO_LOTE_DESATIVACAO):
+        lote = list(ids_agentes[inicio:inicio + TAMANHO_LOTE_DESATIVACAO])
+        marcadores = ','.join('?' * len(lote))
+        vagas_afetadas.update(v for (v,) in conn.execute(f"""
+            SELECT DISTINCT id_vaga FROM inscricoes
+            WHERE id_agente IN ({marcadores}) AND inicio > ? AND status IN {STATUS_CONFIRMADO}
+        """, lote + [agora]))
+        liberadas += conn.execute(f"""
+            DELETE FROM inscricoes
+            WHERE id_agente IN ({marcadores}) AND inicio > ? AND status IN {STATUS_AGENDA}
+        """, lote + [agora]).rowcount
+    return liberadas, _promover_fila(conn, vagas_afetadas)
+
+
+def previa_desativacao(pool, ids_agentes=(), lotacao=None, agora=None):
+    # O que desativar_agentes faria agora: agentes ativos atingidos e inscrições futuras
+    # deles (vagas ocupadas / lista de espera ou sorteio)
+    agora = _agora(agora)
+    with pool.conexao() as conn:
+        ids = _ids_para_desativar(conn, ids_agentes, lotacao)
+        previa = {'agentes': 0, 'ocupadas': 0, 'espera': 0}
+        for inicio in range(0, len(ids), TAMANHO_LOTE_DESATIVACAO):
+            lote = ids[inicio:inicio + TAMANHO_LOTE_DESATIVACAO]
+            marcadores = ','.join('?' * len(lote))
+            previa['agentes'] += conn.execute(
+                f"SELECT COUNT(*) FROM agentes WHERE id IN ({marcadores}) AND ativo = 1", lote).fetchone()[0]
+            ocupadas, espera = conn.execute(f"""
+                SELECT COUNT(*) FILTER (WHERE status IN {STATUS_CONFIRMADO}),
+                       COUNT(*) FILTER (WHERE status IN ('ESPERA', 'INTERESSADO'))
+                FROM inscricoes
+                WHERE id_agente IN ({marcadores}) AND inicio > ? AND status IN {STATUS_AGENDA}
+            """, lote + [agora]).fetchone()
+            previa['ocupadas'] += ocupadas
+            previa['espera'] += espera
+    return previa
+
+
+def desativar_agentes(pool, ids_agentes=(), lotacao=None, agora=None):
+    # Desativa os agentes indicados e/ou todos os ativos de uma lotação (transferência de
+    # unidade) em UMA transação: bloqueia login e inscrição, libera as escalas futuras e
+    # completa as vagas com a lista de espera. O histórico fica.
+    # Retorna (agentes desativados, inscrições liberadas, promovidos da espera).
+    agora = _agora(agora)
+
+    def gravar(conn):
+        ids = _ids_para_desativar(conn, ids_agentes, lotacao)
+        desativados = conn.executemany("UPDATE agentes SET ativo = 0, desativado_em = ? WHERE id = ? AND ativo = 1",
+                                       [(agora, i) for i in ids]).rowcount
+        liberadas, promovidos = _liberar_inscricoes_futuras(conn, ids, agora)
+        return desativados, liberadas, promovidos
+    return pool.escrever(gravar)
+
+
+def reativar_agentes(pool, ids_agentes):
+    # Volta a entrar e se inscrever; as escalas liberadas na desativação não voltam
+    ids = [(i,) for i in ids_agentes]
+    return pool.escrever(lambda conn: conn.executemany(
+        "UPDATE agentes SET ativo = 1, desativado_em = NULL WHERE id = ? AND ativo = 0", ids).rowcount)
+
+
+def listar_cargos(pool):
+    with pool.conexao() as conn:
+        return [nome for (nome,) in conn.execute("SELECT nome FROM cargos ORDER BY nome")]
+
+
+def adicionar_cargo(pool, nome):
+    # False se o cargo já existe
+    try:
+        pool.escrever(lambda conn: conn.execute("INSERT INTO cargos (nome) VALUES (?)", (nome,)))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def remover_cargo(pool, nome):
+    pool.escrever(lambda conn: conn.execute("DELETE FROM cargos WHERE nome = ?", (nome,)))
+
+
+# --- CRIAÇÃO DE ESCALAS ---
+MAX_OCORRENCIAS = 500
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+
+def expandir_recorrencia(inicio, fim, dias_semana=None, intervalo=1, excluir=()):
+    # Datas de uma escala recorrente entre inicio e fim (inclusive).
+    # Com dias_semana (0=segunda ... 6=domingo): nesses dias, a cada `intervalo` semanas
+    # contadas a partir da semana de `inicio`. Sem dias_semana: a cada `intervalo` dias.
+    if fim < inicio:
+        return []
+    intervalo = max(int(intervalo), 1)
+    excluir = set(excluir)
+    datas = []
+    if dias_semana:
+        dias_semana = set(dias_semana)
+        segunda_inicial = inicio - datetime.timedelta(days=inicio.weekday())
+        dia = inicio
+        while dia <= fim:
+            semana = (dia - segunda_inicial).days // 7
+            if dia.weekday() in dias_semana and semana % intervalo == 0 and dia not in excluir:
+                datas.append(dia)
+            dia += datetime.timedelta(days=1)
+    else:
+        dia = inicio
+        while dia <= fim:
+            if dia not in excluir:
+                datas.append(dia)
+            dia += datetime.timedelta(days=intervalo)
+    return datas
+
+
+MODOS_ALOCACAO = {
+    'ORDEM': "Ordem de chegada",
+    'SORTEIO': "Sorteio",
+    'SORTEIO_PONDERADO': "Sorteio ponderado (prioridade para quem tem menos RAS no mês)",
+}
+
+
+def fim_da_janela(data, h_inicio, dias_antes):
+    # Fim da janela de interesse: N dias antes da escala, no horário de início
+    return datetime.datetime.combine(data - datetime.timedelta(days=dias_antes), h_inicio).isoformat(' ')
+
+
+def criar_vagas_em_lote(pool, evento, datas, h_inicio, h_fim, qtd, valor, modo='ORDEM', dias_sorteio=2):
+    # Todas as ocorrências em um único executemany/COMMIT. Nos modos de sorteio cada
+    # ocorrência tem a própria janela de interesse, fechando dias_sorteio dias antes dela.
+    if len(datas) > MAX_OCORRENCIAS:
+        raise ValueError(f"Recorrência gera {len(datas)} escalas (máximo {MAX_OCORRENCIAS} por publicação).")
+    if modo not in MODOS_ALOCACAO:
+        raise ValueError(f"Modo de alocação inválido: {modo}")
+    def gravar(conn):
+        conn.executemany("""INSERT INTO vagas_ras (evento, data_inicio, hora_inicio, hora_fim, vagas_totais, valor,
+                                                   modo_alocacao, fim_interesse)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                         [(evento, str(data), str(h_inicio), str(h_fim), qtd, valor, modo,
+                           None if modo == 'ORDEM' else fim_da_janela(data, h_inicio, dias_sorteio))
+                          for data in datas])
+    pool.escrever(gravar)
+    return len(datas)
+
+
+def criar_vaga(pool, evento, data, h_inicio, h_fim, qtd, valor, modo='ORDEM', dias_sorteio=2):
+    criar_vagas_em_lote(pool, evento, [data], h_inicio, h_fim, qtd, valor, modo, dias_sorteio)
+
+
+# --- PARÂMETROS DO SISTEMA ---
+LIMITE_HORAS_MES = 'limite_horas_mes'
+DIAS_ARQUIVAMENTO = 'dias_arquivamento'
+ARQUIVADO_ATE = 'arquivado_ate'
+DIAS_ARQUIVAMENTO_PADRAO = 365
+
+
+def ler_parametro(conn, chave):
+    linha = conn.execute("SELECT valor FROM parametros WHERE chave = ?", (chave,)).fetchone()
+    return linha[0] if linha else None
+
+
+def gravar_parametro(pool, chave, valor):
+    pool.escrever(lambda conn: conn.execute("INSERT INTO parametros (chave, valor) VALUES (?, ?) "
+                                            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor", (chave, valor)))
+
+
+def limite_horas_mes(conn):
+    # None = sem limite
+    valor = ler_parametro(conn, LIMITE_HORAS_MES)
+    return float(valor) if valor else None
+
+
+def dias_arquivamento(conn):
+    valor = ler_parametro(conn, DIAS_ARQUIVAMENTO)
+    return int(valor) if valor else DIAS_ARQUIVAMENTO_PADRAO
+
+
+# --- AGENDA DO AGENTE (conflito de horário e limite mensal) ---
+def _conflito_agenda(conn, id_agente, id_vaga, inicio, fim):
+    # Outra escala do agente (confirmada, na fila ou no sorteio) que se sobrepõe a [inicio, fim).
+    # Nenhuma escala passa de 24 h, então só as que começam nas 24 h anteriores podem invadir
+    # o intervalo: uma busca por faixa em ix_inscricoes_agente_inicio.
+    return conn.execute(f"""
+        SELECT v.evento, v.data_inicio, v.hora_inicio, v.hora_fim
+        FROM inscricoes i
+        JOIN vagas_ras v ON v.id = i.id_vaga
+        WHERE i.id_agente = ? AND i.inicio > datetime(?, '-1 day') AND i.inicio < ? AND i.fim > ?
+          AND i.status IN {STATUS_AGENDA} AND i.id_vaga <> ?
+        LIMIT 1
+    """, (id_agente, inicio, fim, inicio, id_vaga)).fetchone()
+
+
+def _horas_no_mes(conn, id_agente, id_vaga, inicio):
+    # Horas das escalas do agente que começam no mesmo mês (faixa em ix_inscricoes_agente_inicio).
+    # Conta também fila e sorteio: uma promoção posterior nunca estoura o limite.
+    primeiro_dia = inicio[:7] + '-01'
+    return conn.execute(f"""
+        SELECT COALESCE(ROUND(SUM(julianday(fim) - julianday(inicio)) * 24, 2), 0)
+        FROM inscricoes
+        WHERE id_agente = ? AND inicio >= ? AND inicio < date(?, '+1 month')
+          AND status IN {STATUS_AGENDA} AND id_vaga <> ?
+    """, (id_agente, primeiro_dia, primeiro_dia, id_vaga)).fetchone()[0]
+
+
+def inscrever_ras(pool, id_agente, id_vaga):
+    # pool.escrever serializa as inscrições (BEGIN IMMEDIATE ou thread escritora): a leitura
+    # da ocupação e o INSERT acontecem dentro do mesmo lock de escrita, então duas sessões
+    # nunca leem a mesma ocupação. A duplicidade é barrada pelo índice único (id_vaga, id_agente).
+    # Escala por sorteio ainda não sorteada: só registra o interesse (INTERESSADO).
+    # Depois do sorteio, quem chega entra no fim da fila sorteada.
+    def gravar(conn):
+        if not conn.execute("SELECT 1 FROM agentes WHERE id = ? AND ativo = 1", (id_agente,)).fetchone():
+            return False, "Agente desativado: inscrições bloqueadas. Procure o comando."
+        vaga = conn.execute("""
+            SELECT inicio, fim, ROUND((julianday(fim) - julianday(inicio)) * 24, 2)
+            FROM vagas_ras WHERE id = ? AND cancelada = 0
+        """, (id_vaga,)).fetchone()
+        if not vaga:
+            return False, "Escala não encontrada ou cancelada."
+        inicio, fim, horas = vaga
+
+        conflito = _conflito_agenda(conn, id_agente, id_vaga, inicio, fim)
+        if conflito:
+            return False, f"Conflito de horário com {conflito[0]} em {conflito[1]} ({conflito[2]} - {conflito[3]})."
+
+        limite = limite_horas_mes(conn)
+        if limite is not None:
+            horas_mes = _horas_no_mes(conn, id_agente, id_vaga, inicio)
+            if horas_mes + horas > limite:
+                return False, (f"Limite de {limite:g} h de RAS no mês: você já tem {horas_mes:g} h "
+                               f"e esta escala soma {horas:g} h.")
+
+        cur = conn.execute("""
+            INSERT INTO inscricoes (id_vaga, id_agente, status, posicao_fila, inicio, fim)
+            SELECT v.id, ?,
+                   CASE WHEN v.modo_alocacao <> 'ORDEM' AND v.sorteada_em IS NULL THEN 'INTERESSADO'
+                        WHEN v.inscritos_ativos < v.vagas_totais THEN 'ATIVO'
+                        ELSE 'ESPERA' END,
+                   CASE WHEN v.sorteada_em IS NOT NULL THEN
+                       (SELECT COALESCE(MAX(i.posicao_fila), 0) + 1 FROM inscricoes i WHERE i.id_vaga = v.id)
+                   END,
+                   v.inicio, v.fim
+            FROM vagas_ras v
+            WHERE v.id = ? AND v.cancelada = 0
+        """, (id_agente, id_vaga))
+
+        if cur.rowcount == 0:
+            return False, "Escala não encontrada ou cancelada."
+
+        status = conn.execute("SELECT status FROM inscricoes WHERE id = ?", (cur.lastrowid,)).fetchone()[0]
+
+        if status == 'ATIVO':
+            return True, "Inscrição confirmada!"
+        if status == 'INTERESSADO':
+            return True, "Interesse registrado! As vagas serão sorteadas ao fim do período de inscrição."
+        return True, "Vagas esgotadas. Você entrou na lista de espera."
+
+    try:
+        return pool.escrever(gravar)
+    except sqlite3.IntegrityError as e:
+        if 'UNIQUE' not in str(e):
+            raise
+        return False, "Você já está inscrito nesta escala."
+
+
+def _promover_fila(conn, ids_vagas):
+    # Preenche TODAS as vagas livres de cada escala com a lista de espera, na ordem da fila
+    # (posição do sorteio ou, nas escalas por ordem de chegada, data de inscrição), em um
+    # único UPDATE. Vagas livres vêm dos contadores de vagas_ras (lidos uma vez, antes de
+    # qualquer promoção). Chamar dentro da transação. Retorna quantos subiram.
+    ids_vagas = list(set(ids_vagas))
+    if not ids_vagas:
+        return 0
+    marcadores = ','.join('?' * len(ids_vagas))
+    cur = conn.execute(f"""
+        UPDATE inscricoes
+        SET status = 'ATIVO'
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT i.id,
+                       ROW_NUMBER() OVER (PARTITION BY i.id_vaga
+                                          ORDER BY i.posicao_fila, i.data_inscricao, i.id) AS posicao,
+                       v.vagas_totais - v.inscritos_ativos AS livres
+                FROM vagas_ras v
+                JOIN inscricoes i ON i.id_vaga = v.id AND i.status = 'ESPERA'
+                WHERE v.id IN ({marcadores}) AND v.em_espera > 0 AND v.inscritos_ativos < v.vagas_totais
+            )
+            WHERE posicao <= livres
+        )
+    """, ids_vagas)
+    return cur.rowcount
+
+
+def processar_desistencias(pool, aprovar=(), negar=()):
+    # Aprova/nega vários pedidos de saída em UMA transação. Pedidos que não estão mais
+    # PENDENTE_SAIDA são ignorados. Depois das saídas, cada vaga afetada é completada
+    # pela lista de espera. Retorna (aprovados, negados, promovidos).
+    # Ids repetidos contam uma vez só (dict.fromkeys mantém a ordem)
+    aprovar, negar = list(dict.fromkeys(aprovar)), list(dict.fromkeys(negar))
+
+    def gravar(conn):
+        negados = 0
+        if negar:
+            negados = conn.executemany(
+                "UPDATE inscricoes SET status = 'ATIVO' WHERE id = ? AND status = 'PENDENTE_SAIDA'",
+                [(i,) for i in negar]).rowcount
+
+        vagas_liberadas = []
+        for id_inscricao in aprovar:
+            linha = conn.execute("SELECT id_vaga FROM inscricoes WHERE id = ? AND status = 'PENDENTE_SAIDA'",
+                                 (id_inscricao,)).fetchone()
+            if linha:
+                vagas_liberadas.append(linha[0])
+        if vagas_liberadas:
+            conn.executemany("DELETE FROM inscricoes WHERE id = ? AND status = 'PENDENTE_SAIDA'",
+                             [(i,) for i in aprovar])
+
+        promovidos = _promover_fila(conn, vagas_liberadas)
+        return len(vagas_liberadas), negados, promovidos
+    return pool.escrever(gravar)
+
+
+# As transições abaixo só valem a partir do status esperado e em escala não cancelada: um
+# botão de tela antiga (fragmento com o status de antes) não ressuscita inscrição cancelada
+# nem passa da capacidade. Retornam quantas linhas mudaram (0 = a situação já mudou).
+def solicitar_desistencia(pool, id_inscricao):
+    return pool.escrever(lambda conn: conn.execute("""
+        UPDATE inscricoes SET status = 'PENDENTE_SAIDA'
+        WHERE id = ? AND status = 'ATIVO'
+          AND id_vaga IN (SELECT id FROM vagas_ras WHERE cancelada = 0)
+    """, (id_inscricao,)).rowcount)
+
+
+def cancelar_desistencia(pool, id_inscricao):
+    # PENDENTE_SAIDA já ocupa a vaga; a checagem de capacidade cobre contadores de uma
+    # escala que ficou acima do limite
+    return pool.escrever(lambda conn: conn.execute("""
+        UPDATE inscricoes SET status = 'ATIVO'
+        WHERE id = ? AND status = 'PENDENTE_SAIDA'
+          AND id_vaga IN (SELECT id FROM vagas_ras WHERE cancelada = 0 AND inscritos_ativos <= vagas_totais)
+    """, (id_inscricao,)).rowcount)
+
+
+def retirar_interesse(pool, id_inscricao):
+    # Antes do sorteio o interessado não ocupa vaga: sai sem aprovação do comando
+    return pool.escrever(lambda conn: conn.execute("DELETE FROM inscricoes WHERE id = ? AND status = 'INTERESSADO'",
+                                                   (id_inscricao,)).rowcount)
+
+
+def admin_processar_desistencia(pool, id_inscricao, aprovado):
+    if aprovado:
+        return processar_desistencias(pool, aprovar=[id_inscricao])
+    return processar_desistencias(pool, negar=[id_inscricao])
+
+
+# --- EDIÇÃO DE ESCALAS ---
+def editar_vaga(pool, id_vaga, evento, data, h_inicio, h_fim, vagas_totais, valor):
+    # Altera a escala e reequilibra as inscrições na mesma transação:
+    # - capacidade menor: o excedente (ATIVO + PENDENTE_SAIDA, os dois ocupam vaga) sai
+    #   primeiro dos pedidos de saída pendentes, que são atendidos (quem pediu para sair sai,
+    #   por ordem de pedido); o que faltar sai dos ATIVOS, que voltam para ESPERA dos últimos
+    #   da fila para os primeiros (pela posição/data de inscrição continuam no topo da fila);
+    # - capacidade maior: a lista de espera sobe por ordem de chegada até encher.
+    # Retorna (promovidos, rebaixados, saidas_atendidas); ValueError se a escala não existe
+    # ou foi cancelada.
+    def gravar(conn):
+        cur = conn.execute("""
+            UPDATE vagas_ras
+            SET evento = ?, data_inicio = ?, hora_inicio = ?, hora_fim = ?, vagas_totais = ?, valor = ?
+            WHERE id = ? AND cancelada = 0
+        """, (evento, str(data), str(h_inicio), str(h_fim), vagas_totais, valor, id_vaga))
+        if cur.rowcount == 0:
+            raise ValueError("Escala não encontrada ou cancelada.")
+
+        excedente = conn.execute("SELECT inscritos_ativos - vagas_totais FROM vagas_ras WHERE id = ?",
+                                 (id_vaga,)).fetchone()[0]
+        saidas = rebaixados = 0
+        if excedente > 0:
+            saidas = conn.execute("""
+                DELETE FROM inscricoes
+                WHERE id IN (SELECT id FROM inscricoes
+                             WHERE id_vaga = ? AND status = 'PENDENTE_SAIDA'
+                             ORDER BY data_inscricao DESC, id DESC
+                             LIMIT ?)
+            """, (id_vaga, excedente)).rowcount
+        if excedente - saidas > 0:
+            rebaixados = conn.execute("""
+                UPDATE inscricoes
+                SET status = 'ESPERA'
+                WHERE id IN (SELECT id FROM inscricoes
+                             WHERE id_vaga = ? AND status = 'ATIVO'
+                             ORDER BY posicao_fila DESC, data_inscricao DESC, id DESC
+                             LIMIT ?)
+            """, (id_vaga, excedente - saidas)).rowcount
+
+        promovidos = _promover_fila(conn, [id_vaga])
+        ocupadas, total = conn.execute("SELECT inscritos_ativos, vagas_totais FROM vagas_ras WHERE id = ?",
+                                       (id_vaga,)).fetchone()
+        if ocupadas > total:
+            # Contadores fora de sincronia (ras_cli verificar-ocupacao): desfaz a edição
+            raise RuntimeError(f"Escala {id_vaga} com {ocupadas} ocupante(s) para {total} vaga(s) após a edição.")
+        return promovidos, rebaixados, saidas
+    return pool.escrever(gravar)
+
+
+def cancelar_vaga(pool, id_vaga):
+    # Retorna quantas inscrições foram canceladas junto com a escala
+    def gravar(conn):
+        conn.execute("UPDATE vagas_ras SET cancelada = 1 WHERE id = ?", (id_vaga,))
+        return conn.execute("""
+            UPDATE inscricoes SET status = 'CANCELADA'
+            WHERE id_vaga = ? AND status IN ('ATIVO', 'ESPERA', 'PENDENTE_SAIDA', 'INTERESSADO')
+        """, (id_vaga,)).rowcount
+    return pool.escrever(gravar)
+
+
+# --- ALOCAÇÃO POR SORTEIO ---
+def _ordem_sorteio(interessados, ponderado, rnd):
+    # interessados: [(id_inscricao, escalas_no_mes)]. Sorteio uniforme, ou ponderado com
+    # peso 1 / (1 + escalas no mês) via chaves aleatórias u ** (1 / peso) (Efraimidis-Spirakis):
+    # quem trabalhou menos RAS tende a ficar na frente, mas ninguém tem a vaga garantida.
+    if not ponderado:
+        ordem = [i for i, _ in interessados]
+        rnd.shuffle(ordem)
+        return ordem
+    chaves = {i: rnd.random() ** (1 + escalas) for i, escalas in interessados}
+    return sorted(chaves, key=chaves.get, reverse=True)
+
+
+def sortear_vagas(pool, ids_vagas=None, agora=None, semente=None):
+    # Executa os sorteios vencidos (janela encerrada) ou, com ids_vagas, os sorteios dessas
+    # escalas mesmo antes do fim da janela. Tudo em UMA transação: os primeiros sorteados
+    # ficam ATIVO até encher, o resto vai para ESPERA na ordem do sorteio (posicao_fila).
+    # A semente fica gravada na vaga para o resultado poder ser auditado/reproduzido.
+    # Retorna [(id_vaga, ativos, espera)].
+    agora = (agora or datetime.datetime.now()).isoformat(' ', 'seconds')
+    if ids_vagas is None:
+        filtro, params = "fim_interesse <= ?", [agora]
+        # Checagem barata fora do lock de escrita: no caso comum não há sorteio a fazer
+        with pool.conexao() as conn:
+            if not conn.execute(f"""SELECT 1 FROM vagas_ras WHERE sorteada_em IS NULL AND modo_alocacao <> 'ORDEM'
+                                    AND {filtro} LIMIT 1""", params).fetchone():
+                return []
+    else:
+        ids_vagas = list(ids_vagas)
+        filtro, params = f"id IN ({','.join('?' * len(ids_vagas))})", ids_vagas
+    if semente is None:
+        semente = secrets.randbelow(2 ** 31)
+
+    def gravar(conn):
+        resultado = []
+        vagas = conn.execute(f"""
+            SELECT id, modo_alocacao, substr(data_inicio, 1, 7), vagas_totais - inscritos_ativos
+            FROM vagas_ras
+            WHERE sorteada_em IS NULL AND modo_alocacao <> 'ORDEM' AND cancelada = 0 AND {filtro}
+        """, params).fetchall()
+        for id_vaga, modo, mes, livres in vagas:
+            interessados = conn.execute("""
+                SELECT i.id, COALESCE(r.escalas, 0)
+                FROM inscricoes i
+                LEFT JOIN resumo_agente_mes r ON r.id_agente = i.id_agente AND r.mes = ?
+                WHERE i.id_vaga = ? AND i.status = 'INTERESSADO'
+                ORDER BY i.id
+            """, (mes, id_vaga)).fetchall()
+            ordem = _ordem_sorteio(interessados, modo == 'SORTEIO_PONDERADO', random.Random(f"{semente}:{id_vaga}"))
+            conn.executemany("UPDATE inscricoes SET status = ?, posicao_fila = ? WHERE id = ?",
+                             [('ATIVO' if posicao <= livres else 'ESPERA', posicao, id_inscricao)
+                              for posicao, id_inscricao in enumerate(ordem, start=1)])
+            conn.execute("UPDATE vagas_ras SET sorteada_em = ?, semente_sorteio = ? WHERE id = ?",
+                         (agora, semente, id_vaga))
+            ativos = min(max(livres, 0), len(ordem))
+            resultado.append((id_vaga, ativos, len(ordem) - ativos))
+        return resultado
+    return pool.escrever(gravar)
+
+
+# --- RELATÓRIO DE CONFLITOS ---
+def relatorio_conflitos(pool, desde=None):
+    # Conflitos já gravados (escalas editadas depois da inscrição, dados anteriores à checagem,
+    # limite reduzido pelo comando) em escalas que terminam a partir de 'desde' (padrão: hoje):
+    # - sobreposicoes: pares de escalas do mesmo agente com horários que se cruzam;
+    # - acima_limite: agente/mês com mais horas que o limite mensal.
+    desde = (desde or datetime.date.today()).isoformat()
+    with pool.conexao() as conn:
+        sobreposicoes = _dicts(conn.execute(f"""
+            SELECT ag.matricula, ag.nome,
+                   va.evento AS evento_a, a.inicio AS inicio_a, a.fim AS fim_a, a.status AS status_a,
+                   vb.evento AS evento_b, b.inicio AS inicio_b, b.fim AS fim_b, b.status AS status_b
+            FROM inscricoes a
+            JOIN inscricoes b ON b.id_agente = a.id_agente AND b.inicio >= a.inicio AND b.inicio < a.fim
+                             AND b.id <> a.id AND (b.inicio > a.inicio OR b.id > a.id)
+            JOIN agentes ag ON ag.id = a.id_agente
+            JOIN vagas_ras va ON va.id = a.id_vaga
+            JOIN vagas_ras vb ON vb.id = b.id_vaga
+            WHERE a.fim > ? AND a.status IN {STATUS_AGENDA} AND b.status IN {STATUS_AGENDA}
+            ORDER BY a.inicio, ag.nome
+        """, (desde,)))
+
+        acima_limite = []
+        limite = limite_horas_mes(conn)
+        if limite is not None:
+            acima_limite = _dicts(conn.execute(f"""
+                SELECT ag.matricula, ag.nome, substr(i.inicio, 1, 7) AS mes, COUNT(*) AS escalas,
+                       ROUND(SUM(julianday(i.fim) - julianday(i.inicio)) * 24, 2) AS horas
+                FROM inscricoes i
+                JOIN agentes ag ON ag.id = i.id_agente
+                WHERE i.inicio >= ? AND i.status IN {STATUS_AGENDA}
+                GROUP BY i.id_agente, mes
+                HAVING horas > ?
+                ORDER BY mes, horas DESC
+            """, (desde[:7] + '-01', limite)))
+    return {'sobreposicoes': sobreposicoes, 'acima_limite': acima_limite, 'limite': limite}
+
+
+# --- ARQUIVAMENTO DE ESCALAS ANTIGAS ---
+def arquivar_escalas(pool, dias=None, hoje=None):
+    # Move para o arquivo frio as escalas que começaram há mais de N dias (parâmetro
+    # dias_arquivamento, padrão 365). Os resumos gerenciais continuam contando essas escalas.
+    # Retorna (n_vagas, n_inscricoes, data_de_corte).
+    with pool.conexao() as conn:
+        dias = dias_arquivamento(conn) if dias is None else dias
+        arquivado_ate = ler_parametro(conn, ARQUIVADO_ATE)
+    if dias < 1:
+        raise ValueError("O arquivamento precisa de pelo menos 1 dia de distância.")
+    corte = (hoje or datetime.date.today()) - datetime.timedelta(days=dias)
+    n_vagas, n_inscricoes = arquivar_vagas(pool.caminho, corte)
+    if n_vagas and (not arquivado_ate or corte.isoformat() > arquivado_ate):
+        gravar_parametro(pool, ARQUIVADO_ATE, corte.isoformat())
+    return n_vagas, n_inscricoes, corte
+
+
+# --- LISTAGEM DE VAGAS (paginação por chave) ---
+_COLUNAS_VAGA = """id, evento, data_inicio, hora_inicio, hora_fim, valor,
+                   vagas_totais, inscritos_ativos AS inscritos, em_espera, cancelada,
+                   modo_alocacao, fim_interesse, sorteada_em,
+                   CASE WHEN modo_alocacao <> 'ORDEM' AND sorteada_em IS NULL THEN
+                       (SELECT COUNT(*) FROM inscricoes i WHERE i.id_vaga = vagas_ras.id AND i.status = 'INTERESSADO')
+                   ELSE 0 END AS interessados"""
+
+
+def obter_vaga(pool, id_vaga):
+    # Uma vaga com as mesmas colunas de listar_vagas (atualização de um card só)
+    with pool.conexao() as conn:
+        vagas = _dicts(conn.execute(f"SELECT {_COLUNAS_VAGA} FROM vagas_ras WHERE id = ?", (id_vaga,)))
+    return vagas[0] if vagas else None
+
+
+def obter_vagas(pool, ids_vagas):
+    # Várias vagas pela chave primária ({id: vaga}): releitura só das escalas na tela
+    if not ids_vagas:
+        return {}
+    with pool.conexao() as conn:
+        vagas = _dicts(conn.execute(f"SELECT {_COLUNAS_VAGA} FROM vagas_ras WHERE id IN "
+                                    f"({','.join('?' * len(ids_vagas))})", list(ids_vagas)))
+    return {v['id']: v for v in vagas}
+
+
+def listar_vagas(pool, historico=False, data_de=None, data_ate=None, evento=None,
+                 cursor=None, limite=TAMANHO_PAGINA, hoje=None):
+    # Próximas escalas (data_inicio >= hoje) em ordem crescente, ou o histórico
+    # (data_inicio < hoje) do mais recente para o mais antigo. A página seguinte
+    # começa depois do cursor (data_inicio, id) da última linha, usando ix_vagas_data:
+    # o custo não depende de quantas páginas já foram percorridas.
+    # Retorna (vagas, cursor_da_proxima_pagina ou None).
+    hoje = hoje or datetime.date.today()
+    fim = min(hoje, data_ate + datetime.timedelta(days=1)) if data_ate else hoje
+    hoje = hoje.isoformat()
+    data_de = data_de.isoformat() if data_de else None
+    data_ate = data_ate.isoformat() if data_ate else None
+
+    filtros, params = [], []
+    if historico:
+        filtros.append("data_inicio < ?")
+        params.append(fim.isoformat())
+        if data_de:
+            filtros.append("data_inicio >= ?")
+            params.append(data_de)
+        if cursor:
+            filtros.append("(data_inicio, id) < (?, ?)")
+            params.extend(cursor)
+        ordem = "data_inicio DESC, id DESC"
+    else:
+        # Limite inferior mais apertado entre hoje, o filtro e o cursor
+        filtros.append("data_inicio >= ?")
+        params.append(max(d for d in (hoje, data_de, cursor and cursor[0]) if d))
+        if data_ate:
+            filtros.append("data_inicio <= ?")
+            params.append(data_ate)
+        if cursor:
+            filtros.append("(data_inicio, id) > (?, ?)")
+            params.extend(cursor)
+        filtros.append("cancelada = 0")
+        ordem = "data_inicio, id"
+    if evento:
+        filtros.append("evento LIKE ?")
+        params.append(f"%{evento}%")
+
+    with pool.conexao() as conn:
+        vagas = _dicts(conn.execute(f"""
+            SELECT {_COLUNAS_VAGA}
+            FROM vagas_ras
+            WHERE {' AND '.join(filtros)}
+            ORDER BY {ordem}
+            LIMIT ?
+        """, params + [limite + 1]))
+
+    if len(vagas) > limite:
+        vagas = vagas[:limite]
+        return vagas, (vagas[-1]['data_inicio'], vagas[-1]['id'])
+    return vagas, None
+
+
+# --- LISTA DE INSCRIÇÕES (busca FTS5) ---
+def termos_fts(texto):
+    # Texto livre -> consulta FTS5 segura: cada palavra vira um prefixo ("joa"* acha "João")
+    palavras = re.findall(r"\w+", texto or "")
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def buscar_inscricoes(pool, evento=None, agente=None, cursor=None, limite=TAMANHO_PAGINA_LISTA):
+    # Filtros resolvidos pelos índices FTS (vagas_fts / agentes_fts) e depois pelos índices
+    # de inscricoes por vaga/agente: o custo acompanha o número de linhas encontradas.
+    # Ordem: data_inicio mais recente primeiro; cursor = (data_inicio, id_vaga, id_inscricao).
+    # Retorna (linhas, cursor_da_proxima_pagina ou None).
+    filtros, params = [], []
+    consulta_evento, consulta_agente = termos_fts(evento), termos_fts(agente)
+    if consulta_evento:
+        filtros.append("v.id IN (SELECT rowid FROM vagas_fts WHERE vagas_fts MATCH ?)")
+        params.append(consulta_evento)
+    if consulta_agente:
+        filtros.append("a.id IN (SELECT rowid FROM agentes_fts WHERE agentes_fts MATCH ?)")
+        params.append(consulta_agente)
+    if cursor:
+        filtros.append("v.data_inicio <= ? AND (v.data_inicio, v.id, i.id) < (?, ?, ?)")
+        params.extend([cursor[0], *cursor])
+    where = ("WHERE " + " AND ".join(filtros)) if filtros else ""
+    # Sem filtro de agente, CROSS JOIN fixa vagas_ras como laço externo: a varredura segue
+    # ix_vagas_data já na ordem pedida e para no LIMIT, sem ordenar a tabela inteira
+    juncao = "JOIN" if consulta_agente else "CROSS JOIN"
+
+    with pool.conexao() as conn:
+        linhas = _dicts(conn.execute(f"""
+            SELECT v.evento, v.data_inicio, a.nome, a.matricula, i.status,
+                   v.id AS id_vaga, i.id AS id_inscricao
+            FROM vagas_ras v
+            {juncao} inscricoes i ON i.id_vaga = v.id
+            JOIN agentes a ON i.id_agente = a.id
+            {where}
+            ORDER BY v.data_inicio DESC, v.id DESC, i.id DESC
+            LIMIT ?
+        """, params + [limite + 1]))
+
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        return linhas, (ultima['data_inicio'], ultima['id_vaga'], ultima['id_inscricao'])
+    return linhas, None
+
+
+# --- BUSCA DE AGENTES (Gerenciar Agentes) ---
+LIMITE_BUSCA_AGENTES = 20
+
+
+def buscar_agentes(pool, texto=None, lotacao=None, graduacao=None, limite=LIMITE_BUSCA_AGENTES):
+    # Busca incremental: cada palavra digitada é prefixo de matrícula ou de nome, sem acento
+    # (agentes_fts); lotação/graduação usam ix_agentes_lotacao / ix_agentes_graduacao.
+    # Só as primeiras `limite` linhas em ordem alfabética. Retorna (agentes, ha_mais).
+    filtros, params = [], []
+    consulta = termos_fts(texto)
+    if consulta:
+        filtros.append("id IN (SELECT rowid FROM agentes_fts WHERE agentes_fts MATCH ?)")
+        params.append(consulta)
+    if lotacao:
+        filtros.append("lotacao = ?")
+        params.append(lotacao)
+    if graduacao:
+        filtros.append("graduacao = ?")
+        params.append(graduacao)
+    if not filtros:
+        return [], False
+    with pool.conexao() as conn:
+        agentes = _dicts(conn.execute(SQL_BUSCA_AGENTES.format(filtros=' AND '.join(filtros)),
+                                      params + [limite + 1]))
+    return agentes[:limite], len(agentes) > limite
+
+
+def obter_agente(pool, id_agente):
+    with pool.conexao() as conn:
+        agentes = _dicts(conn.execute(
+            "SELECT id, matricula, nome, graduacao, lotacao, ativo, desativado_em FROM agentes WHERE id = ?",
+            (id_agente,)))
+    return agentes[0] if agentes else None
+
+
+def listar_lotacoes(pool):
+    with pool.conexao() as conn:
+        return [l for (l,) in conn.execute(SQL_LOTACOES)]
+
+
+# --- RELATÓRIOS GERENCIAIS (lidos dos resumos incrementais) ---
+def relatorio_gerencial(pool, top=5):
+    # Nenhuma consulta percorre inscricoes: custo proporcional a meses/agentes, não ao histórico
+    with pool.conexao() as conn:
+        totais = conn.execute(
+            "SELECT COALESCE(SUM(escalas), 0), COALESCE(SUM(horas), 0), COALESCE(SUM(valor), 0) FROM resumo_mes"
+        ).fetchone()
+        top_agentes = _dicts(conn.execute("""
+            SELECT a.nome, r.escalas, r.horas, r.valor
+            FROM resumo_agentes r JOIN agentes a ON a.id = r.id_agente
+            WHERE r.escalas > 0
+            ORDER BY r.escalas DESC
+            LIMIT ?
+        """, (top,)))
+        por_mes = _dicts(conn.execute(
+            "SELECT mes, escalas, horas, valor FROM resumo_mes WHERE escalas > 0 ORDER BY mes"))
+        por_lotacao = _dicts(conn.execute("""
+            SELECT COALESCE(NULLIF(a.lotacao, ''), '(sem lotação)') AS lotacao,
+                   SUM(r.escalas) AS escalas, SUM(r.horas) AS horas, SUM(r.valor) AS valor
+            FROM resumo_agentes r JOIN agentes a ON a.id = r.id_agente
+            WHERE r.escalas > 0
+            GROUP BY 1 ORDER BY escalas DESC
+        """))
+        por_graduacao = _dicts(conn.execute("""
+            SELECT COALESCE(NULLIF(a.graduacao, ''), '(sem graduação)') AS graduacao,
+                   SUM(r.escalas) AS escalas, SUM(r.horas) AS horas, SUM(r.valor) AS valor
+            FROM resumo_agentes r JOIN agentes a ON a.id = r.id_agente
+            WHERE r.escalas > 0
+            GROUP BY 1 ORDER BY escalas DESC
+        """))
+    return {
+        'escalas': totais[0], 'horas': totais[1], 'valor': totais[2],
+        'top_agentes': top_agentes, 'por_mes': por_mes,
+        'por_lotacao': por_lotacao, 'por_graduacao': por_graduacao,
+    }
+
+
+# --- DESISTÊNCIAS PENDENTES ---
+def listar_desistencias_pendentes(pool):
+    with pool.conexao() as conn:
+        return _dicts(conn.execute("""
+            SELECT i.id, a.nome, a.matricula, v.evento, v.data_inicio 
+            FROM inscricoes i
+            JOIN agentes a ON i.id_agente = a.id
+            JOIN vagas_ras v ON i.id_vaga = v.id
+            WHERE i.status = 'PENDENTE_SAIDA'
+        """))
+
+
+def listar_minhas_escalas(pool, id_agente):
+    with pool.conexao() as conn:
+        return _dicts(conn.execute(SQL_MINHAS_ESCALAS, (id_agente,)))
+
+
+def status_inscricao(pool, id_inscricao):
+    # None se a inscrição não existe mais (desistência aprovada, interesse retirado)
+    with pool.conexao() as conn:
+        linha = conn.execute("SELECT status FROM inscricoes WHERE id = ?", (id_inscricao,)).fetchone()
+    return linha[0] if linha else None
+
+
+# --- IMPORTAÇÃO DE AGENTES (CSV) ---
+TAMANHO_LOTE_IMPORTACAO = 500
+COLUNAS_IMPORTACAO = ('matricula', 'nome', 'graduacao', 'lotacao')
+
+
+def _normalizar(texto):
+    # "Matrícula " -> "matricula" (cabeçalhos e comparação de graduação)
+    sem_acento = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return sem_acento.strip().lower()
+
+
+def gerar_senha_temporaria(tamanho=8):
+    alfabeto = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(alfabeto) for _ in range(tamanho))
+
+
+def ler_csv_agentes(arquivo_texto):
+    # Gera (numero_linha, {matricula, nome, graduacao, lotacao}) sem carregar o arquivo inteiro.
+    # Aceita separador "," ou ";" e cabeçalhos com ou sem acento.
+    amostra = arquivo_texto.read(4096)
+    arquivo_texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(arquivo_texto, dialeto)
+    cabecalho = [_normalizar(c) for c in next(leitor, [])]
+    faltando = [c for c in COLUNAS_IMPORTACAO if c not in cabecalho]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}")
+    posicoes = {c: cabecalho.index(c) for c in COLUNAS_IMPORTACAO}
+    for numero, campos in enumerate(leitor, start=2):
+        if not any(c.strip() for c in campos):
+            continue
+        yield numero, {c: (campos[i].strip() if i < len(campos) else '') for c, i in posicoes.items()}
+
+
+def importar_agentes(pool, linhas, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, progresso=None):
+    # Importa agentes em UMA transação: ou entram todos os válidos, ou nenhum. Linhas com
+    # problema (matrícula repetida, graduação inexistente, campo vazio) são relatadas e
+    # puladas, sem abortar o restante. Cada agente recebe senha temporária e primeiro_acesso=1.
+    # Três fases, para a escrita do banco não ficar presa esperando o KDF:
+    #   1. lê e valida o arquivo inteiro (erro de leitura/decodificação sai aqui, antes de gravar);
+    #   2. gera os hashes das senhas temporárias em lotes, fora de transação;
+    #   3. grava tudo numa transação curta, conferindo de novo as matrículas (cadastro feito
+    #      enquanto o hash rodava é relatado como já cadastrado).
+    # progresso(n_linhas_processadas) é chamado a cada lote da fase 2.
+    # Retorna {'inseridos': n, 'problemas': [(linha, matricula, motivo)], 'senhas': [(matricula, senha)]}.
+    problemas = []
+    vistas = set()
+
+    with pool.conexao() as conn:
+        cargos = {_normalizar(nome): nome for (nome,) in conn.execute("SELECT nome FROM cargos")}
+
+    def existentes(conn, matriculas):
+        cadastradas = set()
+        for inicio in range(0, len(matriculas), tamanho_lote):
+            lote = matriculas[inicio:inicio + tamanho_lote]
+            marcadores = ','.join('?' * len(lote))
+            cadastradas.update(m for (m,) in conn.execute(
+                f"SELECT matricula FROM agentes WHERE matricula IN ({marcadores})", lote))
+        return cadastradas
+
+    validas, lidas = [], 0
+    for numero, dados in linhas:
+        lidas += 1
+        matricula = dados['matricula']
+        graduacao = cargos.get(_normalizar(dados['graduacao']))
+        if not matricula or not dados['nome']:
+            problemas.append((numero, matricula, "Matrícula e nome são obrigatórios"))
+        elif graduacao is None:
+            problemas.append((numero, matricula, f"Graduação não cadastrada: {dados['graduacao']}"))
+        elif matricula in vistas:
+            problemas.append((numero, matricula, "Matrícula repetida no arquivo"))
+        else:
+            vistas.add(matricula)
+            validas.append((numero, matricula, dados['nome'], graduacao, dados['lotacao']))
+
+    with pool.conexao() as conn:
+        ja_cadastradas = existentes(conn, [r[1] for r in validas])
+    candidatos = [r for r in validas if r[1] not in ja_cadastradas]
+    # Senha temporária (aleatória, trocada no 1º acesso): custo menor do KDF, calculado
+    # em paralelo no pool; o login regrava com o custo normal
+    temporarias = [gerar_senha_temporaria() for _ in candidatos]
+    hashes = []
+    for inicio in range(0, len(candidatos), tamanho_lote):
+        hashes += gerar_hashes_no_pool(temporarias[inicio:inicio + tamanho_lote], CUSTO_PROVISORIO_LOG2)
+        if progresso:
+            progresso(candidatos[min(inicio + tamanho_lote, len(candidatos)) - 1][0] - 1)
+
+    def inserir(conn):
+        cadastradas = existentes(conn, [r[1] for r in candidatos])
+        conn.executemany("INSERT INTO agentes (matricula, nome, graduacao, lotacao, senha, primeiro_acesso) "
+                         "VALUES (?, ?, ?, ?, ?, 1)",
+                         [(matricula, nome, graduacao, lotacao, h)
+                          for (_, matricula, nome, graduacao, lotacao), h in zip(candidatos, hashes)
+                          if matricula not in cadastradas])
+        return cadastradas
+    cadastradas = (pool.escrever(inserir) if candidatos else set()) | ja_cadastradas
+    if progresso:
+        progresso(lidas)
+
+    problemas.extend((numero, matricula, "Matrícula já cadastrada")
+                     for numero, matricula, *_ in validas if matricula in cadastradas)
+    problemas.sort(key=lambda p: p[0])
+    senhas = [(matricula, senha) for (_, matricula, *_), senha in zip(candidatos, temporarias)
+              if matricula not in cadastradas]
+    inseridos = len(senhas)
+    return {'inseridos': inseridos, 'problemas': problemas, 'senhas': senhas}
+
+
+# --- EXPORTAÇÕES (lista da escala, extrato de pagamento, auditoria) ---
+# As linhas saem do cursor em blocos direto para o escritor CSV/XLSX: a memória usada
+# não depende do período exportado (nada de DataFrame com o join inteiro).
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+EXPORTACOES = {
+    'escala': "Lista da escala (confirmados, espera e saídas)",
+    'pagamento': "Extrato mensal de pagamento por agente",
+    'auditoria': "Auditoria completa das inscrições",
+}
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _consulta_exportacao(tipo, id_vaga=None, mes=None, desde=None, ate=None, historico=False):
+    # historico=True lê das visões que juntam o banco principal e o arquivo frio
+    vagas, inscricoes = (VISOES_HISTORICO[t] if historico else t for t in ('vagas_ras', 'inscricoes'))
+    if tipo == 'escala':
+        if id_vaga is None:
+            raise ValueError("Informe a escala a exportar.")
+        # Confirmados primeiro, depois a fila na ordem de promoção
+        return f"""
+            SELECT v.id AS id_vaga, v.evento, v.data_inicio, v.hora_inicio, v.hora_fim, v.valor,
+                   a.matricula, a.nome, a.graduacao, a.lotacao,
+                   i.status, i.posicao_fila, i.data_inscricao
+            FROM {inscricoes} i
+            JOIN {vagas} v ON v.id = i.id_vaga
+            JOIN agentes a ON a.id = i.id_agente
+            WHERE i.id_vaga = ?
+            ORDER BY CASE WHEN i.status IN ('ATIVO', 'PENDENTE_SAIDA') THEN 0
+                          WHEN i.status = 'ESPERA' THEN 1 ELSE 2 END,
+                     i.posicao_fila, i.data_inscricao, i.id
+        """, [id_vaga]
+
+    filtros, params = [], []
+    if mes:
+        # 'AAAA-MM': faixa em data_inicio (ix_vagas_data)
+        filtros.append("v.data_inicio >= ? AND v.data_inicio < date(?, '+1 month')")
+        params.extend([mes + '-01', mes + '-01'])
+    if desde:
+        filtros.append("v.data_inicio >= ?")
+        params.append(str(desde))
+    if ate:
+        filtros.append("v.data_inicio <= ?")
+        params.append(str(ate))
+
+    if tipo == 'pagamento':
+        # Mesmas regras dos resumos gerenciais: conta quem ocupa a vaga, mês da data da escala.
+        # Totais do agente no mês repetidos em cada linha (a folha agrupa por matrícula).
+        # Com período, CROSS JOIN fixa a faixa de datas (ix_vagas_data) como laço externo.
+        where = " AND ".join([f"i.status IN {STATUS_CONFIRMADO}"] + filtros)
+        juncao = "CROSS JOIN" if filtros else "JOIN"
+        return f"""
+            SELECT substr(v.data_inicio, 1, 7) AS mes, a.matricula, a.nome, a.graduacao, a.lotacao,
+                   v.data_inicio, v.evento, v.hora_inicio, v.hora_fim,
+                   ROUND((julianday(v.fim) - julianday(v.inicio)) * 24, 2) AS horas,
+                   COALESCE(v.valor, 0) AS valor,
+                   COUNT(*) OVER agente_mes AS escalas_no_mes,
+                   ROUND(SUM((julianday(v.fim) - julianday(v.inicio)) * 24) OVER agente_mes, 2) AS horas_no_mes,
+                   SUM(COALESCE(v.valor, 0)) OVER agente_mes AS valor_no_mes
+            FROM {vagas} v
+            {juncao} {inscricoes} i ON i.id_vaga = v.id
+            JOIN agentes a ON a.id = i.id_agente
+            WHERE {where}
+            WINDOW agente_mes AS (PARTITION BY substr(v.data_inicio, 1, 7), a.id)
+            ORDER BY mes, a.nome, a.matricula, v.data_inicio, v.hora_inicio
+        """, params
+
+    if tipo == 'auditoria':
+        where = ("WHERE " + " AND ".join(filtros)) if filtros else ""
+        return f"""
+            SELECT i.id AS id_inscricao, i.id_vaga, v.evento, v.data_inicio, v.hora_inicio, v.hora_fim,
+                   v.valor, v.modo_alocacao, v.cancelada, v.sorteada_em, v.semente_sorteio,
+                   i.id_agente, a.matricula, a.nome, a.graduacao, a.lotacao,
+                   i.status, i.posicao_fila, i.data_inscricao
+            FROM {inscricoes} i
+            JOIN {vagas} v ON v.id = i.id_vaga
+            JOIN agentes a ON a.id = i.id_agente
+            {where}
+            ORDER BY i.id
+        """, params
+
+    raise ValueError(f"Exportação desconhecida: {tipo}")
+
+
+def linhas_exportacao(pool, tipo, id_vaga=None, mes=None, desde=None, ate=None, historico=False,
+                      tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    # Gerador: primeiro o cabeçalho, depois as linhas em blocos de fetchmany.
+    # A conexão (do pool, ou avulsa com o arquivo anexado) fica presa até o gerador terminar.
+    sql, params = _consulta_exportacao(tipo, id_vaga, mes, desde, ate, historico)
+    with (conexao_historico(pool.caminho) if historico else pool.conexao()) as conn:
+        cur = conn.execute(sql, params)
+        yield [d[0] for d in cur.description]
+        while True:
+            bloco = cur.fetchmany(tamanho_lote)
+            if not bloco:
+                break
+            yield from bloco
+
+
+def escrever_csv(linhas, destino):
+    # destino: arquivo binário. BOM UTF-8 para o Excel reconhecer os acentos.
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    try:
+        csv.writer(texto).writerows(linhas)
+    finally:
+        texto.flush()
+        texto.detach()
+
+
+def escrever_xlsx(linhas, destino, titulo='RAS'):
+    # Modo write_only do openpyxl: as linhas vão para o disco conforme chegam
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError("Exportação em XLSX requer o pacote openpyxl (pip install openpyxl).") from None
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(titulo[:31])
+    for linha in linhas:
+        aba.append(list(linha))
+    planilha.save(destino)
+
+
+def formatos_disponiveis():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return ['csv']
+    return list(FORMATOS_EXPORTACAO)
+
+
+def exportar(pool, tipo, formato, destino, **filtros):
+    # Grava a exportação em destino (arquivo binário). Retorna o número de linhas (sem cabeçalho).
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    contagem = [-1]
+
+    def contar(linhas):
+        for linha in linhas:
+            contagem[0] += 1
+            yield linha
+
+    linhas = contar(linhas_exportacao(pool, tipo, **filtros))
+    if formato == 'xlsx':
+        escrever_xlsx(linhas, destino, titulo=tipo)
+    else:
+        escrever_csv(linhas, destino)
+    return max(contagem[0], 0)
+
+
+def meses_com_escalas(pool):
+    # Meses com escalas confirmadas, do mais recente para o mais antigo (resumo_mes)
+    with pool.conexao() as conn:
+        return [m for (m,) in conn.execute("SELECT mes FROM resumo_mes WHERE escalas > 0 ORDER BY mes DESC")]
@@ -0,0 +1,847 @@
+import contextvars
+import functools
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from ras_perfil import ConexaoPerfilada
+
+# --- CAMADA DE CONEXÃO (SQLite em modo WAL) ---
+# Caminho do banco pode ser trocado por variável de ambiente (testes, carga, homologação)
+DB_PATH = os.environ.get('RAS_DB_PATH', 'ras_database_v6.db')
+BUSY_TIMEOUT_MS = 5000
+TAMANHO_POOL = 8
+TAMANHO_LOTE_ESCRITA = 64
+
+
+def abrir_conexao(caminho=DB_PATH):
+    # isolation_level=None: o próprio código controla BEGIN/COMMIT (ver transacao()).
+    # ConexaoPerfilada: tempos por consulta para a página Diagnóstico (ras_perfil)
+    conn = sqlite3.connect(caminho, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           check_same_thread=False, factory=ConexaoPerfilada)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class FilaEscrita:
+    # Thread escritora única: dona da conexão de escrita do processo. Os comandos
+    # (funcao(conn) -> resultado) chegam por uma fila; tudo que estiver enfileirado
+    # quando a thread fica livre vira um lote com um único BEGIN IMMEDIATE/COMMIT
+    # (group commit). Cada comando roda em SAVEPOINT próprio: exceção de um desfaz só
+    # o que ele fez, sem derrubar os outros do lote. O resultado (ou a exceção) só é
+    # entregue ao Future depois do COMMIT, então quem espera já enxerga a escrita.
+
+    def __init__(self, caminho=DB_PATH, tamanho_lote=TAMANHO_LOTE_ESCRITA):
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self._fila = queue.SimpleQueue()
+        self._conn = abrir_conexao(caminho)
+        self.lotes = self.comandos = 0  # estatística: comandos / lotes = tamanho médio do group commit
+        self._thread = threading.Thread(target=self._rodar, name='ras-escritor', daemon=True)
+        self._thread.start()
+
+    def enviar(self, funcao, *args, **kwargs):
+        # O comando roda no contexto de quem enviou: o perfil atribui as consultas à
+        # execução/tela que pediu a escrita
+        futuro = Future()
+        self._fila.put((futuro, functools.partial(contextvars.copy_context().run, funcao), args, kwargs))
+        return futuro
+
+    def executar(self, funcao, *args, **kwargs):
+        return self.enviar(funcao, *args, **kwargs).result()
+
+    def _rodar(self):
+        while True:
+            comando = self._fila.get()
+            if comando is None:
+                break
+            lote = [comando]
+            while len(lote) < self.tamanho_lote:
+                try:
+                    comando = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if comando is None:
+                    self._fila.put(None)
+                    break
+                lote.append(comando)
+            self._gravar_lote(lote)
+        self._conn.close()
+
+    def _gravar_lote(self, lote):
+        conn = self._conn
+        lote = [comando for comando in lote if comando[0].set_running_or_notify_cancel()]
+        if not lote:
+            return
+        self.lotes += 1
+        self.comandos += len(lote)
+        resultados = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for _, funcao, args, kwargs in lote:
+                conn.execute("SAVEPOINT comando")
+                try:
+                    resultados.append((True, funcao(conn, *args, **kwargs)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO comando")
+                    resultados.append((False, e))
+                conn.execute("RELEASE comando")
+            conn.commit()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            # Lote inteiro perdido (BEGIN/COMMIT falhou): todos recebem a exceção
+            for futuro, *_ in lote:
+                futuro.set_exception(e)
+            return
+        for (futuro, *_), (ok, valor) in zip(lote, resultados):
+            if ok:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
+
+    def fechar(self):
+        self._fila.put(None)
+        self._thread.join()
+
+
+class PoolConexoes:
+    # Pool pequeno de conexões já configuradas, compartilhado entre as sessões.
+    # Cada conexão é usada por uma thread de cada vez (checkout/devolução pela fila).
+    # Com fila_escrita=True as escritas feitas por escrever() passam pela FilaEscrita;
+    # as conexões do pool continuam servindo leituras em paralelo (WAL).
+
+    def __init__(self, caminho=DB_PATH, tamanho=TAMANHO_POOL, fila_escrita=False):
+        self.caminho = caminho
+        self._livres = queue.LifoQueue()
+        self._todas = []
+        for _ in range(tamanho):
+            conn = abrir_conexao(caminho)
+            self._todas.append(conn)
+            self._livres.put(conn)
+        self.fila = FilaEscrita(caminho) if fila_escrita else None
+
+    @contextmanager
+    def conexao(self):
+        # Leitura: cada comando roda em autocommit (leitores WAL não bloqueiam escritores)
+        conn = self._livres.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._livres.put(conn)
+
+    @contextmanager
+    def transacao(self, imediata=False):
+        # Escrita: COMMIT se o bloco terminar bem, ROLLBACK em qualquer exceção.
+        # imediata=True pega o lock de escrita já no BEGIN (evita upgrade de lock no meio)
+        with self.conexao() as conn:
+            conn.execute("BEGIN IMMEDIATE" if imediata else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def escrever(self, funcao, *args, **kwargs):
+        # Executa funcao(conn, ...) dentro de uma transação de escrita e devolve o resultado.
+        # Exceções de funcao desfazem o que ela gravou e são relançadas para quem chamou.
+        if self.fila:
+            return self.fila.executar(funcao, *args, **kwargs)
+        with self.transacao(imediata=True) as conn:
+            return funcao(conn, *args, **kwargs)
+
+    def fechar(self):
+        if self.fila:
+            self.fila.fechar()
+            self.fila = None
+        for conn in self._todas:
+            conn.close()
+        self._todas = []
+
+
+class MonitorVersoes:
+    # Versões das tabelas para chave de cache. Usa uma conexão própria que nunca escreve:
+    # PRAGMA data_version dela só muda quando outra conexão faz COMMIT, então enquanto
+    # nada mudou não há leitura de tabela nenhuma, só a consulta ao PRAGMA.
+
+    def __init__(self, caminho=DB_PATH):
+        self._conn = abrir_conexao(caminho)
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._versoes = {}
+
+    def versoes(self):
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._versoes = dict(self._conn.execute("SELECT tabela, versao FROM versoes_tabela"))
+                self._data_version = data_version
+            return self._versoes
+
+    def versao(self, *tabelas):
+        versoes = self.versoes()
+        return tuple(versoes.get(t, 0) for t in tabelas)
+
+    def fechar(self):
+        self._conn.close()
+
+
+# --- MIGRAÇÕES (versão do schema em PRAGMA user_version) ---
+# Cada migração roda uma única vez, em transação própria, e atualiza o banco
+# existente no lugar. Nunca editar uma migração já publicada: criar uma nova no fim da lista.
+
+def _migracao_001_schema_base(conn):
+    # 1. Tabela Agentes
+    conn.execute('''CREATE TABLE IF NOT EXISTS agentes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    matricula TEXT UNIQUE,
+                    nome TEXT,
+                    graduacao TEXT,
+                    lotacao TEXT,
+                    senha TEXT,
+                    primeiro_acesso INTEGER DEFAULT 0
+                )''')
+
+    # 2. Tabela Admin
+    conn.execute('''CREATE TABLE IF NOT EXISTS administradores (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario TEXT UNIQUE,
+                    senha TEXT,
+                    primeiro_acesso INTEGER DEFAULT 1
+                )''')
+
+    # 3. Tabela Vagas
+    conn.execute('''CREATE TABLE IF NOT EXISTS vagas_ras (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    evento TEXT,
+                    data_inicio DATE,
+                    hora_inicio TIME,
+                    hora_fim TIME,
+                    vagas_totais INTEGER,
+                    valor REAL
+                )''')
+
+    # 4. Tabela Inscrições
+    conn.execute('''CREATE TABLE IF NOT EXISTS inscricoes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id_vaga INTEGER,
+                    id_agente INTEGER,
+                    status TEXT DEFAULT 'ATIVO',
+                    data_inscricao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(id_vaga) REFERENCES vagas_ras(id),
+                    FOREIGN KEY(id_agente) REFERENCES agentes(id)
+                )''')
+
+    # 5. NOVA TABELA: Cargos
+    conn.execute('''CREATE TABLE IF NOT EXISTS cargos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nome TEXT UNIQUE
+                )''')
+
+
+def _migracao_002_inscricao_unica(conn):
+    # Uma inscrição por agente em cada vaga (substitui a checagem "lê e depois insere").
+    # Duplicatas antigas, geradas por corrida entre cliques, são removidas mantendo a mais antiga
+    conn.execute("""DELETE FROM inscricoes WHERE id NOT IN (
+                        SELECT MIN(id) FROM inscricoes GROUP BY id_vaga, id_agente
+                    )""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_inscricoes_vaga_agente ON inscricoes (id_vaga, id_agente)")
+
+
+def _migracao_003_indices_consultas(conn):
+    # Ocupação por vaga e fila de espera em ordem de chegada (id_vaga, status, data_inscricao)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_inscricoes_vaga_status ON inscricoes (id_vaga, status, data_inscricao)")
+    # "Meus Agendamentos" e exclusão de agente
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_inscricoes_agente ON inscricoes (id_agente)")
+    # Aviso de desistências pendentes (status = 'PENDENTE_SAIDA')
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_inscricoes_status ON inscricoes (status)")
+    # Listagem de escalas por data
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vagas_data ON vagas_ras (data_inicio)")
+
+
+def _migracao_004_contadores_ocupacao(conn):
+    # Ocupação desnormalizada em vagas_ras, mantida por triggers em inscricoes.
+    # inscritos_ativos conta quem ocupa a vaga (ATIVO e PENDENTE_SAIDA: o agente só
+    # libera a vaga quando o comando aprova a saída); em_espera conta a fila.
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN inscritos_ativos INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN em_espera INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""CREATE TRIGGER trg_ocupacao_insert AFTER INSERT ON inscricoes BEGIN
+                        UPDATE vagas_ras
+                        SET inscritos_ativos = inscritos_ativos + (NEW.status IN ('ATIVO', 'PENDENTE_SAIDA')),
+                            em_espera = em_espera + (NEW.status = 'ESPERA')
+                        WHERE id = NEW.id_vaga;
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_ocupacao_delete AFTER DELETE ON inscricoes BEGIN
+                        UPDATE vagas_ras
+                        SET inscritos_ativos = inscritos_ativos - (OLD.status IN ('ATIVO', 'PENDENTE_SAIDA')),
+                            em_espera = em_espera - (OLD.status = 'ESPERA')
+                        WHERE id = OLD.id_vaga;
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_ocupacao_update AFTER UPDATE OF status, id_vaga ON inscricoes BEGIN
+                        UPDATE vagas_ras
+                        SET inscritos_ativos = inscritos_ativos - (OLD.status IN ('ATIVO', 'PENDENTE_SAIDA')),
+                            em_espera = em_espera - (OLD.status = 'ESPERA')
+                        WHERE id = OLD.id_vaga;
+                        UPDATE vagas_ras
+                        SET inscritos_ativos = inscritos_ativos + (NEW.status IN ('ATIVO', 'PENDENTE_SAIDA')),
+                            em_espera = em_espera + (NEW.status = 'ESPERA')
+                        WHERE id = NEW.id_vaga;
+                    END""")
+    recontar_ocupacao(conn, corrigir=True)
+
+
+def _migracao_005_busca_textual(conn):
+    # Índices FTS5 (conteúdo externo) para a "Lista de Inscrições": nome do evento
+    # e nome/matrícula do agente, sem acento e sem diferenciar maiúsculas.
+    # Os triggers só disparam quando o texto muda (não nas atualizações de ocupação).
+    conn.execute("""CREATE VIRTUAL TABLE vagas_fts USING fts5(
+                        evento, content='vagas_ras', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute("""CREATE VIRTUAL TABLE agentes_fts USING fts5(
+                        nome, matricula, content='agentes', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute("""CREATE TRIGGER trg_vagas_fts_insert AFTER INSERT ON vagas_ras BEGIN
+                        INSERT INTO vagas_fts (rowid, evento) VALUES (NEW.id, NEW.evento);
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_vagas_fts_delete AFTER DELETE ON vagas_ras BEGIN
+                        INSERT INTO vagas_fts (vagas_fts, rowid, evento) VALUES ('delete', OLD.id, OLD.evento);
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_vagas_fts_update AFTER UPDATE OF evento ON vagas_ras BEGIN
+                        INSERT INTO vagas_fts (vagas_fts, rowid, evento) VALUES ('delete', OLD.id, OLD.evento);
+                        INSERT INTO vagas_fts (rowid, evento) VALUES (NEW.id, NEW.evento);
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_agentes_fts_insert AFTER INSERT ON agentes BEGIN
+                        INSERT INTO agentes_fts (rowid, nome, matricula) VALUES (NEW.id, NEW.nome, NEW.matricula);
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_agentes_fts_delete AFTER DELETE ON agentes BEGIN
+                        INSERT INTO agentes_fts (agentes_fts, rowid, nome, matricula)
+                        VALUES ('delete', OLD.id, OLD.nome, OLD.matricula);
+                    END""")
+    conn.execute("""CREATE TRIGGER trg_agentes_fts_update AFTER UPDATE OF nome, matricula ON agentes BEGIN
+                        INSERT INTO agentes_fts (agentes_fts, rowid, nome, matricula)
+                        VALUES ('delete', OLD.id, OLD.nome, OLD.matricula);
+                        INSERT INTO agentes_fts (rowid, nome, matricula) VALUES (NEW.id, NEW.nome, NEW.matricula);
+                    END""")
+    conn.execute("INSERT INTO vagas_fts (vagas_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO agentes_fts (agentes_fts) VALUES ('rebuild')")
+
+
+# --- RESUMOS GERENCIAIS (mantidos incrementalmente) ---
+# Uma escala conta para relatório/pagamento enquanto o agente ocupa a vaga
+STATUS_CONFIRMADO = "('ATIVO', 'PENDENTE_SAIDA')"
+
+
+def _horas_sql(v):
+    # Duração da escala em horas a partir de hora_inicio/hora_fim ('HH:MM:SS');
+    # fim antes do início = escala que vira a noite
+    return (f"COALESCE(ROUND((julianday('2000-01-01 ' || {v}.hora_fim) - julianday('2000-01-01 ' || {v}.hora_inicio)) * 24"
+            f" + CASE WHEN {v}.hora_fim < {v}.hora_inicio THEN 24 ELSE 0 END, 2), 0)")
+
+
+def _sql_somar_resumos(sinal, agente, v, filtro):
+    # Comandos UPSERT que somam (sinal=+1) ou subtraem (sinal=-1) as escalas selecionadas
+    # por "FROM {filtro}" nos três resumos (filtro sempre com WHERE: evita a ambiguidade do UPSERT)
+    horas = _horas_sql(v)
+    mes = f"substr({v}.data_inicio, 1, 7)"
+    return f"""
+        INSERT INTO resumo_agente_mes (id_agente, mes, escalas, horas, valor)
+        SELECT {agente}, {mes}, {sinal}, {sinal} * {horas}, {sinal} * COALESCE({v}.valor, 0) FROM {filtro}
+        ON CONFLICT (id_agente, mes) DO UPDATE SET escalas = escalas + excluded.escalas,
+            horas = horas + excluded.horas, valor = valor + excluded.valor;
+        INSERT INTO resumo_agentes (id_agente, escalas, horas, valor)
+        SELECT {agente}, {sinal}, {sinal} * {horas}, {sinal} * COALESCE({v}.valor, 0) FROM {filtro}
+        ON CONFLICT (id_agente) DO UPDATE SET escalas = escalas + excluded.escalas,
+            horas = horas + excluded.horas, valor = valor + excluded.valor;
+        INSERT INTO resumo_mes (mes, escalas, horas, valor)
+        SELECT {mes}, {sinal}, {sinal} * {horas}, {sinal} * COALESCE({v}.valor, 0) FROM {filtro}
+        ON CONFLICT (mes) DO UPDATE SET escalas = escalas + excluded.escalas,
+            horas = horas + excluded.horas, valor = valor + excluded.valor;"""
+
+
+def _migracao_006_resumos_gerenciais(conn):
+    # Totais por agente/mês, por agente e por mês (escalas, horas, R$ devidos), atualizados
+    # a cada mudança de status em inscricoes. Os totais por vaga já estão em vagas_ras.
+    conn.execute("""CREATE TABLE resumo_agente_mes (
+                        id_agente INTEGER,
+                        mes TEXT,
+                        escalas INTEGER NOT NULL DEFAULT 0,
+                        horas REAL NOT NULL DEFAULT 0,
+                        valor REAL NOT NULL DEFAULT 0,
+                        PRIMARY KEY (id_agente, mes)
+                    ) WITHOUT ROWID""")
+    conn.execute("""CREATE TABLE resumo_agentes (
+                        id_agente INTEGER PRIMARY KEY,
+                        escalas INTEGER NOT NULL DEFAULT 0,
+                        horas REAL NOT NULL DEFAULT 0,
+                        valor REAL NOT NULL DEFAULT 0
+                    )""")
+    conn.execute("CREATE INDEX ix_resumo_agentes_escalas ON resumo_agentes (escalas)")
+    conn.execute("""CREATE TABLE resumo_mes (
+                        mes TEXT PRIMARY KEY,
+                        escalas INTEGER NOT NULL DEFAULT 0,
+                        horas REAL NOT NULL DEFAULT 0,
+                        valor REAL NOT NULL DEFAULT 0
+                    )""")
+
+    vaga_nova = "vagas_ras v WHERE v.id = NEW.id_vaga"
+    vaga_antiga = "vagas_ras v WHERE v.id = OLD.id_vaga"
+    # Um execute por trigger: executescript faria COMMIT no meio da migração
+    triggers = [
+        f"""CREATE TRIGGER trg_resumo_insert AFTER INSERT ON inscricoes
+            WHEN NEW.status IN {STATUS_CONFIRMADO} BEGIN
+                {_sql_somar_resumos(1, 'NEW.id_agente', 'v', vaga_nova)}
+            END""",
+        f"""CREATE TRIGGER trg_resumo_delete AFTER DELETE ON inscricoes
+            WHEN OLD.status IN {STATUS_CONFIRMADO} BEGIN
+                {_sql_somar_resumos(-1, 'OLD.id_agente', 'v', vaga_antiga)}
+            END""",
+        f"""CREATE TRIGGER trg_resumo_update_sai AFTER UPDATE OF status, id_vaga, id_agente ON inscricoes
+            WHEN OLD.status IN {STATUS_CONFIRMADO} BEGIN
+                {_sql_somar_resumos(-1, 'OLD.id_agente', 'v', vaga_antiga)}
+            END""",
+        f"""CREATE TRIGGER trg_resumo_update_entra AFTER UPDATE OF status, id_vaga, id_agente ON inscricoes
+            WHEN NEW.status IN {STATUS_CONFIRMADO} BEGIN
+                {_sql_somar_resumos(1, 'NEW.id_agente', 'v', vaga_nova)}
+            END""",
+        f"""CREATE TRIGGER trg_resumo_vaga_alterada AFTER UPDATE OF valor, data_inicio, hora_inicio, hora_fim ON vagas_ras
+            BEGIN
+                {_sql_somar_resumos(-1, 'i.id_agente', 'OLD',
+                                    f"inscricoes i WHERE i.id_vaga = OLD.id AND i.status IN {STATUS_CONFIRMADO}")}
+                {_sql_somar_resumos(1, 'i.id_agente', 'NEW',
+                                    f"inscricoes i WHERE i.id_vaga = NEW.id AND i.status IN {STATUS_CONFIRMADO}")}
+            END""",
+    ]
+    for sql in triggers:
+        conn.execute(sql)
+    recalcular_resumos(conn, corrigir=True)
+
+
+TABELAS_VERSIONADAS = ('cargos', 'agentes', 'vagas_ras', 'inscricoes')
+
+
+def _migracao_007_versoes_tabela(conn):
+    # Contador de geração por tabela, incrementado por trigger em qualquer escrita
+    # (app, CLI ou outro processo). Base do cache de leitura do app (MonitorVersoes).
+    conn.execute("""CREATE TABLE versoes_tabela (
+                        tabela TEXT PRIMARY KEY,
+                        versao INTEGER NOT NULL DEFAULT 0
+                    )""")
+    for tabela in TABELAS_VERSIONADAS:
+        _versionar_tabela(conn, tabela)
+
+
+def _versionar_tabela(conn, tabela):
+    conn.execute("INSERT INTO versoes_tabela (tabela) VALUES (?)", (tabela,))
+    for operacao in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""CREATE TRIGGER trg_versao_{tabela}_{operacao.lower()} AFTER {operacao} ON {tabela} BEGIN
+                             UPDATE versoes_tabela SET versao = versao + 1 WHERE tabela = '{tabela}';
+                         END""")
+
+
+def _migracao_008_cancelamento_vaga(conn):
+    # Escala cancelada some da listagem e não aceita inscrição; as inscrições dela
+    # passam a CANCELADA (fora da ocupação e dos resumos, pelos triggers existentes)
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN cancelada INTEGER NOT NULL DEFAULT 0")
+
+
+def _migracao_009_alocacao_por_sorteio(conn):
+    # Escalas de alta procura podem ser alocadas por sorteio: durante a janela de interesse
+    # as inscrições entram como INTERESSADO (fora da ocupação e dos resumos) e um único
+    # sorteio em lote decide quem fica ATIVO e a ordem da ESPERA (posicao_fila).
+    # Nas escalas por ordem de chegada posicao_fila fica NULL e vale data_inscricao.
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN modo_alocacao TEXT NOT NULL DEFAULT 'ORDEM'")
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN fim_interesse TEXT")
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN sorteada_em TEXT")
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN semente_sorteio INTEGER")
+    conn.execute("ALTER TABLE inscricoes ADD COLUMN posicao_fila INTEGER")
+    # A fila passa a ser ordenada por (posicao_fila, data_inscricao)
+    conn.execute("DROP INDEX ix_inscricoes_vaga_status")
+    conn.execute("CREATE INDEX ix_inscricoes_vaga_status ON inscricoes (id_vaga, status, posicao_fila, data_inscricao)")
+    # Sorteios vencidos e ainda não executados (consultado a cada carregamento de página)
+    conn.execute("""CREATE INDEX ix_vagas_sorteio_pendente ON vagas_ras (fim_interesse)
+                    WHERE sorteada_em IS NULL AND modo_alocacao <> 'ORDEM'""")
+
+
+# Status que prendem a agenda do agente: quem está na vaga, na fila ou no sorteio
+STATUS_AGENDA = "('ATIVO', 'PENDENTE_SAIDA', 'ESPERA', 'INTERESSADO')"
+
+
+def _intervalo_sql(v):
+    # (inicio, fim) da escala como 'AAAA-MM-DD HH:MM:SS', comparáveis como texto;
+    # fim antes do início = escala que vira a noite (termina no dia seguinte)
+    return (f"datetime({v}.data_inicio || ' ' || {v}.hora_inicio)",
+            f"datetime({v}.data_inicio || ' ' || {v}.hora_fim, "
+            f"CASE WHEN {v}.hora_fim < {v}.hora_inicio THEN '+1 day' ELSE '+0 day' END)")
+
+
+def _migracao_010_intervalos_agenda(conn):
+    # Início/fim da escala como timestamps, em vagas_ras e copiados em inscricoes:
+    # conflito de horário e horas do mês viram uma busca por faixa em (id_agente, inicio)
+    # dentro da transação da inscrição. Mantidos por triggers quando a escala é criada/editada.
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN inicio TEXT")
+    conn.execute("ALTER TABLE vagas_ras ADD COLUMN fim TEXT")
+    conn.execute("ALTER TABLE inscricoes ADD COLUMN inicio TEXT")
+    conn.execute("ALTER TABLE inscricoes ADD COLUMN fim TEXT")
+    inicio, fim = _intervalo_sql('NEW')
+    conn.execute(f"""CREATE TRIGGER trg_intervalo_vaga_insert AFTER INSERT ON vagas_ras BEGIN
+                         UPDATE vagas_ras SET inicio = {inicio}, fim = {fim} WHERE id = NEW.id;
+                     END""")
+    conn.execute(f"""CREATE TRIGGER trg_intervalo_vaga_update AFTER UPDATE OF data_inicio, hora_inicio, hora_fim ON vagas_ras
+                     BEGIN
+                         UPDATE vagas_ras SET inicio = {inicio}, fim = {fim} WHERE id = NEW.id;
+                         UPDATE inscricoes SET inicio = {inicio}, fim = {fim} WHERE id_vaga = NEW.id;
+                     END""")
+    inicio, fim = _intervalo_sql('vagas_ras')
+    conn.execute(f"UPDATE vagas_ras SET inicio = {inicio}, fim = {fim}")
+    conn.execute("""UPDATE inscricoes SET (inicio, fim) = (SELECT v.inicio, v.fim FROM vagas_ras v
+                                                           WHERE v.id = inscricoes.id_vaga)""")
+    # Cobre a busca de conflitos sem ler a tabela; substitui ix_inscricoes_agente (mesmo prefixo)
+    conn.execute("CREATE INDEX ix_inscricoes_agente_inicio ON inscricoes (id_agente, inicio, fim, status)")
+    conn.execute("DROP INDEX ix_inscricoes_agente")
+    # Parâmetros ajustáveis pelo comando (limite de horas de RAS por mês; vazio = sem limite)
+    conn.execute("CREATE TABLE parametros (chave TEXT PRIMARY KEY, valor TEXT)")
+    _versionar_tabela(conn, 'parametros')
+
+
+def _migracao_011_indices_agentes(conn):
+    # Busca de agentes em "Gerenciar Agentes": filtro por lotação/graduação já na ordem
+    # alfabética (LIMIT sem ordenar a tabela) e lista de lotações sem varrer agentes.
+    # O texto digitado (matrícula ou nome, sem acento) vai para agentes_fts.
+    conn.execute("CREATE INDEX ix_agentes_lotacao ON agentes (lotacao, nome)")
+    conn.execute("CREATE INDEX ix_agentes_graduacao ON agentes (graduacao, nome)")
+
+
+def _migracao_012_agente_ativo(conn):
+    # Desativação em vez de exclusão: o agente inativo não entra no sistema nem se inscreve,
+    # mas o histórico (escalas feitas, pagamentos, resumos) continua com ele
+    conn.execute("ALTER TABLE agentes ADD COLUMN ativo INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE agentes ADD COLUMN desativado_em TEXT")
+
+
+def _migracao_013_indices_agentes_matricula(conn):
+    # Homônimos saem em ordem de matrícula (ORDER BY nome, matricula): com a matrícula no
+    # índice o filtro por lotação/graduação continua sem ordenar as linhas (sem TEMP B-TREE)
+    conn.execute("DROP INDEX ix_agentes_lotacao")
+    conn.execute("DROP INDEX ix_agentes_graduacao")
+    conn.execute("CREATE INDEX ix_agentes_lotacao ON agentes (lotacao, nome, matricula)")
+    conn.execute("CREATE INDEX ix_agentes_graduacao ON agentes (graduacao, nome, matricula)")
+
+
+MIGRACOES = [
+    _migracao_001_schema_base,
+    _migracao_002_inscricao_unica,
+    _migracao_003_indices_consultas,
+    _migracao_004_contadores_ocupacao,
+    _migracao_005_busca_textual,
+    _migracao_006_resumos_gerenciais,
+    _migracao_007_versoes_tabela,
+    _migracao_008_cancelamento_vaga,
+    _migracao_009_alocacao_por_sorteio,
+    _migracao_010_intervalos_agenda,
+    _migracao_011_indices_agentes,
+    _migracao_012_agente_ativo,
+    _migracao_013_indices_agentes_matricula,
+]
+VERSAO_SCHEMA = len(MIGRACOES)
+
+
+def versao_schema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    # Aplica as migrações pendentes. A versão é relida dentro do BEGIN IMMEDIATE,
+    # então dois processos subindo ao mesmo tempo não aplicam a mesma migração duas vezes.
+    # Retorna a lista de versões aplicadas.
+    aplicadas = []
+    for versao, migracao in enumerate(MIGRACOES, start=1):
+        if versao_schema(conn) >= versao:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao_schema(conn) < versao:
+                migracao(conn)
+                conn.execute(f"PRAGMA user_version = {versao}")
+                aplicadas.append(versao)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return aplicadas
+
+
+# --- CONSULTAS QUENTES x ÍNDICES ---
+# SQL usado tal e qual pelo ras_core e conferido abaixo: mudar a consulta muda a verificação.
+SQL_BUSCA_AGENTES = """
+    SELECT id, matricula, nome, graduacao, lotacao, ativo
+    FROM agentes
+    WHERE {filtros}
+    ORDER BY nome, matricula
+    LIMIT ?
+"""
+SQL_LOTACOES = "SELECT DISTINCT lotacao FROM agentes WHERE lotacao <> '' ORDER BY lotacao"
+# i.inicio é a data/hora de início da escala copiada na inscrição: mesma ordem de
+# v.data_inicio, mas lida direto de ix_inscricoes_agente_inicio
+SQL_MINHAS_ESCALAS = """
+    SELECT i.id AS id_inscricao, v.evento, v.data_inicio, v.hora_inicio, v.hora_fim, i.status
+    FROM inscricoes i
+    JOIN vagas_ras v ON i.id_vaga = v.id
+    WHERE i.id_agente = ?
+    ORDER BY i.inicio
+"""
+
+# Cada consulta crítica e o índice que o plano (EXPLAIN QUERY PLAN) precisa usar.
+CONSULTAS_QUENTES = {
+    'ocupacao_da_vaga': (
+        "SELECT COUNT(*) FROM inscricoes WHERE id_vaga = ? AND status = 'ATIVO'",
+        'ix_inscricoes_vaga_status'),
+    'fila_de_espera': (
+        "SELECT id FROM inscricoes WHERE id_vaga = ? AND status = 'ESPERA' "
+        "ORDER BY posicao_fila, data_inscricao, id LIMIT 1",
+        'ix_inscricoes_vaga_status'),
+    'sorteios_vencidos': (
+        "SELECT id FROM vagas_ras WHERE sorteada_em IS NULL AND modo_alocacao <> 'ORDEM' AND fim_interesse <= ?",
+        'ix_vagas_sorteio_pendente'),
+    'inscricao_duplicada': (
+        "SELECT 1 FROM inscricoes WHERE id_vaga = ? AND id_agente = ?",
+        'ux_inscricoes_vaga_agente'),
+    'minhas_escalas': (SQL_MINHAS_ESCALAS, 'ix_inscricoes_agente_inicio'),
+    'conflito_de_horario': (
+        "SELECT id_vaga FROM inscricoes WHERE id_agente = ? AND inicio > ? AND inicio < ? AND fim > ? "
+        f"AND status IN {STATUS_AGENDA}",
+        'ix_inscricoes_agente_inicio'),
+    'desistencias_pendentes': (
+        "SELECT i.id FROM inscricoes i WHERE i.status = 'PENDENTE_SAIDA'",
+        'ix_inscricoes_status'),
+    'extrato_pagamento': (
+        "SELECT i.id FROM vagas_ras v CROSS JOIN inscricoes i ON i.id_vaga = v.id "
+        f"WHERE i.status IN {STATUS_CONFIRMADO} AND v.data_inicio >= ? AND v.data_inicio < date(?, '+1 month')",
+        'ix_vagas_data'),
+    'inscricoes_futuras_do_agente': (
+        f"SELECT id_vaga FROM inscricoes WHERE id_agente = ? AND inicio > ? AND status IN {STATUS_AGENDA}",
+        'ix_inscricoes_agente_inicio'),
+    'agentes_por_lotacao': (SQL_BUSCA_AGENTES.format(filtros="lotacao = ?"), 'ix_agentes_lotacao'),
+    'agentes_por_graduacao': (SQL_BUSCA_AGENTES.format(filtros="graduacao = ?"), 'ix_agentes_graduacao'),
+    'lista_de_lotacoes': (SQL_LOTACOES, 'ix_agentes_lotacao'),
+    'vagas_por_data': (
+        "SELECT id FROM vagas_ras WHERE data_inicio >= ? ORDER BY data_inicio",
+        'ix_vagas_data'),
+}
+
+
+def plano_consulta(conn, sql):
+    n_params = sql.count('?')
+    return [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * n_params)]
+
+
+def verificar_indices(conn):
+    # Retorna {nome: plano} das consultas quentes que NÃO usam o índice esperado
+    problemas = {}
+    for nome, (sql, indice) in CONSULTAS_QUENTES.items():
+        plano = plano_consulta(conn, sql)
+        if not any(indice in passo for passo in plano) or any('USE TEMP B-TREE' in passo for passo in plano):
+            problemas[nome] = plano
+    return problemas
+
+
+# --- CONSISTÊNCIA DOS CONTADORES DE OCUPAÇÃO ---
+_SQL_OCUPACAO_REAL = """
+    SELECT v.id, v.inscritos_ativos, v.em_espera,
+           (SELECT COUNT(*) FROM inscricoes i WHERE i.id_vaga = v.id AND i.status IN ('ATIVO', 'PENDENTE_SAIDA')),
+           (SELECT COUNT(*) FROM inscricoes i WHERE i.id_vaga = v.id AND i.status = 'ESPERA')
+    FROM vagas_ras v
+"""
+
+
+def recontar_ocupacao(conn, corrigir=False):
+    # Compara os contadores de vagas_ras com a contagem real em inscricoes.
+    # Retorna [(id_vaga, ativos_gravado, espera_gravado, ativos_real, espera_real)] divergentes;
+    # com corrigir=True regrava os valores reais (chamar dentro de uma transação).
+    divergentes = [linha for linha in conn.execute(_SQL_OCUPACAO_REAL)
+                   if (linha[1], linha[2]) != (linha[3], linha[4])]
+    if corrigir:
+        conn.executemany("UPDATE vagas_ras SET inscritos_ativos = ?, em_espera = ? WHERE id = ?",
+                         [(ativos, espera, id_vaga) for id_vaga, _, _, ativos, espera in divergentes])
+    return divergentes
+
+
+# --- CONSISTÊNCIA DOS RESUMOS GERENCIAIS ---
+def _resumos_reais(conn):
+    # Recalcula os três resumos do zero a partir de inscricoes x vagas_ras. Os resumos
+    # continuam contando as escalas arquivadas: com o arquivo anexado, a base é a visão histórica.
+    inscricoes, vagas = ('inscricoes_historico', 'vagas_historico') if arquivo_anexado(conn) else ('inscricoes', 'vagas_ras')
+    base = f"""FROM {inscricoes} i JOIN {vagas} v ON v.id = i.id_vaga
+               WHERE i.status IN {STATUS_CONFIRMADO}"""
+    soma = f"COUNT(*), ROUND(SUM({_horas_sql('v')}), 2), ROUND(SUM(COALESCE(v.valor, 0)), 2)"
+    return {
+        'resumo_agente_mes': {(r[0], r[1]): r[2:] for r in conn.execute(
+            f"SELECT i.id_agente, substr(v.data_inicio, 1, 7), {soma} {base} GROUP BY 1, 2")},
+        'resumo_agentes': {(r[0],): r[1:] for r in conn.execute(
+            f"SELECT i.id_agente, {soma} {base} GROUP BY 1")},
+        'resumo_mes': {(r[0],): r[1:] for r in conn.execute(
+            f"SELECT substr(v.data_inicio, 1, 7), {soma} {base} GROUP BY 1")},
+    }
+
+
+_CHAVES_RESUMO = {'resumo_agente_mes': ('id_agente', 'mes'), 'resumo_agentes': ('id_agente',), 'resumo_mes': ('mes',)}
+
+
+def recalcular_resumos(conn, corrigir=False):
+    # Compara os resumos gravados com o recálculo completo. Retorna {tabela: n_divergencias};
+    # com corrigir=True reescreve as tabelas (chamar dentro de uma transação).
+    reais = _resumos_reais(conn)
+    divergencias = {}
+    for tabela, chaves in _CHAVES_RESUMO.items():
+        gravados = {linha[:len(chaves)]: linha[len(chaves):] for linha in conn.execute(
+            f"SELECT {', '.join(chaves)}, escalas, horas, valor FROM {tabela} WHERE escalas != 0 OR valor != 0 OR horas != 0")}
+        esperado = reais[tabela]
+        n = sum(1 for k in set(gravados) | set(esperado)
+                if k not in gravados or k not in esperado
+                or gravados[k][0] != esperado[k][0]
+                or any(abs(a - b) > 0.01 for a, b in zip(gravados[k][1:], esperado[k][1:])))
+        if n:
+            divergencias[tabela] = n
+        if corrigir:
+            conn.execute(f"DELETE FROM {tabela}")
+            conn.executemany(f"INSERT INTO {tabela} ({', '.join(chaves)}, escalas, horas, valor) "
+                             f"VALUES ({', '.join('?' * (len(chaves) + 3))})",
+                             [k + v for k, v in esperado.items()])
+    return divergencias
+
+
+# --- ARQUIVO FRIO (escalas antigas fora do banco principal) ---
+# Escalas encerradas há mais de N dias e as inscrições delas vão para um segundo arquivo
+# SQLite, anexado (ATTACH ... AS arquivo) só quando um relatório histórico é pedido.
+# O banco principal fica pequeno (cabe no cache de páginas, backup rápido); o arquivo
+# fica em modo rollback-journal: um único arquivo, fácil de copiar.
+VISOES_HISTORICO = {'vagas_ras': 'vagas_historico', 'inscricoes': 'inscricoes_historico'}
+TAMANHO_LOTE_ARQUIVO = 200
+
+
+def caminho_arquivo(caminho=DB_PATH):
+    # ras_database_v6.db -> ras_database_v6_arquivo.db (ou RAS_ARQUIVO_PATH)
+    return os.environ.get('RAS_ARQUIVO_PATH') or os.path.splitext(caminho)[0] + '_arquivo.db'
+
+
+def _colunas(conn, tabela, esquema='main'):
+    return [(c[1], c[2]) for c in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+
+def _bancos_anexados(conn):
+    # {nome: arquivo} de PRAGMA database_list ('main', 'temp', 'arquivo'...)
+    return {linha[1]: linha[2] for linha in conn.execute("PRAGMA database_list")}
+
+
+def arquivo_anexado(conn):
+    return 'arquivo' in _bancos_anexados(conn)
+
+
+def anexar_arquivo(conn, caminho=None):
+    # ATTACH do arquivo (criado na primeira vez) + visões temporárias vagas_historico e
+    # inscricoes_historico (principal UNION ALL arquivo). Fora de transação.
+    # As tabelas do arquivo acompanham as colunas do principal (migrações novas viram ADD COLUMN).
+    if arquivo_anexado(conn):
+        return
+    conn.execute("ATTACH DATABASE ? AS arquivo", (caminho or caminho_arquivo(_bancos_anexados(conn)['main']),))
+    for tabela, visao in VISOES_HISTORICO.items():
+        colunas = _colunas(conn, tabela)
+        existentes = {nome for nome, _ in _colunas(conn, tabela, 'arquivo')}
+        if not existentes:
+            definicao = ", ".join("id INTEGER PRIMARY KEY" if nome == 'id' else f"{nome} {tipo}"
+                                  for nome, tipo in colunas)
+            conn.execute(f"CREATE TABLE arquivo.{tabela} ({definicao})")
+        for nome, tipo in colunas:
+            if existentes and nome not in existentes:
+                conn.execute(f"ALTER TABLE arquivo.{tabela} ADD COLUMN {nome} {tipo}")
+        # Linha que ainda está no principal (arquivamento interrompido no meio) vale a de lá
+        lista = ", ".join(nome for nome, _ in colunas)
+        conn.execute(f"""CREATE TEMP VIEW {visao} AS
+                             SELECT {lista} FROM main.{tabela}
+                             UNION ALL
+                             SELECT {lista} FROM arquivo.{tabela}
+                             WHERE id NOT IN (SELECT id FROM main.{tabela})""")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.ix_arquivo_vagas_data ON vagas_ras (data_inicio)")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.ix_arquivo_inscricoes_vaga ON inscricoes (id_vaga, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.ix_arquivo_inscricoes_agente ON inscricoes (id_agente, inicio)")
+
+
+@contextmanager
+def conexao_historico(caminho=DB_PATH, caminho_arq=None):
+    # Conexão avulsa com o arquivo anexado, para relatório histórico pedido explicitamente
+    # (as conexões do pool ficam só com o banco principal)
+    conn = abrir_conexao(caminho)
+    try:
+        anexar_arquivo(conn, caminho_arq)
+        yield conn
+    finally:
+        conn.close()
+
+
+def arquivar_vagas(caminho, antes_de, caminho_arq=None, tamanho_lote=TAMANHO_LOTE_ARQUIVO):
+    # Move as escalas com data_inicio < antes_de (e todas as inscrições delas) para o arquivo,
+    # em lotes. Retorna (n_vagas, n_inscricoes) movidas.
+    # Em WAL o SQLite não garante COMMIT atômico entre dois arquivos anexados, então cada lote é:
+    #   1. 'principal' pega o lock de escrita do banco principal (ninguém mais altera as linhas);
+    #   2. 'copia' grava as linhas no arquivo (INSERT OR REPLACE) e faz COMMIT;
+    #   3. 'principal' apaga as mesmas linhas e faz COMMIT.
+    # Queda entre 2 e 3 deixa a linha nos dois lados (a visão histórica usa a do principal)
+    # e a próxima execução termina o serviço; a linha nunca fica só no lado que caiu.
+    principal = abrir_conexao(caminho)
+    copia = abrir_conexao(caminho)
+    total_vagas = total_inscricoes = 0
+    try:
+        anexar_arquivo(copia, caminho_arq)
+        principal.execute("CREATE TEMP TABLE lote_arquivo (id INTEGER PRIMARY KEY)")
+        colunas = {t: ", ".join(nome for nome, _ in _colunas(principal, t)) for t in VISOES_HISTORICO}
+        while True:
+            principal.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [r[0] for r in principal.execute(
+                    "SELECT id FROM vagas_ras WHERE data_inicio < ? ORDER BY data_inicio LIMIT ?",
+                    (str(antes_de), tamanho_lote))]
+                if not ids:
+                    principal.rollback()
+                    break
+                marcadores = ",".join("?" * len(ids))
+                copia.execute("BEGIN")
+                try:
+                    copia.execute(f"INSERT OR REPLACE INTO arquivo.vagas_ras ({colunas['vagas_ras']}) "
+                                  f"SELECT {colunas['vagas_ras']} FROM main.vagas_ras WHERE id IN ({marcadores})", ids)
+                    copia.execute(f"INSERT OR REPLACE INTO arquivo.inscricoes ({colunas['inscricoes']}) "
+                                  f"SELECT {colunas['inscricoes']} FROM main.inscricoes WHERE id_vaga IN ({marcadores})", ids)
+                except BaseException:
+                    copia.rollback()
+                    raise
+                copia.commit()
+
+                principal.execute("DELETE FROM lote_arquivo")
+                principal.executemany("INSERT INTO lote_arquivo (id) VALUES (?)", [(i,) for i in ids])
+                # Os triggers de DELETE descontam dos resumos; as escalas arquivadas continuam
+                # contando nos relatórios, então a mesma quantia é somada de volta antes
+                filtro = (f"inscricoes i JOIN vagas_ras v ON v.id = i.id_vaga "
+                          f"WHERE i.id_vaga IN (SELECT id FROM lote_arquivo) AND i.status IN {STATUS_CONFIRMADO}")
+                for comando in _sql_somar_resumos(1, 'i.id_agente', 'v', filtro).split(';'):
+                    if comando.strip():
+                        principal.execute(comando)
+                total_inscricoes += principal.execute(
+                    "DELETE FROM inscricoes WHERE id_vaga IN (SELECT id FROM lote_arquivo)").rowcount
+                total_vagas += principal.execute(
+                    "DELETE FROM vagas_ras WHERE id IN (SELECT id FROM lote_arquivo)").rowcount
+            except BaseException:
+                principal.rollback()
+                raise
+            principal.commit()
+    finally:
+        principal.close()
+        copia.close()
+    return total_vagas, total_inscricoes
@@ -0,0 +1,340 @@
+import collections
+import contextvars
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --- PERFIL DE SQL E DE EXECUÇÕES (sem Streamlit) ---
+# Toda conexão aberta por ras_db.abrir_conexao é uma ConexaoPerfilada: com a coleta ligada,
+# cada comando registra SQL, tempo (execute + fetches, sem o tempo de quem consome as linhas),
+# linhas e a execução/tela em andamento. Execuções são as reruns do app (página inteira ou
+# fragmento), abertas com iniciar_execucao e fechadas com encerrar_execucao.
+# Tudo fica em buffers circulares na memória do processo; RAS_PERFIL_LOG=arquivo.jsonl
+# grava também uma linha JSON por consulta/execução para análise offline (ras_cli perfil).
+# A coleta começa desligada (o cursor medido e o registro das execuções custam tempo em toda
+# consulta/rerun): RAS_PERFIL=1 liga na partida e o admin liga/desliga na página Diagnóstico.
+TAMANHO_BUFFER_CONSULTAS = 5000
+TAMANHO_BUFFER_EXECUCOES = 1000
+LIMIAR_LENTA_MS = 50
+# Comandos que aceitam EXPLAIN QUERY PLAN (BEGIN, PRAGMA, SAVEPOINT... não)
+_COMANDOS_COM_PLANO = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_execucao_atual = contextvars.ContextVar('execucao_atual', default=None)
+_ignorando = contextvars.ContextVar('perfil_ignorando', default=False)
+
+
+def normalizar_sql(sql):
+    return ' '.join(sql.split())
+
+
+class Consulta:
+    __slots__ = ('sql', 'parametros', 'inicio', 'ms', 'linhas', 'erro', 'execucao')
+
+    def __init__(self, sql, parametros, execucao):
+        self.sql = sql
+        self.parametros = parametros  # só para o EXPLAIN na página; nunca vai para o log
+        self.inicio = time.time()
+        self.ms = 0.0
+        self.linhas = 0
+        self.erro = None
+        self.execucao = execucao
+
+    def como_dict(self):
+        e = self.execucao
+        return {'tipo': 'consulta', 'ts': self.inicio, 'sql': normalizar_sql(self.sql),
+                'ms': round(self.ms, 3), 'linhas': self.linhas, 'erro': self.erro,
+                'sessao': e.sessao if e else None, 'tela': e.tela if e else None,
+                'execucao': e.id if e else None}
+
+
+class Execucao:
+    __slots__ = ('id', 'sessao', 'tela', 'origem', 'pai', 'inicio', 'ms', 'consultas', 'ms_sql',
+                 'interrompida', 'aberta', 'pendentes', '_inicio_relogio', '_token')
+
+    def __init__(self, id_execucao, sessao, tela, origem, pai):
+        self.id = id_execucao
+        self.sessao = sessao
+        self.tela = tela
+        self.origem = origem  # 'pagina' ou o nome do fragmento
+        self.pai = pai        # fragmento rodando dentro da execução completa
+        self.inicio = time.time()
+        self.ms = None
+        self.consultas = 0
+        self.ms_sql = 0.0
+        self.interrompida = False
+        self.aberta = True
+        self.pendentes = []   # consultas esperando o fim da execução para ir ao log
+        self._inicio_relogio = time.perf_counter()
+        self._token = None
+
+    def como_dict(self):
+        return {'tipo': 'execucao', 'ts': self.inicio, 'execucao': self.id, 'sessao': self.sessao,
+                'tela': self.tela, 'origem': self.origem, 'ms': round(self.ms or 0, 3),
+                'consultas': self.consultas, 'ms_sql': round(self.ms_sql, 3),
+                'interrompida': self.interrompida}
+
+
+class Perfilador:
+    def __init__(self, ativo=True, caminho_log=None):
+        self.ativo = ativo
+        self.consultas = collections.deque(maxlen=TAMANHO_BUFFER_CONSULTAS)
+        self.execucoes = collections.deque(maxlen=TAMANHO_BUFFER_EXECUCOES)
+        self.caminho_log = caminho_log
+        self._log = None
+        self._lock_log = threading.Lock()
+        self._ids = itertools.count(1)
+
+    # --- Execuções (reruns) ---
+    def iniciar_execucao(self, sessao=None, tela=None, origem='pagina'):
+        # Fragmento dentro de uma execução aberta vira filho dela. Uma página nova fecha a
+        # que ficou aberta no mesmo contexto (script interrompido antes do fim).
+        # None com a coleta desligada
+        pai = _execucao_atual.get()
+        if origem == 'pagina':
+            while pai is not None:
+                self.encerrar_execucao(pai, interrompida=True)
+                pai = pai.pai
+        elif pai is not None and not pai.aberta:
+            pai = None
+        if not self.ativo:
+            return None
+        execucao = Execucao(next(self._ids), sessao, tela or (pai.tela if pai else None), origem, pai)
+        execucao._token = _execucao_atual.set(execucao)
+        return execucao
+
+    def encerrar_execucao(self, execucao, interrompida=False):
+        if execucao is None or not execucao.aberta:
+            return
+        execucao.aberta = False
+        execucao.interrompida = interrompida
+        execucao.ms = (time.perf_counter() - execucao._inicio_relogio) * 1000
+        if _execucao_atual.get() is execucao:
+            try:
+                _execucao_atual.reset(execucao._token)
+            except ValueError:  # token de outro contexto (execução fechada por outra thread)
+                _execucao_atual.set(execucao.pai)
+        self.execucoes.append(execucao)
+        if self.caminho_log:
+            self._gravar([c.como_dict() for c in execucao.pendentes] + [execucao.como_dict()])
+        execucao.pendentes = []
+
+    def execucao_atual(self):
+        return _execucao_atual.get()
+
+    def definir_tela(self, tela):
+        # A tela só é conhecida depois do menu: vale para a execução e as que a contêm
+        execucao = _execucao_atual.get()
+        while execucao is not None:
+            execucao.tela = tela
+            execucao = execucao.pai
+
+    @contextmanager
+    def ignorando(self):
+        # Consultas da própria página de diagnóstico (EXPLAIN) não entram no perfil
+        token = _ignorando.set(True)
+        try:
+            yield
+        finally:
+            _ignorando.reset(token)
+
+    # --- Consultas ---
+    def coletando(self):
+        return self.ativo and not _ignorando.get()
+
+    def nova_consulta(self, sql, parametros):
+        return Consulta(sql, parametros, _execucao_atual.get())
+
+    def finalizar(self, consulta):
+        self.consultas.append(consulta)
+        execucao = consulta.execucao
+        aberta = False
+        while execucao is not None:
+            execucao.consultas += 1
+            execucao.ms_sql += consulta.ms
+            aberta = aberta or execucao.aberta
+            execucao = execucao.pai
+        if self.caminho_log:
+            if aberta:
+                consulta.execucao.pendentes.append(consulta)
+            else:
+                self._gravar([consulta.como_dict()])
+
+    def limpar(self):
+        self.consultas.clear()
+        self.execucoes.clear()
+
+    def _gravar(self, registros):
+        with self._lock_log:
+            if self._log is None:
+                self._log = open(self.caminho_log, 'a', encoding='utf-8', buffering=1)
+            for registro in registros:
+                self._log.write(json.dumps(registro, ensure_ascii=False, default=str) + '\n')
+
+
+PERFIL = Perfilador(ativo=os.environ.get('RAS_PERFIL') == '1',
+                    caminho_log=os.environ.get('RAS_PERFIL_LOG') or None)
+
+
+class CursorPerfilado(sqlite3.Cursor):
+    # Mede execute e cada fetch; a consulta é registrada quando as linhas acabam,
+    # quando o cursor executa outro comando, é fechado ou descartado
+    _consulta = None
+
+    def _medir(self, metodo, sql, parametros, guardados):
+        self._fechar_consulta()
+        consulta = self._consulta = PERFIL.nova_consulta(sql, guardados)
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, parametros)
+        except Exception as e:
+            consulta.erro = type(e).__name__
+            raise
+        finally:
+            consulta.ms += (time.perf_counter() - inicio) * 1000
+            if consulta.erro or self.description is None:
+                # Sem linhas para ler (DML/DDL) ou erro: registra já, com o rowcount
+                consulta.linhas = max(self.rowcount, 0)
+                self._fechar_consulta()
+
+    def execute(self, sql, parametros=()):
+        return self._medir(super().execute, sql, parametros, parametros)
+
+    def executemany(self, sql, sequencia):
+        # Os parâmetros de um executemany não são guardados (podem ser milhares de linhas)
+        return self._medir(super().executemany, sql, sequencia, None)
+
+    def _ler(self, ler, *args):
+        inicio = time.perf_counter()
+        resultado = ler(*args)
+        if self._consulta is not None:
+            self._consulta.ms += (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def fetchone(self):
+        linha = self._ler(super().fetchone)
+        if self._consulta is not None:
+            if linha is None:
+                self._fechar_consulta()
+            else:
+                self._consulta.linhas += 1
+        return linha
+
+    def fetchmany(self, size=None):
+        tamanho = self.arraysize if size is None else size
+        linhas = self._ler(super().fetchmany, tamanho)
+        if self._consulta is not None:
+            self._consulta.linhas += len(linhas)
+            if len(linhas) < tamanho:
+                self._fechar_consulta()
+        return linhas
+
+    def fetchall(self):
+        linhas = self._ler(super().fetchall)
+        if self._consulta is not None:
+            self._consulta.linhas += len(linhas)
+            self._fechar_consulta()
+        return linhas
+
+    def __next__(self):
+        try:
+            linha = self._ler(super().__next__)
+        except StopIteration:
+            self._fechar_consulta()
+            raise
+        if self._consulta is not None:
+            self._consulta.linhas += 1
+        return linha
+
+    def close(self):
+        self._fechar_consulta()
+        super().close()
+
+    def __del__(self):
+        self._fechar_consulta()
+
+    def _fechar_consulta(self):
+        consulta, self._consulta = self._consulta, None
+        if consulta is not None:
+            PERFIL.finalizar(consulta)
+
+
+class ConexaoPerfilada(sqlite3.Connection):
+    # conn.execute/executemany do sqlite3 não passam pelo execute do cursor (chamada interna
+    # em C): os atalhos são refeitos aqui. Com a coleta desligada o cursor é o comum.
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = CursorPerfilado if PERFIL.coletando() else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+
+# --- ANÁLISE (página Diagnóstico e ras_cli perfil) ---
+def plano_consulta(conn, consulta):
+    # EXPLAIN QUERY PLAN com os mesmos parâmetros; None se o comando não tem plano
+    if consulta.parametros is None or not normalizar_sql(consulta.sql).upper().startswith(_COMANDOS_COM_PLANO):
+        return None
+    with PERFIL.ignorando():
+        return [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + consulta.sql, consulta.parametros)]
+
+
+def agrupar_consultas(registros):
+    # registros: dicts de Consulta.como_dict (buffer ou log). Agrupa pelo SQL normalizado,
+    # do maior tempo total para o menor
+    grupos = {}
+    for r in registros:
+        g = grupos.setdefault(r['sql'], {'sql': r['sql'], 'chamadas': 0, 'ms_total': 0.0, 'ms_max': 0.0,
+                                         'linhas': 0, 'erros': 0, 'telas': set()})
+        g['chamadas'] += 1
+        g['ms_total'] += r['ms']
+        g['ms_max'] = max(g['ms_max'], r['ms'])
+        g['linhas'] += r['linhas']
+        g['erros'] += 1 if r['erro'] else 0
+        if r['tela']:
+            g['telas'].add(r['tela'])
+    for g in grupos.values():
+        g['ms_medio'] = g['ms_total'] / g['chamadas']
+        g['telas'] = ', '.join(sorted(g['telas']))
+    return sorted(grupos.values(), key=lambda g: g['ms_total'], reverse=True)
+
+
+def resumir_execucoes(registros):
+    # Por tela/origem: reruns, ms médio e máximo, consultas por rerun (média e máximo)
+    grupos = {}
+    for r in registros:
+        chave = (r['tela'] or '-', r['origem'])
+        g = grupos.setdefault(chave, {'tela': chave[0], 'origem': chave[1], 'reruns': 0, 'ms_total': 0.0,
+                                      'ms_max': 0.0, 'consultas': 0, 'consultas_max': 0, 'ms_sql': 0.0})
+        g['reruns'] += 1
+        g['ms_total'] += r['ms']
+        g['ms_max'] = max(g['ms_max'], r['ms'])
+        g['consultas'] += r['consultas']
+        g['consultas_max'] = max(g['consultas_max'], r['consultas'])
+        g['ms_sql'] += r['ms_sql']
+    for g in grupos.values():
+        g['ms_medio'] = g['ms_total'] / g['reruns']
+        g['consultas_por_rerun'] = g['consultas'] / g['reruns']
+    return sorted(grupos.values(), key=lambda g: g['ms_total'], reverse=True)
+
+
+def ler_log(caminho):
+    consultas, execucoes = [], []
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            if linha.strip():
+                r = json.loads(linha)
+                (consultas if r['tipo'] == 'consulta' else execucoes).append(r)
+    return consultas, execucoes
+
+
+def hora(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime('%H:%M:%S')
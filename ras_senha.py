@@ -0,0 +1,173 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- SENHAS: KDF COM SAL, POOL DE VERIFICAÇÃO E LIMITE DE TENTATIVAS (sem Streamlit) ---
+# Formato gravado: "scrypt$<log2 n>$<r>$<p>$<sal hex>$<hash hex>" (hashlib.scrypt, sal de 16 bytes).
+# Hashes antigos (sha256 hex sem sal) continuam entrando: conferir() avisa que precisam ser
+# regravados, e o ras_core troca pelo KDF atual no primeiro login certo. O mesmo vale para
+# hashes com custo diferente do configurado (RAS_KDF_CUSTO mudou, senha provisória).
+# O scrypt é lento de propósito, então nunca roda na thread da sessão: vai para um pool de
+# RAS_KDF_TRABALHADORES threads (o hashlib solta o GIL durante o cálculo) e a CPU gasta com
+# login fica limitada, por maior que seja a fila na troca de turno.
+# Limites em memória do processo (o servidor Streamlit é um processo só):
+#   - por conta: passadas FALHAS_LIVRES falhas seguidas, cada nova falha bloqueia a conta
+#     por um tempo que dobra a cada erro (até BLOQUEIO_MAXIMO_S); acerto zera a conta;
+#   - global: no máximo RAS_KDF_PENDENTES verificações na fila; além disso a tentativa é
+#     recusada na hora ("sistema ocupado") em vez de esperar atrás das outras.
+CUSTO_LOG2 = int(os.environ.get('RAS_KDF_CUSTO', 14))   # n = 2**14, r = 8: 16 MB e ~60 ms por hash
+CUSTO_PROVISORIO_LOG2 = 10                                # senhas temporárias da importação (troca no 1º acesso)
+BLOCO, PARALELISMO = 8, 1
+TAMANHO_SAL = 16
+TRABALHADORES = int(os.environ.get('RAS_KDF_TRABALHADORES', min(4, os.cpu_count() or 1)))
+MAX_PENDENTES = int(os.environ.get('RAS_KDF_PENDENTES', 64))
+TIMEOUT_VERIFICACAO_S = 30
+FALHAS_LIVRES = 3
+BLOQUEIO_BASE_S = 2       # 2, 4, 8, 16 ... segundos
+BLOQUEIO_MAXIMO_S = 300
+MAX_CONTAS_VIGIADAS = 10000
+
+
+def _scrypt(senha, sal, custo_log2, bloco=BLOCO, paralelismo=PARALELISMO):
+    n = 2 ** custo_log2
+    return hashlib.scrypt(senha.encode(), salt=sal, n=n, r=bloco, p=paralelismo,
+                          maxmem=256 * n * bloco * paralelismo + 2 ** 20)
+
+
+def gerar_hash(senha, custo_log2=None):
+    # Cálculo direto, na thread de quem chama: use gerar_hash_no_pool em código de tela
+    custo_log2 = custo_log2 or CUSTO_LOG2
+    sal = secrets.token_bytes(TAMANHO_SAL)
+    chave = _scrypt(senha, sal, custo_log2)
+    return f"scrypt${custo_log2}${BLOCO}${PARALELISMO}${sal.hex()}${chave.hex()}"
+
+
+def conferir(senha, armazenado):
+    # (confere, precisa_regravar). Formato desconhecido não confere
+    if not armazenado:
+        return False, False
+    if '$' not in armazenado:
+        # Legado: sha256 sem sal
+        calculado = hashlib.sha256(senha.encode()).hexdigest()
+        return hmac.compare_digest(calculado, armazenado), True
+    try:
+        algoritmo, custo, bloco, paralelismo, sal, chave = armazenado.split('$')
+        custo, bloco, paralelismo = int(custo), int(bloco), int(paralelismo)
+        sal, chave = bytes.fromhex(sal), bytes.fromhex(chave)
+    except ValueError:
+        return False, False
+    if algoritmo != 'scrypt':
+        return False, False
+    ok = hmac.compare_digest(_scrypt(senha, sal, custo, bloco, paralelismo), chave)
+    return ok, (custo, bloco, paralelismo) != (CUSTO_LOG2, BLOCO, PARALELISMO)
+
+
+class LimitadorLogin:
+    def __init__(self, max_pendentes=MAX_PENDENTES):
+        self._lock = threading.Lock()
+        self._contas = {}   # chave -> (falhas seguidas, bloqueada até [time.monotonic])
+        self._vagas_fila = threading.BoundedSemaphore(max_pendentes)
+        self.recusas_conta = self.recusas_ocupado = 0   # estatística para o Diagnóstico
+
+    def liberar_conta(self, chave):
+        # ValueError com a espera se a conta está bloqueada (não gasta CPU com o KDF)
+        with self._lock:
+            _, ate = self._contas.get(chave, (0, 0))
+            espera = ate - time.monotonic()
+            if espera > 0:
+                self.recusas_conta += 1
+                raise ValueError(f"Muitas tentativas com senha errada. Tente novamente em {int(espera) + 1} s.")
+
+    def reservar_fila(self):
+        if not self._vagas_fila.acquire(blocking=False):
+            with self._lock:
+                self.recusas_ocupado += 1
+            raise ValueError("Muitos acessos ao mesmo tempo. Tente novamente em alguns segundos.")
+
+    def liberar_fila(self):
+        self._vagas_fila.release()
+
+    def registrar(self, chave, sucesso):
+        with self._lock:
+            if sucesso:
+                self._contas.pop(chave, None)
+                return
+            falhas = self._contas.get(chave, (0, 0))[0] + 1
+            ate = 0
+            if falhas > FALHAS_LIVRES:
+                ate = time.monotonic() + min(BLOQUEIO_BASE_S * 2 ** (falhas - FALHAS_LIVRES - 1), BLOQUEIO_MAXIMO_S)
+            self._contas[chave] = (falhas, ate)
+            if len(self._contas) > MAX_CONTAS_VIGIADAS:
+                # Chutes em massa em contas diferentes: esquece as que não estão bloqueadas
+                agora = time.monotonic()
+                self._contas = {k: v for k, v in self._contas.items() if v[1] > agora}
+
+    def bloqueadas(self):
+        agora = time.monotonic()
+        with self._lock:
+            return sum(1 for _, ate in self._contas.values() if ate > agora)
+
+    def limpar(self):
+        with self._lock:
+            self._contas.clear()
+
+
+_executor = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix='ras-kdf')
+LIMITADOR = LimitadorLogin()
+# Conta inexistente também paga um KDF: o tempo de resposta não revela matrículas válidas
+_HASH_FICTICIO = None
+
+
+def configurar(custo_log2=None, trabalhadores=None, max_pendentes=None):
+    # Troca custo/pool/fila em tempo de execução (benchmark, testes de carga)
+    global CUSTO_LOG2, TRABALHADORES, _executor, LIMITADOR, _HASH_FICTICIO
+    if custo_log2:
+        CUSTO_LOG2, _HASH_FICTICIO = custo_log2, None
+    if trabalhadores:
+        TRABALHADORES = trabalhadores
+        _executor.shutdown(wait=True)
+        _executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='ras-kdf')
+    if max_pendentes:
+        LIMITADOR = LimitadorLogin(max_pendentes)
+
+
+def gerar_hash_no_pool(senha, custo_log2=None):
+    return _executor.submit(gerar_hash, senha, custo_log2).result()
+
+
+def gerar_hashes_no_pool(senhas, custo_log2=None):
+    # Vários de uma vez (importação): todos os trabalhadores em paralelo
+    return list(_executor.map(lambda s: gerar_hash(s, custo_log2), senhas))
+
+
+def verificar_senha(chave, senha, armazenado):
+    # Login: bloqueio da conta, vaga na fila global e KDF no pool. `chave` identifica a conta
+    # (ex.: 'agente:12345'); armazenado=None (conta inexistente) confere contra um hash fictício.
+    # A vaga na fila só é devolvida quando o KDF termina (ou é cancelado antes de começar):
+    # desistir por timeout não libera espaço enquanto o trabalho continua no pool.
+    # Retorna (confere, precisa_regravar); ValueError se a tentativa foi recusada pelos limites.
+    global _HASH_FICTICIO
+    limitador = LIMITADOR
+    limitador.liberar_conta(chave)
+    limitador.reservar_fila()
+    try:
+        if armazenado is None and _HASH_FICTICIO is None:
+            _HASH_FICTICIO = gerar_hash_no_pool(secrets.token_hex(8))
+        futuro = _executor.submit(conferir, senha, armazenado or _HASH_FICTICIO)
+    except BaseException:
+        limitador.liberar_fila()
+        raise
+    futuro.add_done_callback(lambda _: limitador.liberar_fila())
+    try:
+        ok, regravar = futuro.result(TIMEOUT_VERIFICACAO_S)
+    except TimeoutError:
+        futuro.cancel()
+        raise ValueError("Muitos acessos ao mesmo tempo. Tente novamente em alguns segundos.") from None
+    if armazenado is None:
+        ok, regravar = False, False
+    limitador.registrar(chave, ok)
+    return ok, regravar
@@ -0,0 +1,166 @@
+# Benchmark dos caminhos quentes do ras_core sobre um banco gerado por gerar_dados.py.
+# Roda numa cópia do banco (as operações de escrita não sujam o original) e mede cada
+# operação N vezes: p50, p99 e máximo em ms. Com --saida grava o resultado em JSON;
+# com --comparar lê um resultado anterior e sai com código 1 se algum p50 piorou mais
+# que a tolerância (diferenças absolutas abaixo de --minimo-ms são ruído e não contam).
+# A cópia recebe um limite mensal de horas (--limite-horas) para que relatorio_conflitos
+# percorra também a consulta de agentes acima do limite, que só roda com o limite definido.
+# Uso: python scripts/bench_core.py dados.db [--repeticoes 200] [--saida atual.json]
+#      python scripts/bench_core.py dados.db --comparar base.json [--tolerancia 0.25]
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+
+
+def copiar_banco(origem, destino):
+    # API de backup: cópia consistente mesmo com o WAL do original aberto
+    with sqlite3.connect(origem) as fonte, sqlite3.connect(destino) as alvo:
+        fonte.backup(alvo)
+    alvo.close()
+    fonte.close()
+
+
+def amostras(pool, rnd):
+    # Ids reais para as operações: agentes, escalas futuras com vaga/fila, nomes para a busca
+    with pool.conexao() as conn:
+        hoje = datetime.date.today().isoformat()
+        agentes = [r[0] for r in conn.execute("SELECT id FROM agentes")]
+        futuras = [r[0] for r in conn.execute(
+            "SELECT id FROM vagas_ras WHERE data_inicio >= ? AND cancelada = 0", (hoje,))]
+        nomes = [r[0].split()[0] for r in conn.execute(
+            "SELECT nome FROM agentes ORDER BY random() LIMIT 50")]
+        eventos = [r[0].split()[0] for r in conn.execute(
+            "SELECT evento FROM vagas_ras ORDER BY random() LIMIT 50")]
+        lotacoes = [r[0] for r in conn.execute("SELECT DISTINCT lotacao FROM agentes")]
+        ativas = [r[0] for r in conn.execute(
+            "SELECT i.id FROM inscricoes i JOIN vagas_ras v ON v.id = i.id_vaga "
+            "WHERE i.status = 'ATIVO' AND v.data_inicio >= ?", (hoje,))]
+    if not agentes or not futuras:
+        sys.exit("Banco sem agentes ou sem escalas futuras: gere com scripts/gerar_dados.py.")
+    rnd.shuffle(ativas)
+    return agentes, futuras, nomes, eventos, lotacoes, ativas
+
+
+def operacoes(pool, rnd):
+    agentes, futuras, nomes, eventos, lotacoes, ativas = amostras(pool, rnd)
+
+    def proxima_pagina():
+        _, cursor = ras_core.listar_vagas(pool)
+        if cursor:
+            ras_core.listar_vagas(pool, cursor=cursor)
+
+    def desistencia():
+        # Pede e aprova a saída de um ocupante: a vaga é completada pela fila de espera
+        if ativas:
+            id_inscricao = ativas.pop()
+            ras_core.solicitar_desistencia(pool, id_inscricao)
+            ras_core.processar_desistencias(pool, aprovar=[id_inscricao])
+
+    return {
+        'inscrever_ras': lambda: ras_core.inscrever_ras(pool, rnd.choice(agentes), rnd.choice(futuras)),
+        'listar_vagas': lambda: ras_core.listar_vagas(pool),
+        'listar_vagas_pagina_2': proxima_pagina,
+        'listar_vagas_evento': lambda: ras_core.listar_vagas(pool, evento=rnd.choice(eventos)),
+        'listar_minhas_escalas': lambda: ras_core.listar_minhas_escalas(pool, rnd.choice(agentes)),
+        'buscar_inscricoes_evento': lambda: ras_core.buscar_inscricoes(pool, evento=rnd.choice(eventos)),
+        'buscar_inscricoes_agente': lambda: ras_core.buscar_inscricoes(pool, agente=rnd.choice(nomes)),
+        'buscar_agentes_nome': lambda: ras_core.buscar_agentes(pool, texto=rnd.choice(nomes)),
+        'buscar_agentes_lotacao': lambda: ras_core.buscar_agentes(pool, lotacao=rnd.choice(lotacoes)),
+        'relatorio_gerencial': lambda: ras_core.relatorio_gerencial(pool),
+        'relatorio_conflitos': lambda: ras_core.relatorio_conflitos(pool),
+        'processar_desistencias': desistencia,
+    }
+
+
+def percentil(tempos, p):
+    ordenados = sorted(tempos)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def medir(funcao, repeticoes, aquecimento=3):
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return {'p50': round(statistics.median(tempos), 3), 'p99': round(percentil(tempos, 0.99), 3),
+            'max': round(max(tempos), 3), 'n': repeticoes}
+
+
+def comparar(atual, base, tolerancia, minimo_ms):
+    # Regressão = p50 acima de base * (1 + tolerância) E pelo menos minimo_ms mais lento
+    regressoes = []
+    for nome, r in atual.items():
+        anterior = base.get(nome)
+        if not anterior:
+            continue
+        if r['p50'] > anterior['p50'] * (1 + tolerancia) and r['p50'] - anterior['p50'] >= minimo_ms:
+            regressoes.append((nome, anterior['p50'], r['p50']))
+    return regressoes
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark dos caminhos quentes do ras_core")
+    p.add_argument('banco', help="banco gerado por scripts/gerar_dados.py")
+    p.add_argument('--repeticoes', type=int, default=200)
+    p.add_argument('--operacoes', help="lista separada por vírgula (padrão: todas)")
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--saida', help="grava o resultado em JSON")
+    p.add_argument('--comparar', help="JSON de uma execução anterior (linha de base)")
+    p.add_argument('--tolerancia', type=float, default=0.25, help="piora relativa aceita no p50")
+    p.add_argument('--minimo-ms', type=float, default=0.5, help="piora absoluta ignorada")
+    p.add_argument('--limite-horas', type=float, default=200, help="limite mensal de horas gravado na cópia")
+    args = p.parse_args()
+    if not os.path.exists(args.banco):
+        sys.exit(f"{args.banco} não existe.")
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as d:
+        copia = os.path.join(d, 'bench.db')
+        copiar_banco(args.banco, copia)
+        pool = ras_core.abrir(copia)
+        try:
+            ras_core.gravar_parametro(pool, ras_core.LIMITE_HORAS_MES, str(args.limite_horas))
+            todas = operacoes(pool, rnd)
+            nomes = args.operacoes.split(',') if args.operacoes else list(todas)
+            desconhecidas = [n for n in nomes if n not in todas]
+            if desconhecidas:
+                sys.exit(f"Operação(ões) desconhecida(s): {', '.join(desconhecidas)}")
+            resultado = {}
+            print(f"{'operação':<28}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+            for nome in nomes:
+                resultado[nome] = medir(todas[nome], args.repeticoes)
+                r = resultado[nome]
+                print(f"{nome:<28}{r['p50']:>10.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+        finally:
+            pool.fechar()
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regressoes = comparar(resultado, base, args.tolerancia, args.minimo_ms)
+        for nome, antes, depois in regressoes:
+            print(f"REGRESSÃO {nome}: p50 {antes:.2f} -> {depois:.2f} ms")
+        if regressoes:
+            sys.exit(1)
+        print(f"Sem regressões acima de {args.tolerancia:.0%} em relação a {args.comparar}.")
+
+
+if __name__ == '__main__':
+    main()
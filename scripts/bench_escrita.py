@@ -0,0 +1,115 @@
+# Benchmark das escritas concorrentes: conexão nova por chamada (como o app fazia),
+# pool com transação por chamada, e fila com thread escritora única (group commit).
+# Cada sessão simulada é uma thread que inscreve agentes e, de vez em quando, pede e
+# aprova desistências. Mede vazão, latência p50/p99 e erros ("database is locked").
+# Uso: python scripts/bench_escrita.py --sessoes 32 --operacoes 200 [--modos conexao,pool,fila]
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+from ras_db import PoolConexoes, abrir_conexao
+from carga_inscricoes import preparar_banco, verificar
+
+
+class PoolPorChamada(PoolConexoes):
+    # Abre e fecha uma conexão a cada uso: o comportamento antigo do app
+    def __init__(self, caminho):
+        super().__init__(caminho, tamanho=0)
+
+    @contextmanager
+    def conexao(self):
+        conn = abrir_conexao(self.caminho)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def criar_pool(modo, caminho, sessoes):
+    if modo == 'conexao':
+        return PoolPorChamada(caminho)
+    if modo == 'pool':
+        return PoolConexoes(caminho, tamanho=sessoes)
+    return PoolConexoes(caminho, tamanho=sessoes, fila_escrita=True)
+
+
+def sessao(pool, ids_agentes, ids_vagas, n_operacoes, seed, latencias, erros):
+    rnd = random.Random(seed)
+    for _ in range(n_operacoes):
+        t0 = time.perf_counter()
+        try:
+            if rnd.random() < 0.8:
+                ras_core.inscrever_ras(pool, rnd.choice(ids_agentes), rnd.choice(ids_vagas))
+            else:
+                with pool.conexao() as conn:
+                    linha = conn.execute("SELECT id FROM inscricoes WHERE status = 'ATIVO' AND id_vaga = ? LIMIT 1",
+                                         (rnd.choice(ids_vagas),)).fetchone()
+                if linha:
+                    pool.escrever(lambda conn: conn.execute(
+                        "UPDATE inscricoes SET status = 'PENDENTE_SAIDA' WHERE id = ? AND status = 'ATIVO'", linha))
+                    ras_core.processar_desistencias(pool, aprovar=[linha[0]])
+        except sqlite3.OperationalError as e:
+            erros.append(str(e))
+        latencias.append(time.perf_counter() - t0)
+
+
+def medir(modo, args):
+    caminho = os.path.join(tempfile.mkdtemp(prefix='ras_bench_'), 'bench.db')
+    ids_agentes, ids_vagas = preparar_banco(caminho, args.agentes, args.vagas, args.capacidade)
+    pool = criar_pool(modo, caminho, args.sessoes)
+    latencias, erros = [], []
+    threads = [threading.Thread(target=sessao, args=(pool, ids_agentes, ids_vagas, args.operacoes,
+                                                     args.seed + i, latencias, erros))
+               for i in range(args.sessoes)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - t0
+    lote_medio = pool.fila.comandos / max(pool.fila.lotes, 1) if pool.fila else 1
+    pool.fechar()
+    falhas, _ = verificar(caminho)
+    latencias.sort()
+    return {
+        'modo': modo, 'ops': len(latencias), 'ops_s': len(latencias) / duracao,
+        'p50': latencias[len(latencias) // 2] * 1000,
+        'p99': latencias[max(int(len(latencias) * 0.99) - 1, 0)] * 1000,
+        'erros': len(erros), 'lote': lote_medio, 'falhas': falhas,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark das escritas concorrentes do Sistema RAS")
+    p.add_argument('--sessoes', type=int, default=32, help="sessões (threads) simultâneas")
+    p.add_argument('--operacoes', type=int, default=200, help="operações por sessão")
+    p.add_argument('--agentes', type=int, default=2000)
+    p.add_argument('--vagas', type=int, default=40)
+    p.add_argument('--capacidade', type=int, default=20)
+    p.add_argument('--modos', default='conexao,pool,fila')
+    p.add_argument('--seed', type=int, default=42)
+    args = p.parse_args()
+
+    print(f"{'modo':<8} {'ops':>6} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6} {'lote':>6}")
+    falhou = False
+    for modo in args.modos.split(','):
+        r = medir(modo, args)
+        print(f"{r['modo']:<8} {r['ops']:>6} {r['ops_s']:>8.0f} {r['p50']:>8.1f} {r['p99']:>8.1f} "
+              f"{r['erros']:>6} {r['lote']:>6.1f}")
+        for nome, detalhe in r['falhas'].items():
+            print(f"    FALHA: {nome}: {detalhe}")
+            falhou = True
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == '__main__':
+    main()
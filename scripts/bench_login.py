@@ -0,0 +1,142 @@
+# Benchmark do login na troca de turno: N sessões (threads, como as do Streamlit) fazem
+# login ao mesmo tempo com a senha '1234' dos bancos de gerar_dados.py (uma fração com
+# senha errada), enquanto um "vizinho" já logado lista escalas sem parar. Mede vazão
+# (logins/s), p50/p99 do login e p50/p99 do vizinho antes e durante a rajada: com o KDF
+# no pool de ras_senha, a rajada de logins não pode travar quem já está usando o sistema.
+# As senhas da cópia são regravadas com o custo pedido (--custo, log2 do n do scrypt).
+# Uso: python scripts/bench_login.py dados.db [--custo 14] [--trabalhadores 4] [--sessoes 50]
+#      [--logins 500] [--erradas 0.1] [--pendentes 64] [--saida login.json]
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+import ras_senha
+from bench_core import copiar_banco, percentil
+
+
+def resumo(tempos):
+    if not tempos:
+        return {'p50': None, 'p99': None, 'max': None, 'n': 0}
+    return {'p50': round(statistics.median(tempos), 3), 'p99': round(percentil(tempos, 0.99), 3),
+            'max': round(max(tempos), 3), 'n': len(tempos)}
+
+
+def vizinho(pool, parar, tempos):
+    # Sessão já logada navegando: uma listagem de escalas a cada 20 ms
+    while not parar.is_set():
+        t0 = time.perf_counter()
+        ras_core.listar_vagas(pool)
+        tempos.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.02)
+
+
+def medir_vizinho(pool, segundos):
+    parar, tempos = threading.Event(), []
+    t = threading.Thread(target=vizinho, args=(pool, parar, tempos))
+    t.start()
+    time.sleep(segundos)
+    parar.set()
+    t.join()
+    return resumo(tempos)
+
+
+def rajada(pool, matriculas, n_sessoes, n_logins, erradas, rnd):
+    # Cada sessão pega o próximo login da fila até acabar: todas começam juntas
+    tentativas = [(rnd.choice(matriculas), '1234' if rnd.random() >= erradas else 'errada')
+                  for _ in range(n_logins)]
+    lock, tempos, contagem = threading.Lock(), [], {'ok': 0, 'falha': 0, 'recusada': 0}
+    largada = threading.Barrier(n_sessoes)
+
+    def sessao():
+        largada.wait()
+        while True:
+            with lock:
+                if not tentativas:
+                    return
+                matricula, senha = tentativas.pop()
+            t0 = time.perf_counter()
+            try:
+                resultado = 'ok' if ras_core.autenticar_agente(pool, matricula, senha)[0] else 'falha'
+            except ValueError:
+                resultado = 'recusada'
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                contagem[resultado] += 1
+                if resultado != 'recusada':
+                    tempos.append(ms)
+
+    threads = [threading.Thread(target=sessao) for _ in range(n_sessoes)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, tempos, contagem
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark do login (KDF no pool + limites de tentativa)")
+    p.add_argument('banco', help="banco gerado por scripts/gerar_dados.py")
+    p.add_argument('--custo', type=int, default=ras_senha.CUSTO_LOG2, help="log2 do n do scrypt")
+    p.add_argument('--trabalhadores', type=int, default=ras_senha.TRABALHADORES)
+    p.add_argument('--pendentes', type=int, default=ras_senha.MAX_PENDENTES, help="limite global da fila do KDF")
+    p.add_argument('--sessoes', type=int, default=50, help="sessões fazendo login ao mesmo tempo")
+    p.add_argument('--logins', type=int, default=500)
+    p.add_argument('--erradas', type=float, default=0.1, help="fração de tentativas com senha errada")
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--saida', help="grava o resultado em JSON")
+    args = p.parse_args()
+    if not os.path.exists(args.banco):
+        sys.exit(f"{args.banco} não existe.")
+
+    ras_senha.configurar(custo_log2=args.custo, trabalhadores=args.trabalhadores, max_pendentes=args.pendentes)
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as d:
+        copia = os.path.join(d, 'bench.db')
+        copiar_banco(args.banco, copia)
+        pool = ras_core.abrir(copia, tamanho=max(8, args.sessoes))
+        try:
+            # Um hash por banco (mesma senha para todos), já no custo pedido: nenhum login regrava
+            senha = ras_senha.gerar_hash('1234', args.custo)
+            with pool.transacao(imediata=True) as conn:
+                conn.execute("UPDATE agentes SET senha = ?, ativo = 1", (senha,))
+                matriculas = [m for (m,) in conn.execute("SELECT matricula FROM agentes")]
+            antes = medir_vizinho(pool, 2)
+            parar, tempos_vizinho = threading.Event(), []
+            t = threading.Thread(target=vizinho, args=(pool, parar, tempos_vizinho))
+            t.start()
+            duracao, tempos, contagem = rajada(pool, matriculas, args.sessoes, args.logins, args.erradas, rnd)
+            parar.set()
+            t.join()
+        finally:
+            pool.fechar()
+
+    resultado = {'custo_log2': args.custo, 'trabalhadores': args.trabalhadores, 'sessoes': args.sessoes,
+                 'logins_por_s': round((contagem['ok'] + contagem['falha']) / duracao, 1),
+                 'login': resumo(tempos), **contagem,
+                 'vizinho_antes': antes, 'vizinho_durante': resumo(tempos_vizinho)}
+    print(f"scrypt 2^{args.custo}, {args.trabalhadores} trabalhador(es), {args.sessoes} sessões, "
+          f"{args.logins} tentativas em {duracao:.1f}s")
+    print(f"vazão: {resultado['logins_por_s']} logins/s  (ok {contagem['ok']}, senha errada {contagem['falha']}, "
+          f"recusadas pelos limites {contagem['recusada']})")
+    print(f"{'':<28}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for nome, r in (('login', resultado['login']), ('vizinho antes da rajada', antes),
+                    ('vizinho durante a rajada', resultado['vizinho_durante'])):
+        if r['n']:
+            print(f"{nome:<28}{r['p50']:>10.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
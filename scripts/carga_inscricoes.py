@@ -0,0 +1,180 @@
+# Teste de carga das inscrições: N agentes disputando poucas vagas ao mesmo tempo.
+# Fase 1: inscrições concorrentes. Fase 2: desistências aprovadas/negadas em lote,
+# concorrendo com inscrições de agentes que chegam depois.
+# Com --sorteio as vagas são do modo por sorteio: a fase 1 só registra INTERESSADO e
+# um sorteio em lote aloca tudo antes da fase 2.
+# Uso: python scripts/carga_inscricoes.py --agentes 400 --vagas 5 --capacidade 20 --workers 16 [--processos] [--sorteio]
+# Sai com código 1 se alguma vaga terminar com mais ATIVOS do que vagas_totais, com vaga livre
+# e gente na lista de espera, ou com contadores/resumos divergentes.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+from ras_db import PoolConexoes, migrar, recalcular_resumos, recontar_ocupacao
+
+
+def preparar_banco(caminho, n_agentes, n_vagas, capacidade, modo='ORDEM'):
+    pool = PoolConexoes(caminho, tamanho=1)
+    with pool.conexao() as conn:
+        migrar(conn)
+    with pool.transacao() as conn:
+        conn.executemany("INSERT INTO agentes (matricula, nome, senha) VALUES (?, ?, '')",
+                         [(f"C{i:06d}", f"Agente {i}") for i in range(n_agentes)])
+        conn.executemany("INSERT INTO vagas_ras (evento, data_inicio, hora_inicio, hora_fim, vagas_totais, valor, "
+                         "modo_alocacao, fim_interesse) VALUES (?, date('2030-01-01', ?), '08:00:00', '20:00:00', ?, 200, ?, ?)",
+                         [(f"Evento {i}", f"+{i} day", capacidade, modo,
+                           None if modo == 'ORDEM' else '2029-12-30 08:00:00')
+                          for i in range(n_vagas)])
+        ids_agentes = [r[0] for r in conn.execute("SELECT id FROM agentes")]
+        ids_vagas = [r[0] for r in conn.execute("SELECT id FROM vagas_ras")]
+    pool.fechar()
+    return ids_agentes, ids_vagas
+
+
+def _executar(pool, tarefa):
+    if tarefa[0] == 'inscrever':
+        return ras_core.inscrever_ras(pool, tarefa[1], tarefa[2])[0]
+    aprovados, negados, _ = ras_core.processar_desistencias(pool, aprovar=tarefa[1], negar=tarefa[2])
+    return aprovados + negados
+
+
+def _rodar_lote(caminho, tarefas, tamanho_pool):
+    # Executado em cada processo (ou uma vez, no modo threads)
+    pool = PoolConexoes(caminho, tamanho=tamanho_pool)
+    latencias = []
+    try:
+        with ThreadPoolExecutor(max_workers=tamanho_pool) as ex:
+            def um(tarefa):
+                t0 = time.perf_counter()
+                ok = _executar(pool, tarefa)
+                latencias.append(time.perf_counter() - t0)
+                return ok
+            aceitos = sum(ex.map(um, tarefas))
+    finally:
+        pool.fechar()
+    return aceitos, latencias
+
+
+def rodar(caminho, tarefas, args):
+    t0 = time.perf_counter()
+    if args.processos:
+        fatias = [tarefas[i::args.workers] for i in range(args.workers)]
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            resultados = list(ex.map(_rodar_lote, [caminho] * args.workers, fatias, [1] * args.workers))
+    else:
+        resultados = [_rodar_lote(caminho, tarefas, args.workers)]
+    duracao = time.perf_counter() - t0
+    aceitos = sum(r[0] for r in resultados)
+    latencias = sorted(l for r in resultados for l in r[1]) or [0]
+    return aceitos, duracao, latencias
+
+
+def pedir_desistencias(caminho, fracao, rnd):
+    # Marca uma fração dos ATIVOS como PENDENTE_SAIDA (como se tivessem clicado em "Solicitar Desistência")
+    pool = PoolConexoes(caminho, tamanho=1)
+    with pool.transacao() as conn:
+        ativos = [r[0] for r in conn.execute("SELECT id FROM inscricoes WHERE status = 'ATIVO'")]
+        pedidos = rnd.sample(ativos, int(len(ativos) * fracao))
+        conn.executemany("UPDATE inscricoes SET status = 'PENDENTE_SAIDA' WHERE id = ?", [(i,) for i in pedidos])
+    pool.fechar()
+    return pedidos
+
+
+def verificar(caminho):
+    pool = PoolConexoes(caminho, tamanho=1)
+    with pool.conexao() as conn:
+        estouradas = conn.execute("""
+            SELECT v.id, v.vagas_totais, COUNT(i.id)
+            FROM vagas_ras v JOIN inscricoes i ON i.id_vaga = v.id AND i.status IN ('ATIVO', 'PENDENTE_SAIDA')
+            GROUP BY v.id HAVING COUNT(i.id) > v.vagas_totais
+        """).fetchall()
+        duplicadas = conn.execute("""
+            SELECT COUNT(*) FROM (SELECT 1 FROM inscricoes GROUP BY id_vaga, id_agente HAVING COUNT(*) > 1)
+        """).fetchone()[0]
+        # Vaga sobrando enquanto há gente esperando = promoção da fila incompleta
+        fila_parada = conn.execute("""
+            SELECT v.id FROM vagas_ras v
+            WHERE (SELECT COUNT(*) FROM inscricoes i WHERE i.id_vaga = v.id AND i.status IN ('ATIVO', 'PENDENTE_SAIDA')) < v.vagas_totais
+              AND EXISTS (SELECT 1 FROM inscricoes i WHERE i.id_vaga = v.id AND i.status = 'ESPERA')
+        """).fetchall()
+        contadores = recontar_ocupacao(conn)
+        resumos = recalcular_resumos(conn)
+        resumo = conn.execute("SELECT status, COUNT(*) FROM inscricoes GROUP BY status ORDER BY status").fetchall()
+    pool.fechar()
+    falhas = {k: v for k, v in (('vagas estouradas', estouradas), ('inscrições duplicadas', duplicadas),
+                                ('fila parada com vaga livre', fila_parada), ('contadores divergentes', contadores),
+                                ('resumos divergentes', resumos)) if v}
+    return falhas, resumo
+
+
+def relatar(fase, n_tarefas, aceitos, duracao, latencias, unidade):
+    print(f"[{fase}] tarefas: {n_tarefas} | aceitas: {aceitos} | tempo: {duracao:.2f}s | "
+          f"{aceitos / duracao:.0f} {unidade}/s | {n_tarefas / duracao:.0f} tarefas/s")
+    print(f"[{fase}] latência p50: {latencias[len(latencias) // 2] * 1000:.1f} ms | "
+          f"p99: {latencias[max(int(len(latencias) * 0.99) - 1, 0)] * 1000:.1f} ms")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Teste de carga das inscrições RAS")
+    p.add_argument('--agentes', type=int, default=400)
+    p.add_argument('--vagas', type=int, default=5)
+    p.add_argument('--capacidade', type=int, default=20)
+    p.add_argument('--workers', type=int, default=16, help="threads (ou processos com --processos)")
+    p.add_argument('--repeticoes', type=int, default=2, help="cliques por agente em cada vaga (testa duplicidade)")
+    p.add_argument('--desistencias', type=float, default=0.3, help="fração dos ATIVOS que pede para sair na fase 2")
+    p.add_argument('--lote', type=int, default=25, help="pedidos de saída processados por transação")
+    p.add_argument('--processos', action='store_true', help="um processo por worker em vez de threads")
+    p.add_argument('--sorteio', action='store_true', help="vagas alocadas por sorteio em vez de ordem de chegada")
+    p.add_argument('--seed', type=int, default=42)
+    args = p.parse_args()
+    rnd = random.Random(args.seed)
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix='ras_carga_'), 'carga.db')
+    ids_agentes, ids_vagas = preparar_banco(caminho, args.agentes, args.vagas, args.capacidade,
+                                            'SORTEIO' if args.sorteio else 'ORDEM')
+    print(f"Banco: {caminho}")
+
+    # Fase 1: 80% dos agentes disputam as vagas
+    corte = int(len(ids_agentes) * 0.8)
+    tarefas = [('inscrever', a, v) for a in ids_agentes[:corte] for v in ids_vagas for _ in range(args.repeticoes)]
+    rnd.shuffle(tarefas)
+    aceitos, duracao, latencias = rodar(caminho, tarefas, args)
+    relatar("inscrições", len(tarefas), aceitos, duracao, latencias, "inscrições")
+
+    if args.sorteio:
+        pool = PoolConexoes(caminho, tamanho=1)
+        t0 = time.perf_counter()
+        sorteadas = ras_core.sortear_vagas(pool, ids_vagas=ids_vagas, semente=args.seed)
+        pool.fechar()
+        print(f"[sorteio] {len(sorteadas)} vaga(s), {sum(s[1] for s in sorteadas)} confirmado(s), "
+              f"{sum(s[2] for s in sorteadas)} na espera em {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    # Fase 2: desistências em lote (metade aprovada, metade negada) + os 20% restantes chegando
+    pedidos = pedir_desistencias(caminho, args.desistencias, rnd)
+    tarefas = [('inscrever', a, v) for a in ids_agentes[corte:] for v in ids_vagas]
+    for i in range(0, len(pedidos), args.lote):
+        bloco = pedidos[i:i + args.lote]
+        tarefas.append(('desistencias', bloco[::2], bloco[1::2]))
+    rnd.shuffle(tarefas)
+    aceitos, duracao, latencias = rodar(caminho, tarefas, args)
+    relatar("desistências+inscrições", len(tarefas), aceitos, duracao, latencias, "operações")
+
+    falhas, resumo = verificar(caminho)
+    print("Status: " + ", ".join(f"{s}={n}" for s, n in resumo))
+    if falhas:
+        for nome, detalhe in falhas.items():
+            print(f"FALHA: {nome}: {detalhe}")
+        sys.exit(1)
+    print("OK: nenhuma vaga acima de vagas_totais, nenhuma duplicidade, fila de espera sempre promovida, "
+          "contadores e resumos consistentes.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Gera um banco sintético com cara de produção para benchmark e homologação:
+# agentes com nomes acentuados, graduações e lotações desiguais; escalas espalhadas entre
+# o histórico (anos passados) e os próximos meses, com turnos que viram a noite; inscrições
+# com procura desigual (poucas escalas muito disputadas, fila de espera nelas, pedidos de
+# saída pendentes nas futuras). Grava direto em SQL (sem as checagens de inscrever_ras),
+# mas com os triggers ligados: contadores, resumos e índices de busca saem consistentes.
+# Uso: python scripts/gerar_dados.py saida.db --agentes 10000 --vagas 20000 --inscricoes 1000000
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+
+NOMES = ["João", "José", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luís", "Marcos",
+         "Maria", "Ana", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda", "Patrícia", "Aline",
+         "Raimundo", "Sebastião", "Conceição", "Iracema", "Cícero", "Valéria", "Rogério", "Vânia", "Cláudio", "Débora"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+              "Ribeiro", "Carvalho", "Araújo", "Melo", "Barbosa", "Cardoso", "Nascimento", "Conceição", "Magalhães", "Brandão"]
+LOTACOES = ["Inspetoria Centro", "Inspetoria Norte", "Inspetoria Sul", "Inspetoria Leste", "Inspetoria Oeste",
+            "Grupamento Ambiental", "Grupamento de Trânsito", "Ronda Escolar", "Guarda Patrimonial", "Canil",
+            "Grupamento Tático", "Central de Monitoramento"]
+# Pesos aproximados do efetivo: muitos guardas, poucos oficiais
+PESOS_GRADUACAO = [60, 10, 8, 6, 5, 4, 3, 2, 1, 1]
+EVENTOS = ["Show na Orla", "Jogo no Estádio", "Bloco de Carnaval", "Feira Livre", "Réveillon", "Festa Junina",
+           "Corrida de Rua", "Procissão", "Evento no Centro de Convenções", "Apoio ao Trânsito", "Vacinação",
+           "Eleição", "Parque Municipal", "Mercado Central"]
+# (hora_inicio, hora_fim, R$): 6 h, 8 h, 12 h e o noturno que vira o dia
+TURNOS = [("08:00:00", "14:00:00", 150), ("14:00:00", "22:00:00", 200), ("08:00:00", "20:00:00", 300),
+          ("22:00:00", "06:00:00", 250)]
+TAMANHO_LOTE = 50000
+
+
+def gerar_agentes(pool, n, rnd):
+    graduacoes = ras_core.CARGOS_PADRAO
+    senha = ras_core.make_hashes('1234')  # mesma senha para todos: logins de teste
+    linhas = [(str(100000 + i), f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}",
+               rnd.choices(graduacoes, PESOS_GRADUACAO)[0], rnd.choice(LOTACOES), senha)
+              for i in range(n)]
+    with pool.transacao(imediata=True) as conn:
+        conn.executemany("INSERT INTO agentes (matricula, nome, graduacao, lotacao, senha, primeiro_acesso) "
+                         "VALUES (?, ?, ?, ?, ?, 0)", linhas)
+        return [r[0] for r in conn.execute("SELECT id FROM agentes ORDER BY id")]
+
+
+def gerar_vagas(pool, n, dias_passado, dias_futuro, rnd):
+    hoje = datetime.date.today()
+    linhas = []
+    for _ in range(n):
+        data = hoje + datetime.timedelta(days=rnd.randint(-dias_passado, dias_futuro))
+        h_inicio, h_fim, valor = rnd.choice(TURNOS)
+        linhas.append((f"{rnd.choice(EVENTOS)} {rnd.randint(1, 300)}", data.isoformat(), h_inicio, h_fim,
+                       rnd.choice([5, 10, 10, 20, 20, 30, 50, 80]), valor))
+    with pool.transacao(imediata=True) as conn:
+        conn.executemany("INSERT INTO vagas_ras (evento, data_inicio, hora_inicio, hora_fim, vagas_totais, valor) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", linhas)
+        return conn.execute("SELECT id, data_inicio, inicio, fim, vagas_totais FROM vagas_ras ORDER BY id").fetchall()
+
+
+def gerar_inscricoes(pool, vagas, ids_agentes, total, rnd, progresso=None):
+    # Procura de cada escala ~ Pareto: a soma das procuras dá ~total inscrições.
+    # Os primeiros vagas_totais inscritos ocupam a vaga; o resto vai para a espera.
+    # Nas escalas futuras ~5% dos ocupantes já pediram para sair (PENDENTE_SAIDA).
+    hoje = datetime.date.today().isoformat()
+    pesos = [rnd.paretovariate(1.5) for _ in vagas]
+    escala = total / sum(pesos)
+    inseridas, lote = 0, []
+
+    def gravar():
+        with pool.transacao(imediata=True) as conn:
+            conn.executemany("INSERT INTO inscricoes (id_vaga, id_agente, status, data_inscricao, inicio, fim) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", lote)
+        if progresso:
+            progresso(inseridas)
+        lote.clear()
+
+    for (id_vaga, data, inicio, fim, vagas_totais), peso in zip(vagas, pesos):
+        procura = min(max(1, round(peso * escala)), len(ids_agentes), total - inseridas)
+        if procura <= 0:
+            break
+        abertura = datetime.datetime.fromisoformat(data) - datetime.timedelta(days=30)
+        for ordem, id_agente in enumerate(rnd.sample(ids_agentes, procura)):
+            if ordem >= vagas_totais:
+                status = 'ESPERA'
+            elif data >= hoje and rnd.random() < 0.05:
+                status = 'PENDENTE_SAIDA'
+            else:
+                status = 'ATIVO'
+            # Chegada crescente: a ordem da fila bate com data_inscricao
+            chegada = abertura + datetime.timedelta(minutes=ordem * 7 + rnd.randint(0, 6))
+            lote.append((id_vaga, id_agente, status, chegada.strftime('%Y-%m-%d %H:%M:%S'), inicio, fim))
+        inseridas += procura
+        if len(lote) >= TAMANHO_LOTE:
+            gravar()
+    if lote:
+        gravar()
+    return inseridas
+
+
+def gerar(caminho, n_agentes, n_vagas, n_inscricoes, dias_passado=730, dias_futuro=120, seed=42, progresso=None):
+    rnd = random.Random(seed)
+    pool = ras_core.abrir(caminho, tamanho=1)
+    try:
+        ids_agentes = gerar_agentes(pool, n_agentes, rnd)
+        vagas = gerar_vagas(pool, n_vagas, dias_passado, dias_futuro, rnd)
+        inscricoes = gerar_inscricoes(pool, vagas, ids_agentes, n_inscricoes, rnd, progresso)
+        with pool.conexao() as conn:
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        pool.fechar()
+    return len(ids_agentes), len(vagas), inscricoes
+
+
+def main():
+    p = argparse.ArgumentParser(description="Gera um banco RAS sintético")
+    p.add_argument('saida', help="arquivo .db a criar (não pode existir)")
+    p.add_argument('--agentes', type=int, default=10000)
+    p.add_argument('--vagas', type=int, default=20000)
+    p.add_argument('--inscricoes', type=int, default=1000000)
+    p.add_argument('--dias-passado', type=int, default=730, help="escalas desde N dias atrás")
+    p.add_argument('--dias-futuro', type=int, default=120, help="escalas até N dias à frente")
+    p.add_argument('--seed', type=int, default=42)
+    args = p.parse_args()
+    if os.path.exists(args.saida):
+        sys.exit(f"{args.saida} já existe.")
+
+    def progresso(n):
+        print(f"\r{n} inscrição(ões) gravada(s)...", end='', file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    agentes, vagas, inscricoes = gerar(args.saida, args.agentes, args.vagas, args.inscricoes,
+                                       args.dias_passado, args.dias_futuro, args.seed, progresso)
+    print(file=sys.stderr)
+    print(f"{args.saida}: {agentes} agentes, {vagas} escalas, {inscricoes} inscrições "
+          f"em {time.perf_counter() - t0:.1f}s ({os.path.getsize(args.saida) / 2**20:.0f} MB).")
+
+
+if __name__ == '__main__':
+    main()
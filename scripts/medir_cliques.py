@@ -0,0 +1,88 @@
+# Tempo de servidor por clique em "Inscrever": página inteira x fragmento do card.
+# Roda o app com streamlit.testing (AppTest) sobre um banco temporário com N escalas e
+# lê os tempos que o próprio app registra em session_state['tempos_execucao'].
+#   antes: cada clique reexecutava o script até o botão, dormia 1 s e fazia st.rerun().
+#          Esse caminho não existe mais no app: o número "antes" é uma ESTIMATIVA (limite
+#          inferior) = sleep antigo + uma página inteira medida agora. Para referência mede-se
+#          também o clique de ponta a ponta no AppTest (execução até o botão + página inteira,
+#          sem o sleep), que inclui o custo do próprio AppTest;
+#   depois: o clique reexecuta só o fragmento do card (gravação + releitura da vaga)
+#          e o redesenha uma vez (st.rerun(scope="fragment")).
+# O AppTest não faz rerun parcial: o clique roda numa execução completa, e os tempos
+# dos fragmentos são separados pelos registros de cada card.
+# Uso: python scripts/medir_cliques.py --vagas 20 --cliques 10
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Tempo de servidor por clique (página x fragmento)")
+    p.add_argument('--vagas', type=int, default=20, help="escalas na página")
+    p.add_argument('--cliques', type=int, default=10)
+    p.add_argument('--sleep-antigo-ms', type=float, default=1000, help="time.sleep que o clique fazia antes")
+    args = p.parse_args()
+
+    os.environ['RAS_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='ras_cliques_'), 'ras.db')
+    from streamlit.testing.v1 import AppTest
+    import ras_core
+    from ras_db import PoolConexoes
+
+    pool = PoolConexoes(os.environ['RAS_DB_PATH'], tamanho=1)
+    ras_core.inicializar_banco(pool)
+    hoje = datetime.date.today()
+    for i in range(args.vagas):
+        ras_core.criar_vaga(pool, f"Evento {i}", hoje + datetime.timedelta(days=i + 1),
+                            datetime.time(8), datetime.time(20), 1000, 200)
+    pool.escrever(lambda conn: conn.executemany(
+        "INSERT INTO agentes (matricula, nome, senha, primeiro_acesso) VALUES (?, ?, '', 0)",
+        [(f"M{i}", f"Agente {i}") for i in range(args.cliques)]))
+    with pool.conexao() as conn:
+        ids_agentes = [r[0] for r in conn.execute("SELECT id FROM agentes ORDER BY id")]
+    pool.fechar()
+
+    pagina, fragmento, ponta_a_ponta = [], [], []
+    for n in range(args.cliques):
+        at = AppTest.from_file(os.path.join(RAIZ, 'sistema_ras.py'), default_timeout=30)
+        at.run()
+        at.session_state['logado'] = True
+        at.session_state['tipo_usuario'] = 'agente'
+        at.session_state['usuario_id'] = ids_agentes[n]
+        at.run()
+        alvo = n % args.vagas  # card clicado (id da vaga = alvo + 1)
+        at.session_state['tempos_execucao'] = []
+        [b for b in at.button if b.key == f"v_{alvo + 1}"][0].click()
+        inicio = time.perf_counter()
+        at.run()
+        ponta_a_ponta.append((time.perf_counter() - inicio) * 1000)
+        if at.exception:
+            sys.exit(f"Erro no app: {at.exception[0].message}")
+        tempos = at.session_state['tempos_execucao']
+        # A execução do clique para no card clicado (rerun); depois vem uma execução completa
+        cards_clique = tempos[:alvo + 1]
+        cards_rerun = [ms for tipo, ms in tempos[alvo + 1:] if tipo == 'card_vaga']
+        ms_pagina = [ms for tipo, ms in tempos if tipo == 'pagina'][-1]
+        pagina.append(ms_pagina)
+        fragmento.append(cards_clique[alvo][1] + cards_rerun[alvo])
+
+    def resumo(valores):
+        valores = sorted(valores)
+        return f"mediana {statistics.median(valores):8.1f} ms | máx {valores[-1]:8.1f} ms"
+
+    print(f"{args.vagas} escalas na página, {args.cliques} cliques em 'Inscrever'")
+    print(f"antes  ESTIMADO, limite inferior (sleep de {args.sleep_antigo_ms:.0f} ms + página inteira): "
+          f"{resumo([args.sleep_antigo_ms + v for v in pagina])}")
+    print(f"       página inteira (medida, registro do app):      {resumo(pagina)}")
+    print(f"       clique no AppTest (medido, ponta a ponta):     {resumo(ponta_a_ponta)}")
+    print(f"depois fragmento do card (medido, registro do app):   {resumo(fragmento)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,21 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import time
-import hashlib
+import io
+import datetime
+import functools
+import sqlite3
+import uuid
+from streamlit.errors import StreamlitAPIException
+from ras_db import DB_PATH, MonitorVersoes, PoolConexoes
+from ras_perfil import PERFIL
+import ras_core
+import ras_perfil
+import ras_senha
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Sistema RAS", layout="wide")
 
-# --- FUNÇÕES DE SEGURANÇA (HASH) ---
-def make_hashes(password):
-    return hashlib.sha256(str.encode(password)).hexdigest()
-
-def check_hashes(password, hashed_text):
-    if make_hashes(password) == hashed_text:
-        return True
-    return False
-
 # --- GERENCIAMENTO DE SESSÃO ---
 if 'logado' not in st.session_state:
     st.session_state['logado'] = False
@@ -29,242 +29,352 @@ def logout():
         del st.session_state[key]
     st.rerun()
 
-# --- BANCO DE DADOS (V6 - COM TABELA DE CARGOS) ---
-def get_connection():
-    # V6 garante o reset total e nova estrutura
-    return sqlite3.connect('ras_database_v6.db')
+# --- AVISOS (toast) E TEMPO DE SERVIDOR POR EXECUÇÃO ---
+_inicio_execucao = time.perf_counter()
+INTERVALO_ATUALIZACAO = 5  # segundos entre verificações de mudança (ocupação e pedidos ao vivo)
 
-def init_db():
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # 1. Tabela Agentes
-    c.execute('''CREATE TABLE IF NOT EXISTS agentes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    matricula TEXT UNIQUE,
-                    nome TEXT,
-                    graduacao TEXT,
-                    lotacao TEXT,
-                    senha TEXT,
-                    primeiro_acesso INTEGER DEFAULT 0
-                )''')
-    
-    # 2. Tabela Admin
-    c.execute('''CREATE TABLE IF NOT EXISTS administradores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    usuario TEXT UNIQUE,
-                    senha TEXT,
-                    primeiro_acesso INTEGER DEFAULT 1
-                )''')
-    
-    # 3. Tabela Vagas
-    c.execute('''CREATE TABLE IF NOT EXISTS vagas_ras (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    evento TEXT,
-                    data_inicio DATE,
-                    hora_inicio TIME,
-                    hora_fim TIME,
-                    vagas_totais INTEGER,
-                    valor REAL
-                )''')
-    
-    # 4. Tabela Inscrições
-    c.execute('''CREATE TABLE IF NOT EXISTS inscricoes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    id_vaga INTEGER,
-                    id_agente INTEGER,
-                    status TEXT DEFAULT 'ATIVO',
-                    data_inscricao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(id_vaga) REFERENCES vagas_ras(id),
-                    FOREIGN KEY(id_agente) REFERENCES agentes(id)
-                )''')
-
-    # 5. NOVA TABELA: Cargos
-    c.execute('''CREATE TABLE IF NOT EXISTS cargos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT UNIQUE
-                )''')
-
-    # Popula cargos padrão se a tabela estiver vazia
-    c.execute("SELECT count(*) FROM cargos")
-    if c.fetchone()[0] == 0:
-        cargos_padrao = ["Guarda Municipal", "Subinspetor", "Inspetor", "Soldado", "Cabo", "Sargento", "Subtenente", "Tenente", "Capitão", "Major"]
-        for cargo in cargos_padrao:
-            try:
-                c.execute("INSERT INTO cargos (nome) VALUES (?)", (cargo,))
-            except: pass
+def avisar(mensagem, icone=None, chave='pagina'):
+    # Toast que sobrevive ao st.rerun(): mostrado no começo da próxima execução da
+    # página ('pagina') ou do fragmento dono da chave
+    st.session_state.setdefault(f'avisos_{chave}', []).append((mensagem, icone))
+
+def mostrar_avisos(chave='pagina'):
+    for mensagem, icone in st.session_state.pop(f'avisos_{chave}', []):
+        st.toast(mensagem, icon=icone)
 
-    # Cria Admin Padrão (admin / admin123)
+def registrar_tempo(tipo, inicio):
+    # Últimas execuções desta sessão: ('pagina' ou nome do fragmento, ms de servidor)
+    tempos = st.session_state.setdefault('tempos_execucao', [])
+    tempos.append((tipo, (time.perf_counter() - inicio) * 1000))
+    del tempos[:-50]
+
+def rerun_fragmento():
+    # Clique processado numa execução completa (outro widget disparou o rerun junto):
+    # não há rerun só do fragmento, então a página inteira é refeita
     try:
-        senha_hash = make_hashes('admin123')
-        c.execute("INSERT INTO administradores (usuario, senha, primeiro_acesso) VALUES (?, ?, ?)", 
-                  ('admin', senha_hash, 1))
-    except sqlite3.IntegrityError:
-        pass 
-        
-    conn.commit()
-    conn.close()
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def cronometrado(tipo):
+    # Fragmento: tempo em session_state e execução própria no perfil (dentro da execução
+    # da página quando roda numa execução completa)
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            inicio = time.perf_counter()
+            execucao = PERFIL.iniciar_execucao(st.session_state.get('id_sessao'), origem=tipo)
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                registrar_tempo(tipo, inicio)
+                PERFIL.encerrar_execucao(execucao)
+        return executar
+    return decorador
+
+# Execução da página no perfil (ras_perfil). st.rerun()/st.stop() interrompem o script antes do fim:
+# a execução que ficou aberta é fechada aqui, marcada como interrompida
+st.session_state.setdefault('id_sessao', uuid.uuid4().hex[:8])
+if 'execucao_perfil' in st.session_state:
+    PERFIL.encerrar_execucao(st.session_state['execucao_perfil'], interrompida=True)
+st.session_state['execucao_perfil'] = PERFIL.iniciar_execucao(st.session_state['id_sessao'], 'Login')
+
+# Execução completa: os dados relidos pelos fragmentos (chaves frag_*) são descartados,
+# a página inteira volta a ler do banco/cache
+for _chave in [k for k in st.session_state if k.startswith('frag_')]:
+    del st.session_state[_chave]
+mostrar_avisos()
+
+# --- BANCO DE DADOS (V6 - COM TABELA DE CARGOS) ---
+# O nome do arquivo não muda mais a cada versão: o schema é atualizado no lugar (ras_db.migrar)
+@st.cache_resource
+def get_pool():
+    # Um pool por processo do servidor, compartilhado por todas as sessões. Leituras usam
+    # as conexões do pool em paralelo; escritas vão para a thread escritora única (group commit)
+    return PoolConexoes(DB_PATH, fila_escrita=True)
+
+def conexao():
+    return get_pool().conexao()
+
+@st.cache_resource
+def init_db():
+    # Uma vez por processo do servidor (não a cada rerun): migrações e dados iniciais
+    return ras_core.inicializar_banco(get_pool())
 
 init_db()
 
+@st.cache_resource
+def get_monitor():
+    # Versão de cada tabela (triggers + PRAGMA data_version): chave dos caches de leitura
+    return MonitorVersoes(DB_PATH)
+
+# --- CACHE DE LEITURA (invalidado quando alguma tabela lida muda de versão) ---
+@st.cache_data(max_entries=4, show_spinner=False)
+def _cargos_em_cache(versao):
+    return ras_core.listar_cargos(get_pool())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _pendentes_em_cache(versao):
+    return ras_core.listar_desistencias_pendentes(get_pool())
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _vagas_em_cache(versao, hoje, historico, data_de, data_ate, evento, cursor):
+    return ras_core.listar_vagas(get_pool(), historico=historico, data_de=data_de, data_ate=data_ate,
+                                 evento=evento, cursor=cursor, hoje=hoje)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _lotacoes_em_cache(versao):
+    return ras_core.listar_lotacoes(get_pool())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _conflitos_em_cache(versao, hoje):
+    return ras_core.relatorio_conflitos(get_pool(), desde=hoje)
+
 # --- FUNÇÕES DE LÓGICA ---
 
 def get_lista_cargos():
-    conn = get_connection()
-    df = pd.read_sql("SELECT nome FROM cargos ORDER BY nome", conn)
-    conn.close()
-    return df['nome'].tolist()
+    return _cargos_em_cache(get_monitor().versao('cargos'))
+
+def get_lotacoes():
+    return _lotacoes_em_cache(get_monitor().versao('agentes'))
+
+def get_desistencias_pendentes():
+    return _pendentes_em_cache(get_monitor().versao('inscricoes', 'agentes', 'vagas_ras'))
+
+def listar_vagas(historico, data_de, data_ate, evento, cursor):
+    return _vagas_em_cache(get_monitor().versao('vagas_ras'), datetime.date.today(),
+                           historico, data_de, data_ate, evento, cursor)
 
+def get_conflitos():
+    return _conflitos_em_cache(get_monitor().versao('inscricoes', 'agentes', 'vagas_ras', 'parametros'),
+                               datetime.date.today())
+
+# Regras de negócio ficam em ras_core (sem Streamlit); aqui só o pool do servidor
 def adicionar_cargo(novo_cargo):
-    conn = get_connection()
-    try:
-        conn.execute("INSERT INTO cargos (nome) VALUES (?)", (novo_cargo,))
-        conn.commit()
-        return True
-    except:
-        return False
-    finally:
-        conn.close()
+    return ras_core.adicionar_cargo(get_pool(), novo_cargo)
 
 def remover_cargo(cargo_nome):
-    conn = get_connection()
-    conn.execute("DELETE FROM cargos WHERE nome = ?", (cargo_nome,))
-    conn.commit()
-    conn.close()
+    ras_core.remover_cargo(get_pool(), cargo_nome)
 
 def login_admin(usuario, senha):
-    conn = get_connection()
-    user = conn.execute("SELECT id, senha, primeiro_acesso FROM administradores WHERE usuario = ?", (usuario,)).fetchone()
-    conn.close()
-    if user and check_hashes(senha, user[1]):
-        return True, user[0], user[2]
-    return False, None, None
+    return ras_core.autenticar_admin(get_pool(), usuario, senha)
 
 def login_agente(matricula, senha):
-    conn = get_connection()
-    user = conn.execute("SELECT id, nome, senha, primeiro_acesso FROM agentes WHERE matricula = ?", (matricula,)).fetchone()
-    conn.close()
-    if user and check_hashes(senha, user[2]):
-        return True, user[0], user[1], user[3]
-    return False, None, None, None
+    return ras_core.autenticar_agente(get_pool(), matricula, senha)
 
 def cadastrar_agente_self(matricula, nome, graduacao, lotacao, senha):
-    conn = get_connection()
-    try:
-        senha_cripto = make_hashes(senha)
-        conn.execute("INSERT INTO agentes (matricula, nome, graduacao, lotacao, senha, primeiro_acesso) VALUES (?, ?, ?, ?, ?, 0)", 
-                     (matricula, nome, graduacao, lotacao, senha_cripto))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    return ras_core.cadastrar_agente(get_pool(), matricula, nome, graduacao, lotacao, senha)
 
 def alterar_senha(tipo_usuario, id_usuario, nova_senha):
-    conn = get_connection()
-    nova_senha_hash = make_hashes(nova_senha)
-    tabela = "administradores" if tipo_usuario == 'admin' else "agentes"
-    conn.execute(f"UPDATE {tabela} SET senha = ?, primeiro_acesso = 0 WHERE id = ?", (nova_senha_hash, id_usuario))
-    conn.commit()
-    conn.close()
-
-def criar_vaga(evento, data, h_inicio, h_fim, qtd, valor):
-    conn = get_connection()
-    conn.execute("INSERT INTO vagas_ras (evento, data_inicio, hora_inicio, hora_fim, vagas_totais, valor) VALUES (?, ?, ?, ?, ?, ?)",
-                 (evento, data, str(h_inicio), str(h_fim), qtd, valor))
-    conn.commit()
-    conn.close()
-
-def inscrever_ras(id_agente, id_vaga):
-    conn = get_connection()
+    ras_core.alterar_senha(get_pool(), tipo_usuario, id_usuario, nova_senha)
 
-    # Verifica se já existe inscrição
-    check = conn.execute("""
-        SELECT status FROM inscricoes 
-        WHERE id_agente = ? AND id_vaga = ?
-    """, (id_agente, id_vaga)).fetchone()
+def criar_vaga(evento, data, h_inicio, h_fim, qtd, valor, modo='ORDEM', dias_sorteio=2):
+    ras_core.criar_vaga(get_pool(), evento, data, h_inicio, h_fim, qtd, valor, modo, dias_sorteio)
 
-    if check:
-        conn.close()
-        return False, "Você já está inscrito nesta escala."
-
-    vagas_totais = conn.execute(
-        "SELECT vagas_totais FROM vagas_ras WHERE id = ?", 
-        (id_vaga,)
-    ).fetchone()[0]
-
-    ativos = conn.execute("""
-        SELECT COUNT(*) FROM inscricoes 
-        WHERE id_vaga = ? AND status = 'ATIVO'
-    """, (id_vaga,)).fetchone()[0]
-
-    if ativos < vagas_totais:
-        status = 'ATIVO'
-        msg = "Inscrição confirmada!"
-    else:
-        status = 'ESPERA'
-        msg = "Vagas esgotadas. Você entrou na lista de espera."
-
-    conn.execute("""
-        INSERT INTO inscricoes (id_vaga, id_agente, status)
-        VALUES (?, ?, ?)
-    """, (id_vaga, id_agente, status))
-
-    conn.commit()
-    conn.close()
-
-    return True, msg
+def inscrever_ras(id_agente, id_vaga):
+    return ras_core.inscrever_ras(get_pool(), id_agente, id_vaga)
 
 
 def solicitar_desistencia(id_inscricao):
-    conn = get_connection()
-    conn.execute("UPDATE inscricoes SET status = 'PENDENTE_SAIDA' WHERE id = ?", (id_inscricao,))
-    conn.commit()
-    conn.close()
+    return ras_core.solicitar_desistencia(get_pool(), id_inscricao)
 
 def cancelar_desistencia(id_inscricao):
-    conn = get_connection()
-    conn.execute("UPDATE inscricoes SET status = 'ATIVO' WHERE id = ?", (id_inscricao,))
-    conn.commit()
-    conn.close()
+    return ras_core.cancelar_desistencia(get_pool(), id_inscricao)
+
+def retirar_interesse(id_inscricao):
+    return ras_core.retirar_interesse(get_pool(), id_inscricao)
 
 def admin_processar_desistencia(id_inscricao, aprovado):
-    conn = get_connection()
-
-    # Descobre qual vaga foi liberada
-    vaga_id = conn.execute(
-        "SELECT id_vaga FROM inscricoes WHERE id = ?", 
-        (id_inscricao,)
-    ).fetchone()[0]
-
-    if aprovado:
-        conn.execute("DELETE FROM inscricoes WHERE id = ?", (id_inscricao,))
-
-        # Puxa o primeiro da lista de espera
-        espera = conn.execute("""
-            SELECT id FROM inscricoes
-            WHERE id_vaga = ? AND status = 'ESPERA'
-            ORDER BY data_inscricao ASC
-            LIMIT 1
-        """, (vaga_id,)).fetchone()
-
-        if espera:
-            conn.execute("""
-                UPDATE inscricoes 
-                SET status = 'ATIVO'
-                WHERE id = ?
-            """, (espera[0],))
-
-    else:
-        conn.execute("""
-            UPDATE inscricoes 
-            SET status = 'ATIVO'
-            WHERE id = ?
-        """, (id_inscricao,))
-
-    conn.commit()
-    conn.close()
+    return ras_core.admin_processar_desistencia(get_pool(), id_inscricao, aprovado)
+
+def gerar_exportacao(pool, tipo, formato, filtros):
+    # Chamado pelo download_button só no clique (thread à parte, sem bloquear a página):
+    # as linhas vão do cursor direto para o escritor CSV/XLSX
+    arquivo = io.BytesIO()
+    ras_core.exportar(pool, tipo, formato, arquivo, **filtros)
+    return arquivo
+
+
+# --- PAGINAÇÃO POR CURSOR (componentes de tela) ---
+def pilha_cursores(chave, filtros):
+    # Pilha dos cursores das páginas visitadas; volta à primeira página quando o filtro muda
+    if st.session_state.get(f'{chave}_filtros') != filtros:
+        st.session_state[f'{chave}_filtros'] = filtros
+        st.session_state[f'{chave}_cursores'] = [None]
+    return st.session_state[f'{chave}_cursores']
+
+def navegacao_paginas(chave, cursores, proximo_cursor):
+    p1, p2, p3 = st.columns([1, 2, 1])
+    p2.caption(f"Página {len(cursores)}")
+    if len(cursores) > 1 and p1.button("⬅️ Anterior", key=f"{chave}_anterior"):
+        cursores.pop()
+        st.rerun()
+    if proximo_cursor and p3.button("Próxima ➡️", key=f"{chave}_proxima"):
+        cursores.append(proximo_cursor)
+        st.rerun()
+
+
+# --- CARDS E LINHAS COM RERUN PRÓPRIO (st.fragment) ---
+# Um clique reexecuta só o fragmento: grava, relê só o dado dele (guardado em frag_*)
+# e se redesenha. O resto da página continua como estava até o próximo rerun completo.
+@st.fragment
+@cronometrado('card_vaga')
+def card_vaga(row, historico):
+    chave = f"frag_vaga_{row['id']}"
+    mostrar_avisos(chave)
+    row = st.session_state.get(chave, row)
+    vagas_restantes = row['vagas_totais'] - row['inscritos']
+    aguardando_sorteio = row['modo_alocacao'] != 'ORDEM' and not row['sorteada_em']
+    pct = min(row['inscritos'] / row['vagas_totais'], 1.0) if row['vagas_totais'] > 0 else 0
+
+    with st.container(border=True):
+        c1, c2, c3 = st.columns([3, 2, 1])
+        with c1:
+            st.markdown(f"### {row['evento']}")
+            st.write(f"📅 {row['data_inicio']} | 🕒 {row['hora_inicio']} - {row['hora_fim']}")
+            st.write(f"💰 R$ {row['valor']:.2f}")
+        with c2:
+            st.write(f"Ocupação: {row['inscritos']}/{row['vagas_totais']}")
+            st.progress(pct)
+            if row['cancelada']: st.caption("Cancelada")
+            elif historico: st.caption("Encerrada")
+            elif aguardando_sorteio:
+                st.info(f"🎲 Sorteio em {row['fim_interesse'][:16]}")
+                st.caption(f"{row['interessados']} interessado(s)")
+            elif vagas_restantes <= 0: st.error("LOTADO")
+            elif vagas_restantes <= 5: st.warning("Últimas Vagas")
+            else: st.success("Disponível")
+        if historico:
+            return
+        with c3:
+            st.write("")
+            st.write("")
+            btn_label = "Inscrever"
+            btn_help = None
+
+            if aguardando_sorteio:
+                btn_label = "Tenho Interesse"
+                btn_help = "As vagas serão sorteadas entre os interessados ao fim do prazo"
+            elif vagas_restantes <= 0:
+                btn_label = "Entrar na Lista de Espera"
+                btn_help = "Você será chamado caso alguém desista"
+
+            if st.button(btn_label, key=f"v_{row['id']}", use_container_width=True, help=btn_help):
+                ok, msg = inscrever_ras(st.session_state['usuario_id'], row['id'])
+                avisar(msg, "✅" if ok else "⚠️", chave)
+                st.session_state[chave] = ras_core.obter_vaga(get_pool(), row['id']) or row
+                rerun_fragmento()
+
+@st.fragment
+@cronometrado('minha_escala')
+def linha_minha_escala(row):
+    chave = f"frag_inscricao_{row['id_inscricao']}"
+    mostrar_avisos(chave)
+    status_atual = st.session_state.get(chave, row['status'])
+
+    with st.container(border=True):
+        col_a, col_b = st.columns([4, 1])
+        col_a.write(f"**{row['evento']}** em {row['data_inicio']}")
+        acao = None
+
+        if status_atual == 'ATIVO':
+            col_a.success("Confirmado ✅")
+            if col_b.button("Solicitar Desistência", key=f"sair_{row['id_inscricao']}"):
+                acao = solicitar_desistencia, "Pedido de saída enviado ao comando."
+
+        elif status_atual == 'ESPERA':
+            col_a.info("🕒 Lista de Espera")
+
+        elif status_atual == 'INTERESSADO':
+            col_a.info("🎲 Aguardando Sorteio")
+            if col_b.button("Retirar Interesse", key=f"ret_{row['id_inscricao']}"):
+                acao = retirar_interesse, "Interesse retirado."
+
+        elif status_atual == 'CANCELADA':
+            col_a.error("❌ Escala cancelada pelo comando")
+
+        elif status_atual == 'PENDENTE_SAIDA':
+            col_a.warning("⏳ Aguardando Aprovação do Comando para sair")
+            if col_b.button("Cancelar Pedido", key=f"canc_sair_{row['id_inscricao']}"):
+                acao = cancelar_desistencia, "Pedido de saída cancelado."
+
+        elif status_atual is None:
+            col_a.caption("Inscrição removida.")
+
+        if acao:
+            funcao, mensagem = acao
+            if funcao(row['id_inscricao']):
+                avisar(mensagem, chave=chave)
+            else:
+                avisar("A situação desta inscrição mudou; a tela foi atualizada.", "⚠️", chave=chave)
+            st.session_state[chave] = ras_core.status_inscricao(get_pool(), row['id_inscricao'])
+            rerun_fragmento()
+
+@st.fragment
+@cronometrado('pedido_saida')
+def linha_pedido_saida(row):
+    chave = f"frag_pedido_{row['id']}"
+    mostrar_avisos(chave)
+    c1, c2, c3 = st.columns([3, 1, 1])
+    if chave in st.session_state:
+        c1.write(f"~~{row['nome']} — {row['evento']}~~ {st.session_state[chave]}")
+        return
+    c1.write(f"**{row['nome']}** quer sair de **{row['evento']}**")
+    aprovado = None
+    if c2.button("✅ Aprovar", key=f"apr_{row['id']}"): aprovado = True
+    if c3.button("❌ Negar", key=f"neg_{row['id']}"): aprovado = False
+    if aprovado is not None:
+        aprovados, negados, promovidos = admin_processar_desistencia(row['id'], aprovado)
+        if aprovados:
+            resultado = f"✅ Aprovada ({promovidos} promovido(s) da lista de espera)"
+        elif negados:
+            resultado = "❌ Negada"
+        else:
+            resultado = "Pedido já processado"
+        st.session_state[chave] = resultado
+        avisar(resultado, chave=chave)
+        rerun_fragmento()
+
+
+# --- ATUALIZAÇÃO AO VIVO (fragmentos com run_every) ---
+# Rodam sozinhos a cada INTERVALO_ATUALIZACAO segundos. Sem mudança no banco o custo é o
+# PRAGMA data_version do MonitorVersoes (nenhuma tabela é lida): centenas de agentes com a
+# página aberta não pesam no SQLite.
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+@cronometrado('grade_vagas')
+def grade_vagas_ao_vivo(vagas, versao):
+    # Cards das próximas escalas. versao = versão de vagas_ras com que a página foi lida (os
+    # contadores de ocupação ficam em vagas_ras, toda inscrição muda a versão). A cada tick só
+    # a grade roda: parada, é o PRAGMA data_version e o redesenho dos cards (dados já em
+    # memória). Quando a versão anda, relê só as escalas desta página pela chave primária e
+    # troca o dado dos cards que mudaram (frag_vaga_{id}); a página não é refeita
+    vista = st.session_state.get('frag_vigia_vagas', versao)
+    atual = get_monitor().versao('vagas_ras')
+    if atual != vista:
+        st.session_state['frag_vigia_vagas'] = atual
+        novas = ras_core.obter_vagas(get_pool(), [v['id'] for v in vagas])
+        for v in vagas:
+            chave = f"frag_vaga_{v['id']}"
+            nova = novas.get(v['id'])
+            if nova and nova != st.session_state.get(chave, v):
+                st.session_state[chave] = nova
+    for row in vagas:
+        card_vaga(row, False)
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+@cronometrado('aviso_desistencias')
+def aviso_desistencias(ids_na_tela):
+    # Banner do comando: a lista vem do cache por versão (parado, nenhuma leitura). Pedidos
+    # novos ou já tratados por outro admin não refazem a página sozinhos (perderia a seleção
+    # em andamento): o admin atualiza quando quiser
+    pedidos = get_desistencias_pendentes()
+    if pedidos:
+        st.warning(f"🔔 Há {len(pedidos)} desistências pendentes!")
+    if {p['id'] for p in pedidos} != set(ids_na_tela):
+        c1, c2 = st.columns([4, 1])
+        c1.caption("As solicitações mudaram desde que a lista abaixo foi carregada.")
+        if c2.button("🔄 Atualizar", key="atualizar_desistencias"):
+            st.rerun()
 
 
 # ================= TELA DE LOGIN / CADASTRO =================
@@ -287,28 +397,32 @@ if not st.session_state['logado']:
             senha_input = st.text_input("Senha", type="password")
             
             if st.button("Entrar"):
-                if tipo == "Administrador":
-                    sucesso, uid, p_acesso = login_admin(usuario_input, senha_input)
-                    if sucesso:
-                        st.session_state['logado'] = True
-                        st.session_state['tipo_usuario'] = 'admin'
-                        st.session_state['usuario_id'] = uid
-                        st.session_state['primeiro_acesso'] = bool(p_acesso)
-                        st.rerun()
-                    else:
-                        st.error("Usuário ou senha inválidos")
+                # ValueError: tentativa barrada pelo limite de tentativas (conta bloqueada / servidor ocupado)
+                try:
+                    if tipo == "Administrador":
+                        sucesso, uid, p_acesso = login_admin(usuario_input, senha_input)
+                        if sucesso:
+                            st.session_state['logado'] = True
+                            st.session_state['tipo_usuario'] = 'admin'
+                            st.session_state['usuario_id'] = uid
+                            st.session_state['primeiro_acesso'] = bool(p_acesso)
+                            st.rerun()
+                        else:
+                            st.error("Usuário ou senha inválidos")
                 
-                else: 
-                    sucesso, uid, nome, p_acesso = login_agente(usuario_input, senha_input)
-                    if sucesso:
-                        st.session_state['logado'] = True
-                        st.session_state['tipo_usuario'] = 'agente'
-                        st.session_state['usuario_id'] = uid
-                        st.session_state['nome_usuario'] = nome
-                        st.session_state['primeiro_acesso'] = bool(p_acesso)
-                        st.rerun()
-                    else:
-                        st.error("Matrícula ou senha incorretos")
+                    else: 
+                        sucesso, uid, nome, p_acesso = login_agente(usuario_input, senha_input)
+                        if sucesso:
+                            st.session_state['logado'] = True
+                            st.session_state['tipo_usuario'] = 'agente'
+                            st.session_state['usuario_id'] = uid
+                            st.session_state['nome_usuario'] = nome
+                            st.session_state['primeiro_acesso'] = bool(p_acesso)
+                            st.rerun()
+                        else:
+                            st.error("Matrícula ou senha incorretos")
+                except ValueError as e:
+                    st.error(str(e))
 
         with tab_cadastro:
             st.write("Crie sua conta para acessar as escalas.")
@@ -330,8 +444,7 @@ if not st.session_state['logado']:
                     st.error("As senhas não coincidem.")
                 elif new_mat and new_pass and new_nome:
                     if cadastrar_agente_self(new_mat, new_nome, new_grad, new_lot, new_pass):
-                        st.success("Conta criada! Redirecionando...")
-                        time.sleep(2) 
+                        avisar("Conta criada! Faça login com sua matrícula.", "✅")
                         st.rerun()
                     else:
                         st.error("Matrícula já cadastrada.")
@@ -341,6 +454,7 @@ if not st.session_state['logado']:
 # ================= SISTEMA LOGADO =================
 else:
     if st.session_state['primeiro_acesso']:
+        PERFIL.definir_tela("Troca de Senha")
         st.warning("⚠️ Atenção: Por segurança, altere sua senha inicial agora.")
         with st.form("form_troca_senha"):
             nova_s1 = st.text_input("Nova Senha", type="password")
@@ -349,8 +463,7 @@ else:
                 if nova_s1 == nova_s2 and len(nova_s1) > 3:
                     alterar_senha(st.session_state['tipo_usuario'], st.session_state['usuario_id'], nova_s1)
                     st.session_state['primeiro_acesso'] = False
-                    st.success("Sucesso!")
-                    time.sleep(1)
+                    avisar("Senha atualizada!", "✅")
                     st.rerun()
                 else:
                     st.error("Erro na senha.")
@@ -363,118 +476,309 @@ else:
     if sidebar.button("Sair / Logout"):
         logout()
     st.sidebar.markdown("---")
+
+    # Sorteios com janela encerrada rodam no primeiro carregamento de página depois do prazo
+    # (uma consulta indexada quando não há nada a sortear; o CLI 'sortear' faz o mesmo via cron)
+    ras_core.sortear_vagas(get_pool())
     
     # === VISÃO DO ADMINISTRADOR ===
     if st.session_state['tipo_usuario'] == 'admin':
         st.header("Painel de Comando")
         
         # --- NOTIFICAÇÕES ---
-        conn = get_connection()
-        try:
-            pedidos_saida = pd.read_sql('''
-                SELECT i.id, a.nome, a.matricula, v.evento, v.data_inicio 
-                FROM inscricoes i
-                JOIN agentes a ON i.id_agente = a.id
-                JOIN vagas_ras v ON i.id_vaga = v.id
-                WHERE i.status = 'PENDENTE_SAIDA'
-            ''', conn)
-        except:
-            pedidos_saida = pd.DataFrame()
-        conn.close()
+        pedidos_saida = get_desistencias_pendentes()
+        if 'desist_resultado' in st.session_state:
+            aprovados, negados, promovidos = st.session_state.pop('desist_resultado')
+            st.success(f"{aprovados} aprovada(s), {negados} negada(s), {promovidos} agente(s) promovido(s) da lista de espera.")
         
-        if not pedidos_saida.empty:
-            st.warning(f"🔔 Há {len(pedidos_saida)} desistências pendentes!")
+        aviso_desistencias([row['id'] for row in pedidos_saida])
+        if pedidos_saida:
             with st.expander("Ver Solicitações", expanded=True):
-                for idx, row in pedidos_saida.iterrows():
-                    c1, c2, c3 = st.columns([3, 1, 1])
-                    c1.write(f"**{row['nome']}** quer sair de **{row['evento']}**")
-                    if c2.button("✅ Aprovar", key=f"apr_{row['id']}"):
-                        admin_processar_desistencia(row['id'], True)
-                        st.rerun()
-                    if c3.button("❌ Negar", key=f"neg_{row['id']}"):
-                        admin_processar_desistencia(row['id'], False)
-                        st.rerun()
+                # Processamento em lote: todas as selecionadas em uma transação
+                por_id = {row['id']: row for row in pedidos_saida}
+                todas = st.checkbox("Selecionar todas", key="desist_todas")
+                selecionadas = st.multiselect(
+                    "Solicitações", list(por_id), default=list(por_id) if todas else [],
+                    format_func=lambda i: f"{por_id[i]['nome']} ({por_id[i]['matricula']}) - {por_id[i]['evento']} em {por_id[i]['data_inicio']}")
+                b1, b2, _ = st.columns([1, 1, 3])
+                acao = None
+                if b1.button(f"✅ Aprovar {len(selecionadas)}", disabled=not selecionadas): acao = 'aprovar'
+                if b2.button(f"❌ Negar {len(selecionadas)}", disabled=not selecionadas): acao = 'negar'
+                if acao:
+                    aprovados, negados, promovidos = ras_core.processar_desistencias(
+                        get_pool(), **{acao: selecionadas})
+                    st.session_state['desist_resultado'] = (aprovados, negados, promovidos)
+                    del st.session_state['desist_todas']
+                    st.rerun()
+
+                st.markdown("---")
+                for row in pedidos_saida[:10]:
+                    linha_pedido_saida(row)
+                if len(pedidos_saida) > 10:
+                    st.caption(f"... e mais {len(pedidos_saida) - 10}. Use a seleção acima para processar em lote.")
             st.markdown("---")
 
-        op = st.sidebar.radio("Menu", ["📊 Relatórios Gerenciais", "Criar Escalas", "Lista de Inscrições", "Gerenciar Agentes", "⚙️ Configurações (Cargos)"])
+        op = st.sidebar.radio("Menu", ["📊 Relatórios Gerenciais", "Criar Escalas", "Gerenciar Escalas", "Lista de Inscrições", "📤 Exportações", "Gerenciar Agentes", "⚙️ Configurações (Cargos)", "🩺 Diagnóstico"])
+        PERFIL.definir_tela(op)
         
         if op == "📊 Relatórios Gerenciais":
             st.subheader("Dashboard de Inteligência")
-            conn = get_connection()
-            df_inscricoes = pd.read_sql("""
-                SELECT v.evento, v.valor, a.nome, i.status 
-                FROM inscricoes i
-                JOIN vagas_ras v ON i.id_vaga = v.id
-                JOIN agentes a ON i.id_agente = a.id
-                WHERE i.status = 'ATIVO'
-            """, conn)
-            conn.close()
+            rel = ras_core.relatorio_gerencial(get_pool())
             
-            c1, c2 = st.columns(2)
-            c1.metric("Escalas Confirmadas", len(df_inscricoes))
-            c2.metric("Valor Total Previsto", f"R$ {df_inscricoes['valor'].sum():,.2f}" if not df_inscricoes.empty else "R$ 0,00")
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Escalas Confirmadas", rel['escalas'])
+            c2.metric("Horas Previstas", f"{rel['horas']:,.1f} h")
+            c3.metric("Valor Total Previsto", f"R$ {rel['valor']:,.2f}")
             
             st.markdown("---")
-            if not df_inscricoes.empty:
-                st.bar_chart(df_inscricoes['nome'].value_counts().head(5))
+            if rel['top_agentes']:
+                st.bar_chart(pd.DataFrame(rel['top_agentes']).set_index('nome')['escalas'])
+
+                t_mes, t_lot, t_grad = st.tabs(["Por Mês", "Por Lotação", "Por Graduação"])
+                for aba, chave, coluna in ((t_mes, 'por_mes', 'mes'), (t_lot, 'por_lotacao', 'lotacao'),
+                                           (t_grad, 'por_graduacao', 'graduacao')):
+                    with aba:
+                        df_quebra = pd.DataFrame(rel[chave]).set_index(coluna)
+                        st.bar_chart(df_quebra['valor'])
+                        st.dataframe(df_quebra, use_container_width=True)
             else:
                 st.info("Sem dados suficientes para gráficos.")
 
+            # Conflitos gravados em escalas que ainda não terminaram (edições de horário,
+            # inscrições anteriores à checagem, limite mensal reduzido)
+            st.markdown("---")
+            st.subheader("⚠️ Conflitos de Agenda")
+            conflitos = get_conflitos()
+            if not conflitos['sobreposicoes'] and not conflitos['acima_limite']:
+                st.success("Nenhum conflito de horário ou de limite mensal.")
+            if conflitos['sobreposicoes']:
+                st.warning(f"{len(conflitos['sobreposicoes'])} par(es) de escalas com horários sobrepostos.")
+                st.dataframe(pd.DataFrame(conflitos['sobreposicoes']), use_container_width=True, hide_index=True)
+            if conflitos['acima_limite']:
+                st.warning(f"{len(conflitos['acima_limite'])} agente(s) acima do limite de "
+                           f"{conflitos['limite']:g} h de RAS no mês.")
+                st.dataframe(pd.DataFrame(conflitos['acima_limite']), use_container_width=True, hide_index=True)
+
         elif op == "Criar Escalas":
             st.subheader("Nova Escala RAS")
+            modo = st.radio("Tipo", ["Única", "Recorrente"], horizontal=True)
             evt = st.text_input("Nome do Evento")
             c1, c2, c3 = st.columns(3)
-            dt = c1.date_input("Data")
+            dt = c1.date_input("Data" if modo == "Única" else "De")
             hi = c2.time_input("Início")
             hf = c3.time_input("Fim")
             c4, c5 = st.columns(2)
             qtd = c4.number_input("Vagas", 1, 100, 10)
             val = c5.number_input("Valor (R$)", 0.0, 1000.0, 200.0)
-            if st.button("Publicar"):
-                criar_vaga(evt, dt, hi, hf, qtd, val)
-                st.success("Escala Criada!")
+            c6, c7 = st.columns(2)
+            alocacao = c6.selectbox("Alocação das vagas", list(ras_core.MODOS_ALOCACAO),
+                                    format_func=ras_core.MODOS_ALOCACAO.get)
+            dias_sorteio = 2
+            if alocacao != 'ORDEM':
+                dias_sorteio = c7.number_input("Sorteio N dia(s) antes da escala", 0, 60, 2,
+                                               help="Até lá os agentes só registram interesse")
+
+            if modo == "Única":
+                if st.button("Publicar"):
+                    criar_vaga(evt, dt, hi, hf, qtd, val, alocacao, dias_sorteio)
+                    st.success("Escala Criada!")
+            else:
+                # Recorrência expandida em memória; pré-visualização antes de gravar tudo de uma vez
+                r1, r2, r3 = st.columns([1, 2, 1])
+                dt_fim = r1.date_input("Até", value=dt + datetime.timedelta(days=90))
+                dias = r2.multiselect("Dias da semana (vazio = todos os dias)", list(range(7)),
+                                      format_func=lambda d: ras_core.DIAS_SEMANA[d])
+                intervalo = r3.number_input("A cada N semanas" if dias else "A cada N dias", 1, 52, 1)
+                datas = ras_core.expandir_recorrencia(dt, dt_fim, dias, intervalo)
+                excluidas = st.multiselect("Excluir datas", datas, format_func=lambda d: d.strftime("%d/%m/%Y"))
+                datas = [d for d in datas if d not in set(excluidas)]
+
+                st.caption(f"{len(datas)} escala(s) serão criadas.")
+                if datas:
+                    st.dataframe(pd.DataFrame({
+                        'data': [d.strftime("%d/%m/%Y") for d in datas],
+                        'dia': [ras_core.DIAS_SEMANA[d.weekday()] for d in datas],
+                        'horario': f"{hi.strftime('%H:%M')} - {hf.strftime('%H:%M')}",
+                    }), use_container_width=True, height=200)
+                if st.button(f"Publicar {len(datas)} escala(s)", disabled=not datas or not evt):
+                    try:
+                        n = ras_core.criar_vagas_em_lote(get_pool(), evt, datas, hi, hf, qtd, val,
+                                                         alocacao, dias_sorteio)
+                        st.success(f"{n} escalas criadas!")
+                    except ValueError as e:
+                        st.error(str(e))
                 
+        elif op == "Gerenciar Escalas":
+            st.subheader("🗓️ Editar Escalas Publicadas")
+            filtro_evento = st.text_input("🔍 Evento", key="editar_evento")
+            cursores = pilha_cursores('editar', (filtro_evento,))
+            vagas, proximo_cursor = listar_vagas(False, None, None, filtro_evento, cursores[-1])
+
+            if not vagas:
+                st.info("Nenhuma escala futura encontrada.")
+            else:
+                por_id = {v['id']: v for v in vagas}
+                id_vaga_sel = st.selectbox("Escala", list(por_id), format_func=lambda i: (
+                    f"{por_id[i]['data_inicio']} - {por_id[i]['evento']} "
+                    f"({por_id[i]['inscritos']}/{por_id[i]['vagas_totais']}, {por_id[i]['em_espera']} na espera)"))
+                vaga = por_id[id_vaga_sel]
+
+                with st.form(f"editar_vaga_{id_vaga_sel}"):
+                    evt = st.text_input("Nome do Evento", value=vaga['evento'])
+                    c1, c2, c3 = st.columns(3)
+                    dt = c1.date_input("Data", value=datetime.date.fromisoformat(vaga['data_inicio']))
+                    hi = c2.time_input("Início", value=datetime.time.fromisoformat(vaga['hora_inicio']))
+                    hf = c3.time_input("Fim", value=datetime.time.fromisoformat(vaga['hora_fim']))
+                    c4, c5 = st.columns(2)
+                    qtd = c4.number_input("Vagas", 0, 1000, int(vaga['vagas_totais']))
+                    val = c5.number_input("Valor (R$)", 0.0, 1000.0, float(vaga['valor']))
+                    if st.form_submit_button("Salvar Alterações"):
+                        try:
+                            promovidos, rebaixados, saidas = ras_core.editar_vaga(get_pool(), id_vaga_sel, evt, dt,
+                                                                                  hi, hf, qtd, val)
+                            st.success(f"Escala atualizada. {promovidos} promovido(s) da lista de espera, "
+                                       f"{rebaixados} movido(s) para a lista de espera, "
+                                       f"{saidas} pedido(s) de saída atendido(s).")
+                        except ValueError as e:
+                            st.error(str(e))
+
+                if vaga['modo_alocacao'] != 'ORDEM' and not vaga['sorteada_em']:
+                    st.info(f"🎲 {ras_core.MODOS_ALOCACAO[vaga['modo_alocacao']]}: {vaga['interessados']} "
+                            f"interessado(s), sorteio em {vaga['fim_interesse']}.")
+                    if st.button("Sortear Agora", key=f"sortear_{id_vaga_sel}"):
+                        for _, ativos, espera in ras_core.sortear_vagas(get_pool(), ids_vagas=[id_vaga_sel]):
+                            st.success(f"Sorteio realizado: {ativos} confirmado(s), {espera} na lista de espera.")
+
+                with st.popover("Cancelar Escala"):
+                    st.warning("Todas as inscrições desta escala serão canceladas.")
+                    if st.button("Confirmar Cancelamento", type="primary", key=f"cancelar_vaga_{id_vaga_sel}"):
+                        n = ras_core.cancelar_vaga(get_pool(), id_vaga_sel)
+                        st.success(f"Escala cancelada ({n} inscrição(ões) cancelada(s)).")
+            navegacao_paginas('editar', cursores, proximo_cursor)
+
         elif op == "Lista de Inscrições":
             st.subheader("📋 Inscrições Realizadas")
-            conn = get_connection()
-            try:
-                df = pd.read_sql('''
-                    SELECT v.evento, v.data_inicio, a.nome, a.matricula, i.status 
-                    FROM inscricoes i 
-                    JOIN vagas_ras v ON i.id_vaga = v.id 
-                    JOIN agentes a ON i.id_agente = a.id
-                    ORDER BY v.data_inicio DESC
-                ''', conn)
-            except: df = pd.DataFrame()
-            conn.close()
-            
             col_f1, col_f2 = st.columns(2)
             with col_f1: filtro_evento = st.text_input("🔍 Evento")
             with col_f2: filtro_agente = st.text_input("👮 Agente")
+
+            # Busca feita no banco (FTS5), uma página por vez
+            cursores = pilha_cursores('lista', (filtro_evento, filtro_agente))
+            linhas, proximo_cursor = ras_core.buscar_inscricoes(get_pool(), evento=filtro_evento,
+                                                                agente=filtro_agente, cursor=cursores[-1])
             
-            if not df.empty:
-                if filtro_evento: df = df[df['evento'].str.contains(filtro_evento, case=False, na=False)]
-                if filtro_agente: df = df[df['nome'].str.contains(filtro_agente, case=False, na=False) | df['matricula'].str.contains(filtro_agente, case=False, na=False)]
+            if linhas:
+                df = pd.DataFrame(linhas).drop(columns=['id_vaga', 'id_inscricao'])
                 st.dataframe(df, use_container_width=True)
             else:
                 st.warning("Nada encontrado.")
+            navegacao_paginas('lista', cursores, proximo_cursor)
+
+        elif op == "📤 Exportações":
+            st.subheader("📤 Exportações (Folha de Pagamento e Auditoria)")
+            c1, c2 = st.columns([3, 1])
+            tipo_exp = c1.selectbox("Relatório", list(ras_core.EXPORTACOES), format_func=ras_core.EXPORTACOES.get)
+            formato = c2.selectbox("Formato", ras_core.formatos_disponiveis(), format_func=str.upper)
+
+            filtros, sufixo = {}, "completa"
+            if tipo_exp == 'escala':
+                passadas = st.toggle("Escalas já realizadas")
+                filtro_evento = st.text_input("🔍 Evento", key="exportar_evento")
+                vagas, proximo_cursor = listar_vagas(passadas, None, None, filtro_evento, None)
+                por_id = {v['id']: v for v in vagas}
+                if por_id:
+                    filtros['id_vaga'] = st.selectbox("Escala", list(por_id), format_func=lambda i: (
+                        f"{por_id[i]['data_inicio']} - {por_id[i]['evento']} ({por_id[i]['inscritos']}/{por_id[i]['vagas_totais']})"))
+                    sufixo = f"{por_id[filtros['id_vaga']]['data_inicio']}_{filtros['id_vaga']}"
+                    if proximo_cursor:
+                        st.caption("Mostrando as primeiras escalas; filtre pelo evento para achar outras.")
+                else:
+                    st.info("Nenhuma escala encontrada.")
+            elif tipo_exp == 'pagamento':
+                mes = st.selectbox("Mês", [None] + ras_core.meses_com_escalas(get_pool()),
+                                   format_func=lambda m: m or "Todos os meses")
+                filtros['mes'] = mes
+                sufixo = mes or sufixo
+            else:
+                c1, c2 = st.columns(2)
+                filtros['desde'] = c1.date_input("De", value=None)
+                filtros['ate'] = c2.date_input("Até", value=None)
+                if filtros['desde'] or filtros['ate']:
+                    sufixo = f"{filtros['desde'] or 'inicio'}_{filtros['ate'] or 'hoje'}"
+            if tipo_exp != 'escala':
+                with conexao() as conn:
+                    arquivado_ate = ras_core.ler_parametro(conn, ras_core.ARQUIVADO_ATE)
+                if arquivado_ate:
+                    filtros['historico'] = st.checkbox(
+                        f"Incluir escalas arquivadas (anteriores a {arquivado_ate})",
+                        value=bool(filtros.get('mes') and filtros['mes'] + '-01' < arquivado_ate),
+                        help="Lê também o arquivo frio: mais lento")
+
+            # O arquivo só é gerado no clique, direto do banco (nada é montado a cada rerun)
+            st.download_button(f"⬇️ Baixar {formato.upper()}",
+                               functools.partial(gerar_exportacao, get_pool(), tipo_exp, formato, filtros),
+                               f"ras_{tipo_exp}_{sufixo}.{formato}", ras_core.FORMATOS_EXPORTACAO[formato],
+                               on_click="ignore", disabled=tipo_exp == 'escala' and 'id_vaga' not in filtros)
+            if 'xlsx' not in ras_core.formatos_disponiveis():
+                st.caption("Para exportar em XLSX instale o pacote openpyxl.")
 
         elif op == "Gerenciar Agentes":
             st.subheader("👮‍♂️ Gestão de Efetivo")
-            conn = get_connection()
-            df_agentes = pd.read_sql("SELECT id, matricula, nome, graduacao, lotacao FROM agentes", conn).fillna('')
-            conn.close()
-            
-            if not df_agentes.empty:
-                escolha = st.selectbox("Selecione:", df_agentes['matricula'] + " - " + df_agentes['nome'])
-                id_agente_sel = int(df_agentes[df_agentes['matricula'] == escolha.split(" - ")[0]].iloc[0]['id'])
-                
+
+            with st.expander("📥 Importar agentes (CSV)"):
+                st.caption("Colunas: matrícula, nome, graduação, lotação (separador , ou ;). "
+                           "Cada agente recebe uma senha temporária e troca no primeiro acesso.")
+                arquivo = st.file_uploader("Arquivo CSV", type=["csv"])
+                if arquivo is not None and st.button("Importar"):
+                    total_linhas = max(arquivo.getvalue().count(b"\n") - 1, 1)
+                    barra = st.progress(0.0, text="Importando...")
+                    try:
+                        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+                        resultado = ras_core.importar_agentes(
+                            get_pool(), ras_core.ler_csv_agentes(texto),
+                            progresso=lambda n: barra.progress(min(n / total_linhas, 1.0), text=f"{n} linha(s) processada(s)"))
+                        st.session_state['importacao_agentes'] = resultado
+                    except ValueError as e:
+                        st.error(str(e))
+                    except UnicodeDecodeError:
+                        st.error("Arquivo não está em UTF-8. Nenhum agente foi importado.")
+
+                resultado = st.session_state.get('importacao_agentes')
+                if resultado:
+                    st.success(f"{resultado['inseridos']} agente(s) importado(s).")
+                    if resultado['problemas']:
+                        st.warning(f"{len(resultado['problemas'])} linha(s) não importada(s):")
+                        st.dataframe(pd.DataFrame(resultado['problemas'], columns=['linha', 'matricula', 'motivo']),
+                                     use_container_width=True)
+                    if resultado['senhas']:
+                        csv_senhas = pd.DataFrame(resultado['senhas'], columns=['matricula', 'senha_temporaria']).to_csv(index=False)
+                        st.download_button("Baixar senhas temporárias", csv_senhas, "senhas_temporarias.csv", "text/csv")
+
+            # Busca no banco (prefixo de matrícula/nome, sem acento) em vez de carregar o efetivo inteiro
+            f1, f2, f3 = st.columns([2, 1, 1])
+            busca_agente = f1.text_input("🔍 Matrícula ou nome", key="busca_agente")
+            filtro_lot = f2.selectbox("Lotação", [None] + get_lotacoes(), format_func=lambda l: l or "Todas")
+            filtro_grad = f3.selectbox("Graduação", [None] + get_lista_cargos(), format_func=lambda g: g or "Todas")
+            agentes, ha_mais = ras_core.buscar_agentes(get_pool(), busca_agente, filtro_lot, filtro_grad)
+
+            if not (ras_core.termos_fts(busca_agente) or filtro_lot or filtro_grad):
+                st.caption("Digite parte da matrícula ou do nome, ou escolha uma lotação/graduação.")
+            elif not agentes:
+                st.info("Nenhum agente encontrado.")
+            else:
+                por_id = {a['id']: a for a in agentes}
+                id_agente_sel = st.selectbox("Selecione:", list(por_id),
+                                             format_func=lambda i: f"{por_id[i]['matricula']} - {por_id[i]['nome']}"
+                                                                   + ("" if por_id[i]['ativo'] else " (desativado)"))
+                if ha_mais:
+                    st.caption(f"Mostrando os {ras_core.LIMITE_BUSCA_AGENTES} primeiros em ordem alfabética; refine a busca.")
+
                 # Pega dados atualizados
-                conn = get_connection()
-                agente_dados = pd.read_sql(f"SELECT * FROM agentes WHERE id={id_agente_sel}", conn).iloc[0]
-                conn.close()
+                agente_dados = ras_core.obter_agente(get_pool(), id_agente_sel)
 
                 with st.container(border=True):
+                    if not agente_dados['ativo']:
+                        st.warning(f"Agente desativado em {agente_dados['desativado_em']}: não entra no sistema nem se inscreve.")
                     with st.form("edit_user"):
                         nn = st.text_input("Nome", value=agente_dados['nome'])
                         
@@ -486,29 +790,42 @@ else:
                         
                         nl = st.text_input("Lotação", value=agente_dados['lotacao'])
                         if st.form_submit_button("Salvar Alterações"):
-                            conn = get_connection()
-                            conn.execute("UPDATE agentes SET nome=?, graduacao=?, lotacao=? WHERE id=?", (nn, ng, nl, id_agente_sel))
-                            conn.commit()
-                            conn.close()
-                            st.success("Salvo!")
-                            time.sleep(1)
+                            ras_core.atualizar_agente(get_pool(), id_agente_sel, nn, ng, nl)
+                            avisar("Salvo!", "✅")
                             st.rerun()
                     
                     c1, c2 = st.columns(2)
                     if c1.button("Resetar Senha (1234)"):
-                        conn = get_connection()
-                        hash_1234 = make_hashes('1234')
-                        conn.execute("UPDATE agentes SET senha=?, primeiro_acesso=1 WHERE id=?", (hash_1234, id_agente_sel))
-                        conn.commit()
-                        conn.close()
+                        ras_core.resetar_senha_agente(get_pool(), id_agente_sel, '1234')
                         st.success("Senha resetada.")
                     
-                    if c2.button("Excluir Agente", type="primary"):
-                        conn = get_connection()
-                        conn.execute("DELETE FROM inscricoes WHERE id_agente=?", (id_agente_sel,))
-                        conn.execute("DELETE FROM agentes WHERE id=?", (id_agente_sel,))
-                        conn.commit()
-                        conn.close()
+                    # Desativar em vez de excluir: o histórico fica, as escalas futuras vão para a fila
+                    if agente_dados['ativo']:
+                        if c2.button("Desativar Agente", type="primary"):
+                            _, liberadas, promovidos = ras_core.desativar_agentes(get_pool(), [id_agente_sel])
+                            avisar(f"Agente desativado: {liberadas} inscrição(ões) futura(s) liberada(s), "
+                                   f"{promovidos} agente(s) promovido(s) da lista de espera.", "✅")
+                            st.rerun()
+                    elif c2.button("Reativar Agente"):
+                        ras_core.reativar_agentes(get_pool(), [id_agente_sel])
+                        avisar("Agente reativado.", "✅")
+                        st.rerun()
+
+            # Transferência de unidade: todos os ativos da lotação numa transação só
+            with st.expander("🚚 Desativar lotação inteira"):
+                lotacao_desativar = st.selectbox("Lotação", get_lotacoes(), index=None, key="lotacao_desativar",
+                                                 placeholder="Escolha a lotação")
+                if lotacao_desativar:
+                    previa = ras_core.previa_desativacao(get_pool(), lotacao=lotacao_desativar)
+                    st.write(f"{previa['agentes']} agente(s) ativo(s); {previa['ocupadas']} vaga(s) futura(s) ocupada(s) "
+                             f"liberada(s) para a lista de espera e {previa['espera']} inscrição(ões) em espera/sorteio são retiradas.")
+                    confirmar = st.checkbox(f"Confirmo a desativação de todos os agentes de {lotacao_desativar}",
+                                            key="confirmar_desativar_lotacao")
+                    if st.button("Desativar Lotação", type="primary", disabled=not (confirmar and previa['agentes'])):
+                        desativados, liberadas, promovidos = ras_core.desativar_agentes(get_pool(), lotacao=lotacao_desativar)
+                        del st.session_state['confirmar_desativar_lotacao']
+                        avisar(f"{desativados} agente(s) de {lotacao_desativar} desativado(s): {liberadas} inscrição(ões) "
+                               f"futura(s) liberada(s), {promovidos} agente(s) promovido(s) da lista de espera.", "✅")
                         st.rerun()
 
         # --- NOVA ABA: CONFIGURAÇÃO DE CARGOS ---
@@ -524,8 +841,7 @@ else:
                 if st.button("Adicionar Cargo"):
                     if novo_cargo:
                         if adicionar_cargo(novo_cargo):
-                            st.success(f"Cargo '{novo_cargo}' adicionado!")
-                            time.sleep(1)
+                            avisar(f"Cargo '{novo_cargo}' adicionado!", "✅")
                             st.rerun()
                         else:
                             st.error("Erro: Esse cargo já existe.")
@@ -540,102 +856,159 @@ else:
                         remover_cargo(cargo)
                         st.rerun()
 
+            st.markdown("---")
+            st.markdown("##### Limite de Horas de RAS por Mês")
+            with conexao() as conn:
+                limite_atual = ras_core.limite_horas_mes(conn)
+            sem_limite = st.checkbox("Sem limite", value=limite_atual is None)
+            novo_limite = st.number_input("Horas por agente no mês", 1.0, 744.0, limite_atual or 48.0, step=1.0,
+                                          disabled=sem_limite, help="Conta escalas confirmadas, em lista de espera e em sorteio")
+            if st.button("Salvar Limite"):
+                ras_core.gravar_parametro(get_pool(), ras_core.LIMITE_HORAS_MES, None if sem_limite else str(novo_limite))
+                st.success("Limite atualizado!")
+
+            # Escalas antigas saem do banco principal (fica pequeno e rápido); continuam nos
+            # relatórios gerenciais e nas exportações com "Incluir escalas arquivadas"
+            st.markdown("---")
+            st.markdown("##### Arquivamento de Escalas Antigas")
+            with conexao() as conn:
+                dias_atual = ras_core.dias_arquivamento(conn)
+                arquivado_ate = ras_core.ler_parametro(conn, ras_core.ARQUIVADO_ATE)
+            if arquivado_ate:
+                st.caption(f"Escalas anteriores a {arquivado_ate} estão no arquivo.")
+            novos_dias = st.number_input("Arquivar escalas com mais de N dias", 30, 3650, dias_atual, step=30)
+            a1, a2, _ = st.columns([1, 1, 2])
+            if a1.button("Salvar Prazo"):
+                ras_core.gravar_parametro(get_pool(), ras_core.DIAS_ARQUIVAMENTO, str(novos_dias))
+                st.success("Prazo de arquivamento atualizado!")
+            if a2.button("Arquivar Agora"):
+                with st.spinner("Arquivando..."):
+                    n_vagas, n_inscricoes, corte = ras_core.arquivar_escalas(get_pool(), dias=novos_dias)
+                st.success(f"{n_vagas} escala(s) anteriores a {corte:%d/%m/%Y} e {n_inscricoes} inscrição(ões) arquivadas.")
+
+        # Perfil do processo (todas as sessões): consultas e reruns guardados por ras_perfil
+        elif op == "🩺 Diagnóstico":
+            st.subheader("Diagnóstico de Desempenho")
+            st.caption(f"Últimas {ras_perfil.TAMANHO_BUFFER_CONSULTAS} consultas e {ras_perfil.TAMANHO_BUFFER_EXECUCOES} "
+                       "execuções de todas as sessões deste servidor (memória; zera ao reiniciar).")
+            d1, d2, d3 = st.columns([1, 1, 2])
+            d1.toggle("Coletar", value=PERFIL.ativo, key="perfil_ativo",
+                      on_change=lambda: setattr(PERFIL, 'ativo', st.session_state['perfil_ativo']))
+            limiar = d2.number_input("Consulta lenta a partir de (ms)", 1, 60000, ras_perfil.LIMIAR_LENTA_MS, step=10)
+            if d3.button("Limpar Dados"):
+                PERFIL.limpar()
+                st.rerun()
+            if not PERFIL.ativo:
+                st.info("Coleta desligada (padrão, sem custo nas consultas): ligue em **Coletar** ou suba o servidor com RAS_PERFIL=1.")
+            if PERFIL.caminho_log:
+                st.caption(f"Log JSON-lines em `{PERFIL.caminho_log}` (resumo offline: `python ras_cli.py perfil {PERFIL.caminho_log}`).")
+
+            consultas = list(PERFIL.consultas)
+            execucoes = [e.como_dict() for e in list(PERFIL.execucoes)]
+            paginas = sorted(e['ms'] for e in execucoes if e['origem'] == 'pagina')
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Execuções", len(execucoes))
+            m2.metric("Página p50", f"{paginas[len(paginas) // 2]:.0f} ms" if paginas else "-")
+            m3.metric("Página p99", f"{paginas[min(len(paginas) - 1, int(len(paginas) * 0.99))]:.0f} ms" if paginas else "-")
+            m4.metric("Consultas lentas", sum(1 for c in consultas if c.ms >= limiar))
+            limitador = ras_senha.LIMITADOR
+            st.caption(f"Login: scrypt 2^{ras_senha.CUSTO_LOG2} em {ras_senha.TRABALHADORES} trabalhador(es); "
+                       f"{limitador.bloqueadas()} conta(s) bloqueada(s) agora, {limitador.recusas_conta} tentativa(s) "
+                       f"barrada(s) por bloqueio e {limitador.recusas_ocupado} por fila cheia desde a partida.")
+
+            st.markdown("##### Execuções por Tela")
+            resumo = ras_perfil.resumir_execucoes(execucoes)
+            if resumo:
+                st.dataframe(pd.DataFrame(resumo)[['tela', 'origem', 'reruns', 'ms_medio', 'ms_max', 'consultas_por_rerun',
+                                                   'consultas_max', 'ms_sql']],
+                             hide_index=True, use_container_width=True,
+                             column_config={'ms_medio': st.column_config.NumberColumn("ms médio", format="%.1f"),
+                                            'ms_max': st.column_config.NumberColumn("ms máx", format="%.1f"),
+                                            'consultas_por_rerun': st.column_config.NumberColumn("consultas/rerun", format="%.1f"),
+                                            'consultas_max': "consultas máx",
+                                            'ms_sql': st.column_config.NumberColumn("ms em SQL (total)", format="%.0f")})
+            else:
+                st.info("Nenhuma execução registrada ainda.")
+
+            st.markdown("##### Consultas com Maior Tempo Total")
+            grupos = ras_perfil.agrupar_consultas([c.como_dict() for c in consultas])
+            if grupos:
+                st.dataframe(pd.DataFrame(grupos[:30])[['sql', 'chamadas', 'ms_total', 'ms_medio', 'ms_max', 'linhas', 'erros', 'telas']],
+                             hide_index=True, use_container_width=True,
+                             column_config={'ms_total': st.column_config.NumberColumn("ms total", format="%.1f"),
+                                            'ms_medio': st.column_config.NumberColumn("ms médio", format="%.2f"),
+                                            'ms_max': st.column_config.NumberColumn("ms máx", format="%.1f")})
+
+            st.markdown(f"##### Plano das Consultas Acima de {limiar} ms")
+            # Uma por SQL: a execução mais lenta, com os parâmetros dela
+            lentas = {}
+            for c in consultas:
+                if c.ms >= limiar:
+                    sql = ras_perfil.normalizar_sql(c.sql)
+                    if sql not in lentas or c.ms > lentas[sql].ms:
+                        lentas[sql] = c
+            if not lentas:
+                st.caption("Nenhuma consulta acima do limite.")
+            for sql, c in sorted(lentas.items(), key=lambda item: item[1].ms, reverse=True)[:20]:
+                with st.expander(f"{c.ms:.0f} ms · {c.linhas} linha(s) · {c.execucao.tela if c.execucao else '-'} · {sql[:80]}"):
+                    st.code(c.sql.strip(), language="sql")
+                    try:
+                        with conexao() as conn:
+                            plano = ras_perfil.plano_consulta(conn, c)
+                    except sqlite3.Error as e:
+                        plano = [f"(sem plano nesta conexão: {e})"]
+                    st.text('\n'.join(plano) if plano else "(comando sem plano de consulta)")
+
+            st.markdown("##### Execuções Recentes")
+            if execucoes:
+                recentes = pd.DataFrame(execucoes[-100:][::-1])
+                recentes['ts'] = recentes['ts'].map(ras_perfil.hora)
+                st.dataframe(recentes[['ts', 'sessao', 'tela', 'origem', 'ms', 'consultas', 'ms_sql', 'interrompida']],
+                             hide_index=True, use_container_width=True)
+
     # === VISÃO DO AGENTE ===
     elif st.session_state['tipo_usuario'] == 'agente':
+        PERFIL.definir_tela("Agente")
         nome_agente_logado = st.session_state.get('nome_usuario', 'Agente')
         st.header(f"Olá, {nome_agente_logado}")
         
         tab_vagas, tab_minhas = st.tabs(["📋 Vagas Disponíveis", "✅ Meus Agendamentos"])
         
         with tab_vagas:
-            conn = get_connection()
-            query = '''
-            SELECT v.id, v.evento, v.data_inicio, v.hora_inicio, v.hora_fim, v.valor,
-                   v.vagas_totais, COUNT(CASE WHEN i.status = 'ATIVO' THEN 1 END) AS inscritos
-            FROM vagas_ras v
-            LEFT JOIN inscricoes i ON v.id = i.id_vaga
-            GROUP BY v.id
-            ORDER BY v.data_inicio
-            '''
-            vagas_df = pd.read_sql(query, conn)
+            # Filtros aplicados no SQL; por padrão só escalas de hoje em diante
+            f1, f2, f3 = st.columns([1, 2, 2])
+            visao = f1.radio("Mostrar", ["Próximas", "Histórico"], horizontal=True, key="vagas_visao")
+            periodo = f2.date_input("Período", value=(), key="vagas_periodo")
+            filtro_evento = f3.text_input("🔍 Evento", key="vagas_evento")
+            data_de = periodo[0] if len(periodo) > 0 else None
+            data_ate = periodo[1] if len(periodo) > 1 else None
+
+            cursores = pilha_cursores('vagas', (visao, data_de, data_ate, filtro_evento))
+
+            historico = visao == "Histórico"
+            versao_vagas = get_monitor().versao('vagas_ras')
+            vagas, proximo_cursor = listar_vagas(historico, data_de, data_ate, filtro_evento, cursores[-1])
             
-            if vagas_df.empty: st.info("Sem vagas no momento.")
+            if not vagas: st.info("Sem vagas no momento.")
             
-            for index, row in vagas_df.iterrows():
-                vagas_restantes = row['vagas_totais'] - row['inscritos']
-                pct = row['inscritos'] / row['vagas_totais'] if row['vagas_totais'] > 0 else 0
-                
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([3, 2, 1])
-                    with c1:
-                        st.markdown(f"### {row['evento']}")
-                        st.write(f"📅 {row['data_inicio']} | 🕒 {row['hora_inicio']} - {row['hora_fim']}")
-                        st.write(f"💰 R$ {row['valor']:.2f}")
-                    with c2:
-                        st.write(f"Ocupação: {row['inscritos']}/{row['vagas_totais']}")
-                        st.progress(pct)
-                        if vagas_restantes <= 0: st.error("LOTADO")
-                        elif vagas_restantes <= 5: st.warning("Últimas Vagas")
-                        else: st.success("Disponível")
-                    with c3:
-                        st.write("")
-                        st.write("")
-                        btn_label = "Inscrever"
-                        btn_help = None
-
-                        if vagas_restantes <= 0:
-                            btn_label = "Entrar na Lista de Espera"
-                            btn_help = "Você será chamado caso alguém desista"
-
-                        if st.button(btn_label, key=f"v_{row['id']}", use_container_width=True, help=btn_help):
-                            ok, msg = inscrever_ras(st.session_state['usuario_id'], row['id'])
-                            if ok:
-                                st.success(msg)
-                                time.sleep(1)
-                                st.rerun()
-                            else:
-                                st.error(msg)
-
-            conn.close()
+            if historico:
+                for row in vagas:
+                    card_vaga(row, historico)
+            elif vagas:
+                grade_vagas_ao_vivo(vagas, versao_vagas)
+
+            navegacao_paginas('vagas', cursores, proximo_cursor)
             
         with tab_minhas:
             st.subheader("Minhas Escalas")
-            conn = get_connection()
-            try:
-                meus_ras = pd.read_sql(f'''
-                    SELECT i.id as id_inscricao, v.evento, v.data_inicio, v.hora_inicio, v.hora_fim, i.status
-                    FROM inscricoes i
-                    JOIN vagas_ras v ON i.id_vaga = v.id
-                    WHERE i.id_agente = {st.session_state['usuario_id']}
-                    ORDER BY v.data_inicio
-                ''', conn)
-            except:
-                 meus_ras = pd.DataFrame()
-
-            conn.close()
-            
-            if meus_ras.empty:
+            meus_ras = ras_core.listar_minhas_escalas(get_pool(), st.session_state['usuario_id'])
+
+            if not meus_ras:
                 st.info("Você não tem agendamentos.")
             else:
-                for idx, row in meus_ras.iterrows():
-                    with st.container(border=True):
-                        col_a, col_b = st.columns([4, 1])
-                        col_a.write(f"**{row['evento']}** em {row['data_inicio']}")
-                        
-                        status_atual = row['status'] if 'status' in row else 'ATIVO'
+                for row in meus_ras:
+                    linha_minha_escala(row)
                         
-                        if status_atual == 'ATIVO':
-                            col_a.success("Confirmado ✅")
-                            if col_b.button("Solicitar Desistência", key=f"sair_{row['id_inscricao']}"):
-                                solicitar_desistencia(row['id_inscricao'])
-                                st.rerun()
-
-                        elif status_atual == 'ESPERA':
-                            col_a.info("🕒 Lista de Espera")        
-                        
-                        elif status_atual == 'PENDENTE_SAIDA':
-                            col_a.warning("⏳ Aguardando Aprovação do Comando para sair")
-                            if col_b.button("Cancelar Pedido", key=f"canc_sair_{row['id_inscricao']}"):
-                                cancelar_desistencia(row['id_inscricao'])
-                                st.rerun()
-                        
\ No newline at end of file
+
+registrar_tempo('pagina', _inicio_execucao)
+PERFIL.encerrar_execucao(st.session_state.pop('execucao_perfil'))
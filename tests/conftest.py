@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ras_core
+
+
+@pytest.fixture(params=[False, True], ids=['transacao', 'fila_escrita'])
+def pool(request, tmp_path):
+    # Banco novo por teste, nos dois caminhos de escrita (BEGIN IMMEDIATE e thread escritora)
+    pool = ras_core.abrir(str(tmp_path / 'ras.db'), tamanho=8, fila_escrita=request.param)
+    yield pool
+    pool.fechar()
+
+
+def criar_agentes(pool, n):
+    # Agentes direto no banco (sem KDF): só as inscrições interessam aqui
+    def gravar(conn):
+        conn.executemany("INSERT INTO agentes (matricula, nome, graduacao, lotacao, senha) VALUES (?, ?, '', '', 'x')",
+                         [(f"T{i:04d}", f"Agente {i}") for i in range(n)])
+        return [i for (i,) in conn.execute("SELECT id FROM agentes ORDER BY id")]
+    return pool.escrever(gravar)
+
+
+def criar_escala(pool, vagas, data='2030-01-10'):
+    ras_core.criar_vaga(pool, 'Teste', data, '08:00:00', '14:00:00', vagas, 100.0)
+    with pool.conexao() as conn:
+        return conn.execute("SELECT MAX(id) FROM vagas_ras").fetchone()[0]
+
+
+def situacao(pool, id_vaga):
+    # ({status: quantidade}, inscritos_ativos, em_espera) da escala
+    with pool.conexao() as conn:
+        contagem = dict(conn.execute("SELECT status, COUNT(*) FROM inscricoes WHERE id_vaga = ? GROUP BY status",
+                                     (id_vaga,)))
+        ativos, espera = conn.execute("SELECT inscritos_ativos, em_espera FROM vagas_ras WHERE id = ?",
+                                      (id_vaga,)).fetchone()
+    return contagem, ativos, espera
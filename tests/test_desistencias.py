@@ -0,0 +1,112 @@
+from conftest import criar_agentes, criar_escala, situacao
+
+import ras_core
+
+
+def inscrever_todos(pool, agentes, id_vaga):
+    for id_agente in agentes:
+        assert ras_core.inscrever_ras(pool, id_agente, id_vaga)[0]
+    with pool.conexao() as conn:
+        return [i for (i,) in conn.execute("SELECT id FROM inscricoes WHERE id_vaga = ? ORDER BY id", (id_vaga,))]
+
+
+def status(pool, id_inscricao):
+    return ras_core.status_inscricao(pool, id_inscricao)
+
+
+def test_ids_repetidos_aprovam_uma_vez_so(pool):
+    agentes = criar_agentes(pool, 4)
+    id_vaga = criar_escala(pool, 2)
+    ids = inscrever_todos(pool, agentes, id_vaga)   # 2 ATIVO, 2 ESPERA
+    assert ras_core.solicitar_desistencia(pool, ids[0]) == 1
+
+    aprovados, negados, promovidos = ras_core.processar_desistencias(pool, aprovar=[ids[0], ids[0], ids[0]])
+
+    assert (aprovados, negados, promovidos) == (1, 0, 1)
+    assert status(pool, ids[0]) is None
+    assert [status(pool, i) for i in ids[1:]] == ['ATIVO', 'ATIVO', 'ESPERA']
+    assert situacao(pool, id_vaga) == ({'ATIVO': 2, 'ESPERA': 1}, 2, 1)
+
+
+def test_ids_repetidos_ao_negar(pool):
+    agentes = criar_agentes(pool, 2)
+    id_vaga = criar_escala(pool, 2)
+    ids = inscrever_todos(pool, agentes, id_vaga)
+    ras_core.solicitar_desistencia(pool, ids[0])
+
+    assert ras_core.processar_desistencias(pool, negar=[ids[0], ids[0]]) == (0, 1, 0)
+    assert status(pool, ids[0]) == 'ATIVO'
+
+
+def test_pedido_ja_processado_e_ignorado(pool):
+    agentes = criar_agentes(pool, 3)
+    id_vaga = criar_escala(pool, 2)
+    ids = inscrever_todos(pool, agentes, id_vaga)
+    ras_core.solicitar_desistencia(pool, ids[0])
+    assert ras_core.processar_desistencias(pool, aprovar=[ids[0]]) == (1, 0, 1)
+
+    # Segundo clique com a tela antiga: nada muda e ninguém mais sobe
+    assert ras_core.processar_desistencias(pool, aprovar=[ids[0]], negar=[ids[0]]) == (0, 0, 0)
+    assert situacao(pool, id_vaga) == ({'ATIVO': 2}, 2, 0)
+
+
+def test_solicitar_desistencia_so_a_partir_de_ativo(pool):
+    agentes = criar_agentes(pool, 2)
+    id_vaga = criar_escala(pool, 1)
+    ativo, espera = inscrever_todos(pool, agentes, id_vaga)
+
+    assert ras_core.solicitar_desistencia(pool, espera) == 0
+    assert ras_core.solicitar_desistencia(pool, ativo) == 1
+    assert ras_core.solicitar_desistencia(pool, ativo) == 0
+    assert (status(pool, ativo), status(pool, espera)) == ('PENDENTE_SAIDA', 'ESPERA')
+
+
+def test_cancelar_desistencia_so_a_partir_de_pendente(pool):
+    agentes = criar_agentes(pool, 2)
+    id_vaga = criar_escala(pool, 1)
+    ativo, espera = inscrever_todos(pool, agentes, id_vaga)
+
+    assert ras_core.cancelar_desistencia(pool, ativo) == 0
+    assert ras_core.cancelar_desistencia(pool, espera) == 0
+    assert status(pool, espera) == 'ESPERA'
+    ras_core.solicitar_desistencia(pool, ativo)
+    assert ras_core.cancelar_desistencia(pool, ativo) == 1
+    assert situacao(pool, id_vaga) == ({'ATIVO': 1, 'ESPERA': 1}, 1, 1)
+
+
+def test_escala_cancelada_nao_volta_a_ativo(pool):
+    agentes = criar_agentes(pool, 2)
+    id_vaga = criar_escala(pool, 2)
+    pendente, ativo = inscrever_todos(pool, agentes, id_vaga)
+    ras_core.solicitar_desistencia(pool, pendente)
+    ras_core.cancelar_vaga(pool, id_vaga)
+
+    # Botões de uma tela aberta antes do cancelamento
+    assert ras_core.cancelar_desistencia(pool, pendente) == 0
+    assert ras_core.solicitar_desistencia(pool, ativo) == 0
+    assert (status(pool, pendente), status(pool, ativo)) == ('CANCELADA', 'CANCELADA')
+    assert situacao(pool, id_vaga) == ({'CANCELADA': 2}, 0, 0)
+
+
+def test_retirar_interesse_so_de_interessado(pool):
+    agentes = criar_agentes(pool, 1)
+    id_vaga = criar_escala(pool, 1)
+    (ativo,) = inscrever_todos(pool, agentes, id_vaga)
+
+    assert ras_core.retirar_interesse(pool, ativo) == 0
+    assert status(pool, ativo) == 'ATIVO'
+
+
+def test_reduzir_capacidade_atende_pedidos_de_saida_primeiro(pool):
+    agentes = criar_agentes(pool, 5)
+    id_vaga = criar_escala(pool, 4)
+    ids = inscrever_todos(pool, agentes, id_vaga)   # 4 ATIVO, 1 ESPERA
+    ras_core.solicitar_desistencia(pool, ids[1])
+
+    resultado = ras_core.editar_vaga(pool, id_vaga, 'Teste', '2030-01-10', '08:00:00', '14:00:00', 2, 100.0)
+
+    # Excedente 2: sai o pedido pendente e o último ATIVO volta para a espera
+    assert resultado == (0, 1, 1)
+    assert status(pool, ids[1]) is None
+    assert [status(pool, i) for i in (ids[0], ids[2], ids[3], ids[4])] == ['ATIVO', 'ATIVO', 'ESPERA', 'ESPERA']
+    assert situacao(pool, id_vaga) == ({'ATIVO': 2, 'ESPERA': 2}, 2, 2)
@@ -0,0 +1,41 @@
+import threading
+
+from conftest import criar_agentes, criar_escala, situacao
+
+import ras_core
+
+
+def test_inscricoes_simultaneas_nao_passam_da_capacidade(pool):
+    agentes = criar_agentes(pool, 24)
+    id_vaga = criar_escala(pool, 5)
+    largada = threading.Barrier(len(agentes))
+    resultados = []
+
+    def inscrever(id_agente):
+        largada.wait()
+        resultados.append(ras_core.inscrever_ras(pool, id_agente, id_vaga))
+
+    threads = [threading.Thread(target=inscrever, args=(a,)) for a in agentes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(ok for ok, _ in resultados)
+    assert sum(msg == "Inscrição confirmada!" for _, msg in resultados) == 5
+    assert situacao(pool, id_vaga) == ({'ATIVO': 5, 'ESPERA': 19}, 5, 19)
+
+
+def test_inscricao_repetida_e_recusada(pool):
+    (id_agente,) = criar_agentes(pool, 1)
+    id_vaga = criar_escala(pool, 2)
+    assert ras_core.inscrever_ras(pool, id_agente, id_vaga)[0]
+    assert ras_core.inscrever_ras(pool, id_agente, id_vaga) == (False, "Você já está inscrito nesta escala.")
+    assert situacao(pool, id_vaga) == ({'ATIVO': 1}, 1, 0)
+
+
+def test_escala_cancelada_nao_aceita_inscricao(pool):
+    (id_agente,) = criar_agentes(pool, 1)
+    id_vaga = criar_escala(pool, 2)
+    ras_core.cancelar_vaga(pool, id_vaga)
+    assert ras_core.inscrever_ras(pool, id_agente, id_vaga) == (False, "Escala não encontrada ou cancelada.")